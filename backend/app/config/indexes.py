@@ -0,0 +1,241 @@
+"""
+Registre des index MongoDB nécessaires aux requêtes de l'API.
+
+Les index sont déclarés par collection dans `INDEXES` et créés au démarrage
+de l'application par `ensure_indexes`. `create_indexes` est idempotent : un
+index déjà présent avec la même définition n'est pas recréé.
+
+`QUERY_SHAPES` recense les formes de requêtes émises par l'API ;
+`audit_query_plans` exécute `explain()` sur chacune et signale celles qui
+parcourent toute la collection (COLLSCAN). Voir `audit_indexes.py`.
+"""
+
+from datetime import datetime
+from typing import List
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+# Index de chaque collection : (clés, options)
+INDEXES = {
+    # Chaque filtre de GET /products est suivi de la clé de tri (created_at, _id)
+    # pour la pagination par curseur
+    "products": [
+        ([("status", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], {}),
+        ([("status", ASCENDING), ("category", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], {}),
+        ([("status", ASCENDING), ("shop_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], {}),
+        ([("seller_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], {}),
+        ([("seller_id", ASCENDING), ("status", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], {}),
+        # Version du profil public vendeur (ETag)
+        ([("seller_id", ASCENDING), ("status", ASCENDING), ("updated_at", DESCENDING)], {}),
+        # Synchronisation des index du catalogue
+        ([("updated_at", ASCENDING)], {}),
+        # Clés de tri recalculées (synchronisation de l'autocomplétion)
+        ([("rank_updated_at", ASCENDING)], {}),
+        # Produits en stock réparti (maintenance des compteurs)
+        ([("stock_shards", ASCENDING)], {"sparse": True}),
+        # Tris alternatifs de GET /products (prix, note, popularité) ; un index
+        # sert les deux sens de tri puisque _id suit la même direction
+        *[
+            ([("status", ASCENDING), *scope, (sort_field, DESCENDING), ("_id", DESCENDING)], {})
+            for sort_field in ("price", "seller_rating", "popularity_score")
+            for scope in ([], [("category", ASCENDING)], [("shop_id", ASCENDING)])
+        ],
+    ],
+    "users": [
+        ([("email", ASCENDING)], {"unique": True}),
+        ([("seller_approval_status", ASCENDING)], {}),
+        # Notes des vendeurs recopiées sur les produits (ranking_service)
+        ([("role", ASCENDING)], {}),
+    ],
+    "shops": [
+        ([("owner_id", ASCENDING)], {}),
+    ],
+    "carts": [
+        ([("user_id", ASCENDING)], {}),
+    ],
+    # Marqueurs de suppression lus par la synchronisation des index du
+    # catalogue, conservés DELETION_RETENTION_DAYS (catalog_index)
+    "product_deletions": [
+        ([("deleted_at", ASCENDING)], {"expireAfterSeconds": 7 * 24 * 3600}),
+    ],
+    "stock_holds": [
+        # Purge automatique des réservations expirées
+        ([("expires_at", ASCENDING)], {"expireAfterSeconds": 0}),
+        ([("product_id", ASCENDING), ("user_id", ASCENDING)], {"unique": True}),
+        ([("user_id", ASCENDING)], {}),
+    ],
+    "stock_shards": [
+        ([("product_id", ASCENDING), ("shard", ASCENDING)], {"unique": True}),
+    ],
+    "outbox": [
+        # Réclamation des tâches : disponibles, ou dont le bail a expiré
+        ([("status", ASCENDING), ("available_at", ASCENDING)], {}),
+        ([("status", ASCENDING), ("locked_until", ASCENDING)], {}),
+        ([("dedupe_key", ASCENDING)], {"unique": True, "partialFilterExpression": {"dedupe_key": {"$exists": True}}}),
+        # Purge des tâches terminées après 7 jours
+        ([("completed_at", ASCENDING)], {"expireAfterSeconds": 7 * 24 * 3600}),
+    ],
+    "idempotency_keys": [
+        # Purge des clés expirées (l'_id composite sert les recherches)
+        ([("expires_at", ASCENDING)], {"expireAfterSeconds": 0}),
+    ],
+    "orders": [
+        # Historique d'un client paginé par curseur (created_at, _id)
+        ([("user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], {}),
+        # Sélection des commandes terminées à archiver
+        ([("status", ASCENDING), ("updated_at", ASCENDING)], {}),
+        # Rapport des commandes sur une plage de dates (export_service)
+        ([("created_at", ASCENDING)], {}),
+    ],
+    # Commandes archivées (order_archive) : historique client au-delà de l'horizon
+    "orders_archive": [
+        ([("user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], {}),
+        ([("created_at", ASCENDING)], {}),
+        # Ventes par produit (ranking_service)
+        ([("status", ASCENDING)], {}),
+    ],
+    "seller_order_lines": [
+        # Commandes d'un vendeur paginées par curseur (created_at, _id)
+        ([("seller_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], {}),
+        # Projection idempotente et mises à jour de statut par commande
+        ([("order_id", ASCENDING), ("seller_id", ASCENDING)], {"unique": True}),
+    ],
+    # Agrégats de ventes : lus par _id (vendeur:granularité:période), sauf
+    # les meilleures ventes d'un vendeur sur une plage
+    "product_sales_rollups": [
+        ([("seller_id", ASCENDING), ("granularity", ASCENDING), ("period", ASCENDING)], {}),
+    ],
+    "reviews": [
+        ([("seller_id", ASCENDING), ("created_at", DESCENDING)], {}),
+        ([("order_id", ASCENDING), ("seller_id", ASCENDING), ("user_id", ASCENDING)], {}),
+        ([("order_id", ASCENDING), ("user_id", ASCENDING)], {}),
+    ],
+    "notifications": [
+        ([("user_id", ASCENDING), ("created_at", DESCENDING)], {}),
+        ([("user_id", ASCENDING), ("read", ASCENDING)], {}),
+    ],
+    "conversations": [
+        ([("participants", ASCENDING), ("updated_at", DESCENDING)], {}),
+    ],
+    "messages": [
+        ([("conversation_id", ASCENDING), ("created_at", ASCENDING)], {}),
+    ],
+}
+
+# Valeurs factices utilisées pour l'audit des plans d'exécution
+_ID = "000000000000000000000000"
+_OID = ObjectId(_ID)
+
+# Formes de requêtes émises par l'API : (collection, filtre, tri)
+QUERY_SHAPES = [
+    ("products", {"status": "published"}, [("created_at", -1), ("_id", -1)]),
+    ("products", {"status": "published", "category": "books"}, [("created_at", -1), ("_id", -1)]),
+    ("products", {"status": "published", "shop_id": _ID}, [("created_at", -1), ("_id", -1)]),
+    ("products", {"status": "published"}, [("price", 1), ("_id", 1)]),
+    ("products", {"status": "published", "category": "books"}, [("price", -1), ("_id", -1)]),
+    ("products", {"status": "published", "shop_id": _ID}, [("price", 1), ("_id", 1)]),
+    ("products", {"status": "published"}, [("seller_rating", -1), ("_id", -1)]),
+    ("products", {"status": "published", "category": "books"}, [("seller_rating", -1), ("_id", -1)]),
+    ("products", {"status": "published"}, [("popularity_score", -1), ("_id", -1)]),
+    ("products", {"status": "published", "category": "books"}, [("popularity_score", -1), ("_id", -1)]),
+    ("products", {"seller_id": _ID}, [("created_at", -1), ("_id", -1)]),
+    ("products", {"seller_id": _ID, "status": "published"}, [("created_at", -1), ("_id", -1)]),
+    ("products", {"seller_id": _ID, "status": "published"}, [("updated_at", -1)]),
+    ("products", {"updated_at": {"$gte": datetime(2000, 1, 1)}}, None),
+    ("products", {"$or": [{"updated_at": {"$gte": datetime(2000, 1, 1)}}, {"rank_updated_at": {"$gte": datetime(2000, 1, 1)}}]}, None),
+    ("products", {"status": "published", "updated_at": {"$gte": datetime(2000, 1, 1)}}, None),
+    ("products", {"_id": _OID}, None),
+    ("products", {"stock_shards": {"$exists": True}}, None),
+    ("product_deletions", {"deleted_at": {"$gte": datetime(2000, 1, 1)}}, None),
+    ("users", {"email": "audit@makiti.com"}, None),
+    ("users", {"seller_approval_status": "pending"}, None),
+    ("users", {"_id": _OID, "role": "seller"}, None),
+    ("users", {"role": "seller"}, None),
+    ("shops", {"owner_id": _ID}, None),
+    ("carts", {"user_id": _ID}, None),
+    ("stock_holds", {"product_id": {"$in": [_ID]}, "expires_at": {"$gt": datetime(2000, 1, 1)}}, None),
+    ("stock_holds", {"product_id": _ID, "user_id": _ID}, None),
+    ("stock_holds", {"user_id": _ID}, None),
+    ("stock_shards", {"product_id": _ID, "shard": 0}, None),
+    ("stock_shards", {"product_id": {"$in": [_ID]}}, None),
+    ("outbox", {"status": "pending", "available_at": {"$lte": datetime(2000, 1, 1)}}, [("available_at", 1)]),
+    ("outbox", {"status": "processing", "locked_until": {"$lte": datetime(2000, 1, 1)}}, None),
+    ("outbox", {"dedupe_key": "audit"}, None),
+    ("orders", {"user_id": _ID}, [("created_at", -1), ("_id", -1)]),
+    ("orders", {"_id": _OID}, None),
+    ("orders", {"status": {"$in": ["delivered", "cancelled"]}, "updated_at": {"$lt": datetime(2000, 1, 1)}}, [("updated_at", 1)]),
+    ("orders", {"created_at": {"$gte": datetime(2000, 1, 1), "$lt": datetime(2000, 2, 1)}}, None),
+    ("orders_archive", {"user_id": _ID}, [("created_at", -1), ("_id", -1)]),
+    ("orders_archive", {"created_at": {"$gte": datetime(2000, 1, 1), "$lt": datetime(2000, 2, 1)}}, None),
+    ("orders_archive", {}, [("created_at", -1)]),
+    ("orders", {"status": {"$in": ["pending", "confirmed", "processing", "shipped", "delivered"]}}, None),
+    ("orders_archive", {"status": {"$in": ["pending", "confirmed", "processing", "shipped", "delivered"]}}, None),
+    ("seller_order_lines", {"seller_id": _ID}, [("created_at", -1), ("_id", -1)]),
+    ("seller_order_lines", {"order_id": {"$in": [_ID]}}, None),
+    ("product_sales_rollups", {"seller_id": _ID, "granularity": "day", "period": {"$in": [datetime(2000, 1, 1)]}}, None),
+    ("product_sales_rollups", {"seller_id": _ID, "$or": [
+        {"granularity": "day", "period": {"$in": [datetime(2000, 1, 1)]}},
+        {"granularity": "month", "period": {"$in": [datetime(2000, 2, 1)]}},
+    ]}, None),
+    ("reviews", {"seller_id": _ID}, [("created_at", -1)]),
+    ("reviews", {"order_id": _ID, "seller_id": _ID, "user_id": _ID}, None),
+    ("reviews", {"order_id": _ID, "user_id": _ID}, None),
+    ("notifications", {"user_id": _ID}, [("created_at", -1)]),
+    ("notifications", {"user_id": _ID, "read": False}, None),
+    ("conversations", {"participants": _ID}, [("updated_at", -1)]),
+    ("conversations", {"participants": {"$all": [_ID, _ID]}}, None),
+    ("messages", {"conversation_id": _ID}, [("created_at", 1)]),
+]
+
+
+async def ensure_indexes(db):
+    """Crée les index déclarés qui n'existent pas encore"""
+    for collection, indexes in INDEXES.items():
+        for keys, options in indexes:
+            try:
+                await db[collection].create_index(keys, **options)
+            except OperationFailure as e:
+                # Ex : doublons existants empêchant un index unique
+                print(f"⚠️  Index {keys} non créé sur {collection}: {e}")
+
+
+def _plan_stages(plan) -> List[str]:
+    """Liste les étapes d'un plan d'exécution (parcours récursif)"""
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages.extend(_plan_stages(value))
+    elif isinstance(plan, list):
+        for value in plan:
+            stages.extend(_plan_stages(value))
+    return stages
+
+
+async def audit_query_plans(db) -> List[dict]:
+    """
+    Exécute explain() sur chaque forme de requête déclarée
+
+    Returns:
+        list: Un rapport par forme {collection, filter, sort, stages, collscan, blocking_sort}
+    """
+    reports = []
+    for collection, query, sort in QUERY_SHAPES:
+        cursor = db[collection].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        explanation = await cursor.explain()
+        winning_plan = explanation.get("queryPlanner", {}).get("winningPlan", {})
+        stages = _plan_stages(winning_plan)
+        reports.append({
+            "collection": collection,
+            "filter": query,
+            "sort": sort,
+            "stages": stages,
+            "collscan": "COLLSCAN" in stages,
+            "blocking_sort": "SORT" in stages,
+        })
+    return reports
@@ -25,6 +25,53 @@ class Settings(BaseSettings):
     ADMIN_EMAIL: str = os.getenv("ADMIN_EMAIL", "admin@makiti.com")
     ADMIN_PASSWORD: str = os.getenv("ADMIN_PASSWORD", "admin123")
 
+    # Recherche produits : intervalle de synchronisation de l'index en mémoire
+    SEARCH_SYNC_INTERVAL_SECONDS: int = int(os.getenv("SEARCH_SYNC_INTERVAL_SECONDS", "30"))
+
+    # Cache des produits : budget mémoire (octets) et durée de vie des entrées
+    PRODUCT_CACHE_MAX_BYTES: int = int(os.getenv("PRODUCT_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+    PRODUCT_CACHE_TTL_SECONDS: int = int(os.getenv("PRODUCT_CACHE_TTL_SECONDS", "60"))
+
+    # Clés de tri du catalogue (note, popularité) : intervalle de recalcul
+    RANK_KEYS_REFRESH_INTERVAL_SECONDS: int = int(os.getenv("RANK_KEYS_REFRESH_INTERVAL_SECONDS", "900"))
+
+    # Stocks répartis (ventes flash) : intervalle de rééquilibrage des
+    # compteurs et de mise à jour de products.stock_quantity
+    HOT_STOCK_SYNC_INTERVAL_SECONDS: float = float(os.getenv("HOT_STOCK_SYNC_INTERVAL_SECONDS", "5"))
+
+    # Réservations de stock des paniers : durée avant expiration
+    CART_HOLD_TTL_SECONDS: int = int(os.getenv("CART_HOLD_TTL_SECONDS", "900"))
+
+    # File de tâches (outbox) : workers par processus, attente entre deux
+    # scrutations, bail d'une tâche réclamée et nombre maximal de tentatives
+    JOB_WORKERS: int = int(os.getenv("JOB_WORKERS", "2"))
+    JOB_POLL_INTERVAL_SECONDS: float = float(os.getenv("JOB_POLL_INTERVAL_SECONDS", "1"))
+    JOB_LEASE_SECONDS: int = int(os.getenv("JOB_LEASE_SECONDS", "60"))
+    JOB_MAX_ATTEMPTS: int = int(os.getenv("JOB_MAX_ATTEMPTS", "8"))
+
+    # Clés d'idempotence : conservation des réponses et délai de reprise
+    # d'une exécution interrompue
+    IDEMPOTENCY_TTL_HOURS: int = int(os.getenv("IDEMPOTENCY_TTL_HOURS", "24"))
+    IDEMPOTENCY_LOCK_SECONDS: int = int(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "60"))
+
+    # Paniers en écriture différée : activation (un seul processus par
+    # utilisateur requis, désactivée par défaut), shards, plafond en mémoire, délai d'écriture, journal
+    # et taille du journal déclenchant un point de contrôle
+    CART_WRITE_BEHIND: bool = os.getenv("CART_WRITE_BEHIND", "false").lower() == "true"
+    CART_STORE_SHARDS: int = int(os.getenv("CART_STORE_SHARDS", "16"))
+    CART_STORE_MAX_CARTS: int = int(os.getenv("CART_STORE_MAX_CARTS", "10000"))
+    CART_FLUSH_DELAY_SECONDS: float = float(os.getenv("CART_FLUSH_DELAY_SECONDS", "2"))
+    CART_WAL_PATH: str = os.getenv("CART_WAL_PATH", "data/cart_wal.jsonl")
+    CART_WAL_CHECKPOINT_BYTES: int = int(os.getenv("CART_WAL_CHECKPOINT_BYTES", str(8 * 1024 * 1024)))
+
+    # Archivage des commandes livrées ou annulées : ancienneté (jours depuis
+    # le dernier changement de statut), taille des lots, intervalle entre deux
+    # passes et compresseur de la collection d'archive
+    ORDER_ARCHIVE_AFTER_DAYS: int = int(os.getenv("ORDER_ARCHIVE_AFTER_DAYS", "90"))
+    ORDER_ARCHIVE_BATCH_SIZE: int = int(os.getenv("ORDER_ARCHIVE_BATCH_SIZE", "500"))
+    ORDER_ARCHIVE_INTERVAL_SECONDS: float = float(os.getenv("ORDER_ARCHIVE_INTERVAL_SECONDS", "3600"))
+    ORDER_ARCHIVE_COMPRESSOR: str = os.getenv("ORDER_ARCHIVE_COMPRESSOR", "zstd")
+
     class Config:
         env_file = ".env"
         extra = "ignore"
@@ -17,27 +17,32 @@ Technologies utilisées:
 # ==================== IMPORTS FASTAPI ====================
 
 # FastAPI et ses dépendances
-from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, Form
+from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, Form, Query, Header, Request, Response
 # Middleware CORS pour autoriser les requêtes cross-origin (frontend)
 from fastapi.middleware.cors import CORSMiddleware
 # Formulaire OAuth2 pour la connexion
 from fastapi.security import OAuth2PasswordRequestForm
 # Pour servir les fichiers statiques (images uploadées)
 from fastapi.staticfiles import StaticFiles
+# Réponses envoyées en flux (exports)
+from fastapi.responses import StreamingResponse
 
 # ==================== IMPORTS PYTHON STANDARD ====================
 
-from datetime import datetime, timedelta  # Gestion des dates
+from datetime import date, datetime, timedelta  # Gestion des dates
 from bson import ObjectId                  # ID MongoDB
 import uvicorn                             # Serveur ASGI
 import os                                  # Opérations système
 import uuid                                # Génération d'identifiants uniques
 import shutil                              # Opérations sur les fichiers
+import asyncio                             # Tâches de fond
 
 # ==================== IMPORTS CONFIGURATION ====================
 
 # Connexion à la base de données MongoDB
 from app.config.database import get_database, close_mongo_connection
+# Index MongoDB créés au démarrage
+from app.config.indexes import ensure_indexes
 # Paramètres de l'application
 from app.config.settings import settings
 
@@ -46,7 +51,7 @@ from app.config.settings import settings
 # Modèles Pydantic pour la validation des données
 from app.models.user import UserCreate, UserResponse, Token, UserRole, SellerApprovalStatus, SellerRequest
 from app.models.product import ProductResponse, ProductCreate, ProductUpdate
-from app.models.shop import ShopResponse, ShopCreate
+from app.models.shop import ShopResponse, ShopCreate, ShopStats, SellerStatsResponse
 from typing import Optional, List
 from pydantic import BaseModel
 
@@ -55,10 +60,53 @@ from pydantic import BaseModel
 # Service d'envoi d'emails
 from app.services.email_service import (
     send_seller_approved_email,    # Email d'approbation vendeur
-    send_seller_rejected_email,    # Email de refus vendeur
-    send_new_order_email,          # Email nouvelle commande
-    send_order_status_email,       # Email changement statut commande
-    send_low_stock_alert           # Alerte stock faible
+    send_seller_rejected_email     # Email de refus vendeur
+)
+# Index en mémoire du catalogue (recherche plein texte, facettes, autocomplétion)
+from app.services.catalog_index import record_deletion
+from app.services.search_service import product_search_index
+from app.services.facet_service import product_facet_index, price_bucket_bounds, PRICE_BUCKET_EDGES
+from app.services.suggest_service import product_suggest_index
+# Clés de tri dénormalisées (prix, note, popularité)
+from app.services.ranking_service import SORT_MODES, DEFAULT_SORT, initial_rank_keys, run_rank_keys_loop
+# Cache en lecture des produits
+from app.services.product_cache import product_cache
+# Validation atomique des commandes (stock, commande, panier)
+from app.services.checkout_service import InsufficientStockError, order_line, place_order, quantities_by_product
+# File de tâches (outbox) et effets de bord des commandes
+from app.services.job_queue import run_worker
+import app.services.order_jobs  # Enregistre les gestionnaires de tâches
+# Clés d'idempotence des routes de création (Idempotency-Key)
+from app.services.idempotency import record_response, run_idempotent
+# Paniers en mémoire (écriture différée + journal)
+from app.services.cart_store import cart_store
+# Commandes par vendeur (vue matérialisée)
+from app.services.seller_orders import format_seller_order
+# Agrégats de ventes (rollups jour / mois / total)
+from app.services.rollup_service import MAX_RANGE_DAYS, seller_totals, top_products
+# Changements de statut des commandes (transitions, lots, notifications)
+from app.services.order_status_service import MAX_BULK_ORDERS, ORDER_STATUSES, change_order_status
+# Archive des commandes terminées (lecture avec repli sur l'archive)
+from app.services.order_archive import (
+    ensure_archive_collection, fetch_orders_page, find_all_orders, find_order, run_archive_loop
+)
+# Stocks répartis des produits chauds (ventes flash)
+from app.services import stock_shards
+# Réservations de stock des paniers
+from app.services.reservation_service import available_stock, place_hold, release_holds
+# Chargeurs groupés par requête (produits, utilisateurs, boutiques)
+from app.services.loaders import Loaders
+# Exports en flux NDJSON / CSV
+from app.services.export_service import (
+    stream_ndjson,
+    stream_csv,
+    product_export_row,
+    PRODUCT_EXPORT_FIELDS,
+    order_report_pipeline,
+    order_report_row,
+    ORDER_REPORT_FIELDS,
+    EXPORT_BATCH_SIZE,
+    MEDIA_TYPES,
 )
 
 # ==================== CONFIGURATION UPLOADS ====================
@@ -101,6 +149,19 @@ from app.utils.security import (
     ACCESS_TOKEN_EXPIRE_MINUTES, # Durée de validité du token
 )
 
+# Pagination par curseur (keyset) des listes
+from app.utils.pagination import fetch_page, clamp_limit, encode_cursor, decode_cursor, InvalidCursorError
+# Champs partiels (fields=) traduits en projections MongoDB
+from app.utils.projection import build_projection, InvalidFieldsError, PRODUCT_PROFILES, ORDER_PROFILES
+# Requêtes conditionnelles (ETag / Last-Modified)
+from app.utils.http_cache import (
+    compute_etag,
+    has_conditional_headers,
+    is_not_modified,
+    cache_headers,
+    not_modified_response,
+)
+
 # ==================== CRÉATION DE L'APPLICATION ====================
 
 # Initialisation de l'application FastAPI avec métadonnées
@@ -133,26 +194,110 @@ app.add_middleware(
 # Monte le dossier uploads pour servir les images via /uploads/nom_fichier
 app.mount("/uploads", StaticFiles(directory=UPLOAD_DIR), name="uploads")
 
+# ==================== INDEX DU CATALOGUE ====================
+
+# Index en mémoire tenus à jour à chaque écriture sur un produit
+CATALOG_INDEXES = [product_search_index, product_facet_index, product_suggest_index]
+
+def index_product(product: dict):
+    """Répercute la création ou la modification d'un produit dans les index"""
+    for catalog_index in CATALOG_INDEXES:
+        catalog_index.upsert(product)
+
+def unindex_product(product_id: str):
+    """Retire un produit supprimé des index"""
+    for catalog_index in CATALOG_INDEXES:
+        catalog_index.remove(product_id)
+
 # ==================== ÉVÉNEMENTS DE L'APPLICATION ====================
 
 @app.on_event("startup")
 async def startup_db_client():
     """
     Événement exécuté au démarrage de l'application
-    Établit la connexion à MongoDB
+    Établit la connexion à MongoDB et crée les index manquants
+    (registre déclaré dans app/config/indexes.py)
     """
-    await get_database()
+    db = await get_database()
+    await ensure_archive_collection(db)
+    await ensure_indexes(db)
     print("✅ Connecté à MongoDB")
+    
+    # Rejouer les mutations de paniers journalisées avant un arrêt brutal
+    restored = await cart_store.recover(db)
+    if restored:
+        print(f"✅ Paniers restaurés depuis le journal: {restored}")
+    
+    # Construire les index du catalogue puis les tenir synchronisés
+    for catalog_index in CATALOG_INDEXES:
+        stats = await catalog_index.rebuild(db)
+        print(f"✅ Index {catalog_index.label} construit: {stats['documents']} produits en {stats['duration_ms']} ms")
+        asyncio.create_task(
+            catalog_index.run_sync_loop(db, settings.SEARCH_SYNC_INTERVAL_SECONDS)
+        )
+    
+    # Recalcul périodique des clés de tri (note vendeur, ventes, popularité)
+    asyncio.create_task(run_rank_keys_loop(db, settings.RANK_KEYS_REFRESH_INTERVAL_SECONDS))
+    
+    # Rééquilibrage des stocks répartis et mise à jour de leur stock affiché
+    asyncio.create_task(stock_shards.run_hot_stock_loop(db, settings.HOT_STOCK_SYNC_INTERVAL_SECONDS))
+    
+    # Archivage des commandes livrées ou annulées (collection orders_archive)
+    asyncio.create_task(run_archive_loop(db, settings.ORDER_ARCHIVE_INTERVAL_SECONDS))
+    
+    # Workers de la file de tâches (emails, notifications, alertes de stock)
+    for worker_number in range(settings.JOB_WORKERS):
+        asyncio.create_task(run_worker(db, f"{os.getpid()}-{worker_number}"))
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
     """
     Événement exécuté à l'arrêt de l'application
-    Ferme proprement la connexion MongoDB
+    Écrit les paniers en attente puis ferme proprement la connexion MongoDB
     """
+    await cart_store.flush_all(await get_database())
     close_mongo_connection()
     print("✅ Déconnecté de MongoDB")
 
+# ==================== HELPERS PAGINATION ====================
+
+async def paginate(collection, query: dict, limit: Optional[int], after: Optional[str], **options):
+    """
+    Lit une page d'une collection et la met en forme pour la réponse API
+
+    Returns:
+        dict: {"items": [...], "next_cursor": str | None, "limit": int}
+
+    Raises:
+        HTTPException 400: Si le curseur `after` est invalide
+    """
+    try:
+        documents, next_cursor = await fetch_page(collection, query, limit=limit, after=after, **options)
+    except InvalidCursorError:
+        raise HTTPException(status_code=400, detail="Curseur de pagination invalide")
+    
+    for document in documents:
+        document["id"] = str(document["_id"])
+        del document["_id"]
+    
+    return {"items": documents, "next_cursor": next_cursor, "limit": clamp_limit(limit)}
+
+async def get_loaders() -> Loaders:
+    """Dépendance : chargeurs groupés propres à la requête en cours"""
+    return Loaders(await get_database())
+
+def parse_fields(fields: Optional[str], profiles: dict) -> Optional[dict]:
+    """
+    Traduit le paramètre `fields` en projection MongoDB
+    
+    Raises:
+        HTTPException 400: Si un nom de champ est invalide
+    """
+    try:
+        return build_projection(fields, profiles)
+    except InvalidFieldsError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 # ==================== ROUTES D'AUTHENTIFICATION ====================
 
 @app.post("/auth/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
@@ -260,11 +405,13 @@ async def create_product(product: ProductCreate, current_user: dict = Depends(ge
     # Créer le produit
     product_dict = product.dict()
     product_dict["seller_id"] = str(user["_id"])
+    product_dict.update(initial_rank_keys(user))
     product_dict["created_at"] = product_dict["updated_at"] = datetime.utcnow()
     
     # Insérer le produit dans la base de données
     result = await db.products.insert_one(product_dict)
     product_dict["id"] = str(result.inserted_id)
+    index_product(product_dict)
     
     return product_dict
 
@@ -620,6 +767,7 @@ async def create_shop(shop: ShopCreate, current_user: dict = Depends(get_current
     # Insérer la boutique dans la base de données
     result = await db.shops.insert_one(shop_dict)
     shop_dict["id"] = str(result.inserted_id)
+    product_suggest_index.add_shop(shop_dict["owner_id"], shop_dict["id"], shop_dict["name"])
     
     return shop_dict
 
@@ -648,22 +796,59 @@ async def get_my_shop(current_user: dict = Depends(get_current_user)):
     return shop
 
 @app.get("/shops/seller/{seller_id}")
-async def get_shop_by_seller(seller_id: str):
-    """Récupérer la boutique d'un vendeur par son ID (public)"""
+async def get_shop_by_seller(seller_id: str, request: Request, response: Response):
+    """
+    Récupérer la boutique d'un vendeur par son ID (public)
+    
+    Supporte If-None-Match / If-Modified-Since : si la version n'a pas changé,
+    répond 304 après une simple lecture de `updated_at`.
+    """
     db = await get_database()
     
+    if has_conditional_headers(request):
+        version = await db.shops.find_one({"owner_id": seller_id}, {"updated_at": 1})
+        if not version:
+            raise HTTPException(status_code=404, detail="Boutique non trouvée")
+        etag = compute_etag(version["_id"], version.get("updated_at"))
+        if is_not_modified(request, etag, version.get("updated_at")):
+            return not_modified_response(etag, version.get("updated_at"))
+    
     shop = await db.shops.find_one({"owner_id": seller_id})
     if not shop:
         raise HTTPException(status_code=404, detail="Boutique non trouvée")
     
+    response.headers.update(cache_headers(
+        compute_etag(shop["_id"], shop.get("updated_at")),
+        shop.get("updated_at")
+    ))
     shop["id"] = str(shop["_id"])
     del shop["_id"]
     return shop
 
 @app.get("/sellers/{seller_id}/public")
-async def get_seller_public_profile(seller_id: str):
-    """Récupérer le profil public d'un vendeur"""
+async def get_seller_public_profile(
+    seller_id: str,
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=100),
+    after: Optional[str] = None,
+    fields: Optional[str] = None
+):
+    """
+    Récupérer le profil public d'un vendeur
+    
+    Avec `limit` ou `after`, les produits sont paginés par curseur et
+    `products_next_cursor` donne le jeton de la page suivante.
+    `fields` : profil (card, detail) ou liste des champs produits à renvoyer.
+    
+    La version du profil (ETag) est calculée à partir de lectures légères ;
+    si le client la possède déjà, la réponse 304 évite de relire les
+    produits et les avis. Pas de Last-Modified : le retrait d'un produit
+    ne laisse aucune date plus récente, seul l'ETag (nombre de produits)
+    le reflète.
+    """
     db = await get_database()
+    projection = parse_fields(fields, PRODUCT_PROFILES)
     
     # Récupérer le vendeur
     seller = await db.users.find_one({"_id": ObjectId(seller_id), "role": "seller"})
@@ -673,18 +858,56 @@ async def get_seller_public_profile(seller_id: str):
     # Récupérer la boutique
     shop = await db.shops.find_one({"owner_id": seller_id})
     
-    # Récupérer uniquement les produits publiés du vendeur
-    products = []
-    cursor = db.products.find({"seller_id": seller_id, "status": "published"})
-    async for product in cursor:
-        product["id"] = str(product["_id"])
-        del product["_id"]
-        products.append(product)
+    product_query = {"seller_id": seller_id, "status": "published"}
+    total_products = await db.products.count_documents(product_query)
     
-    # Récupérer les avis
+    async def profile_etag(review_versions: List[dict]) -> str:
+        """Version du profil : dernières modifications des produits et des avis affichés"""
+        latest_product = await db.products.find_one(
+            product_query, {"updated_at": 1}, sort=[("updated_at", -1)]
+        )
+        return compute_etag(
+            seller_id,
+            seller.get("updated_at"),
+            seller.get("average_rating"),
+            seller.get("total_reviews"),
+            shop.get("updated_at") if shop else None,
+            latest_product.get("updated_at") if latest_product else None,
+            total_products,
+            [(r["_id"], r.get("seller_reply_at")) for r in review_versions],
+            request.url.query
+        )
+    
+    etag = None
+    if has_conditional_headers(request):
+        review_versions = await db.reviews.find(
+            {"seller_id": seller_id}, {"created_at": 1, "seller_reply_at": 1}
+        ).sort("created_at", -1).limit(10).to_list(10)
+        etag = await profile_etag(review_versions)
+        if is_not_modified(request, etag, None):
+            return not_modified_response(etag, None)
+    
+    # Récupérer uniquement les produits publiés du vendeur
+    products_next_cursor = None
+    if limit is not None or after is not None:
+        page = await paginate(db.products, product_query, limit, after, projection=projection)
+        products = page["items"]
+        products_next_cursor = page["next_cursor"]
+    else:
+        products = []
+        cursor = db.products.find(product_query, projection)
+        async for product in cursor:
+            product["id"] = str(product["_id"])
+            del product["_id"]
+            products.append(product)
+    
+    # Récupérer les avis (ils servent aussi à la version du profil)
+    review_documents = await db.reviews.find({"seller_id": seller_id}).sort("created_at", -1).limit(10).to_list(10)
+    if etag is None:
+        etag = await profile_etag(review_documents)
+    response.headers.update(cache_headers(etag, None))
     reviews = []
-    review_cursor = db.reviews.find({"seller_id": seller_id}).sort("created_at", -1).limit(10)
-    async for review in review_cursor:
+    for review in review_documents:
         review["id"] = str(review["_id"])
         del review["_id"]
         reviews.append(review)
@@ -712,9 +935,10 @@ async def get_seller_public_profile(seller_id: str):
             "phone": shop.get("phone") if shop else None
         } if shop else None,
         "products": products,
+        "products_next_cursor": products_next_cursor,
         "reviews": reviews,
         "stats": {
-            "total_products": len(products),
+            "total_products": total_products,
             "total_reviews": total_reviews,
             "average_rating": avg_rating
         }
@@ -723,9 +947,21 @@ async def get_seller_public_profile(seller_id: str):
 # ==================== ROUTES DES PRODUITS VENDEUR ====================
 
 @app.get("/seller/products")
-async def get_seller_products(current_user: dict = Depends(get_current_user)):
-    """Récupérer tous les produits du vendeur connecté"""
+async def get_seller_products(
+    limit: Optional[int] = Query(None, ge=1, le=100),
+    after: Optional[str] = None,
+    fields: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Récupérer les produits du vendeur connecté
+    
+    Sans `limit` ni `after`, renvoie la liste complète (comportement historique).
+    Sinon renvoie une page {"items", "next_cursor", "limit"}.
+    `fields` : profil (card, detail) ou liste de champs séparés par des virgules.
+    """
     db = await get_database()
+    projection = parse_fields(fields, PRODUCT_PROFILES)
     
     user = await db.users.find_one({"_id": ObjectId(current_user["user_id"])})
     if user["role"] != UserRole.SELLER:
@@ -734,8 +970,12 @@ async def get_seller_products(current_user: dict = Depends(get_current_user)):
             detail="Accès réservé aux vendeurs"
         )
     
+    query = {"seller_id": str(user["_id"])}
+    if limit is not None or after is not None:
+        return await paginate(db.products, query, limit, after, projection=projection)
+    
     products = []
-    cursor = db.products.find({"seller_id": str(user["_id"])})
+    cursor = db.products.find(query, projection)
     async for product in cursor:
         product["id"] = str(product["_id"])
         del product["_id"]
@@ -757,6 +997,7 @@ async def get_seller_product(product_id: str, current_user: dict = Depends(get_c
     if product["seller_id"] != str(user["_id"]):
         raise HTTPException(status_code=403, detail="Ce produit ne vous appartient pas")
     
+    await stock_shards.with_live_stock(db, [product])
     product["id"] = str(product["_id"])
     del product["_id"]
     return product
@@ -783,12 +1024,21 @@ async def update_seller_product(
     update_data = {k: v for k, v in product_update.dict().items() if v is not None}
     update_data["updated_at"] = datetime.utcnow()
     
+    # Stock réparti : le réassort est appliqué aux compteurs
+    shards = stock_shards.shard_count(product)
+    if shards and "stock_quantity" in update_data:
+        update_data["stock_quantity"] = await stock_shards.set_stock(
+            db, product_id, update_data["stock_quantity"], shards
+        )
+    
     await db.products.update_one(
         {"_id": ObjectId(product_id)},
         {"$set": update_data}
     )
+    product_cache.invalidate(product_id)
     
     updated_product = await db.products.find_one({"_id": ObjectId(product_id)})
+    index_product(updated_product)
     updated_product["id"] = str(updated_product["_id"])
     del updated_product["_id"]
     return updated_product
@@ -808,14 +1058,41 @@ async def delete_seller_product(product_id: str, current_user: dict = Depends(ge
         raise HTTPException(status_code=403, detail="Ce produit ne vous appartient pas")
     
     await db.products.delete_one({"_id": ObjectId(product_id)})
+    await db.stock_shards.delete_many({"product_id": product_id})
+    product_cache.invalidate(product_id)
+    # Index des autres processus : retiré à leur prochaine synchronisation
+    await record_deletion(db, product_id)
+    unindex_product(product_id)
     return {"message": "Produit supprimé avec succès"}
 
 # ==================== ROUTES PUBLIQUES PRODUITS ====================
 
 @app.get("/products")
-async def get_all_products(category: Optional[str] = None, shop_id: Optional[str] = None, search: Optional[str] = None):
-    """Récupérer tous les produits publiés (public) - les brouillons ne sont pas visibles"""
+async def get_all_products(
+    category: Optional[str] = None,
+    shop_id: Optional[str] = None,
+    search: Optional[str] = None,
+    price_bucket: Optional[int] = Query(None, ge=0, lt=len(PRICE_BUCKET_EDGES)),
+    sort: str = Query(DEFAULT_SORT, regex="^(" + "|".join(SORT_MODES) + ")$"),
+    limit: Optional[int] = Query(None, ge=1, le=100),
+    after: Optional[str] = None,
+    fields: Optional[str] = None
+):
+    """
+    Récupérer les produits publiés (public) - les brouillons ne sont pas visibles
+    
+    `price_bucket` filtre sur une tranche de prix de GET /products/facets.
+    `sort` : newest (défaut), price_asc, price_desc, rating (note du vendeur)
+    ou popularity (meilleures ventes) ; ignoré pour une recherche, classée
+    par pertinence.
+    `fields` : profil (card, detail) ou liste de champs séparés par des virgules.
+    Pagination par curseur : passer `limit` (et `after` pour les pages suivantes)
+    renvoie {"items", "next_cursor", "limit"}, trié par (clé de tri, _id).
+    Sans ces paramètres, la liste complète est renvoyée.
+    """
     db = await get_database()
+    projection = parse_fields(fields, PRODUCT_PROFILES)
+    sort_field, direction = SORT_MODES[sort]
     
     # Construire la requête - afficher uniquement les produits publiés
     query = {"status": "published"}
@@ -823,12 +1100,24 @@ async def get_all_products(category: Optional[str] = None, shop_id: Optional[str
         query["category"] = category
     if shop_id:
         query["shop_id"] = shop_id
+    if price_bucket is not None:
+        min_price, max_price = price_bucket_bounds(price_bucket)
+        query["price"] = {"$gte": min_price, **({"$lt": max_price} if max_price is not None else {})}
     if search:
-        # Recherche par nom (insensible à la casse)
+        if product_search_index.ready:
+            # Recherche plein texte classée par pertinence (index en mémoire)
+            return await search_products(db, search, category, shop_id, price_bucket, limit, after, projection)
+        # Index pas encore construit : recherche par nom (insensible à la casse)
         query["name"] = {"$regex": search, "$options": "i"}
     
+    if limit is not None or after is not None:
+        return await paginate(
+            db.products, query, limit, after,
+            sort_field=sort_field, direction=direction, projection=projection
+        )
+    
     products = []
-    cursor = db.products.find(query).sort("created_at", -1)
+    cursor = db.products.find(query, projection).sort([(sort_field, direction), ("_id", direction)])
     async for product in cursor:
         product["id"] = str(product["_id"])
         del product["_id"]
@@ -836,15 +1125,245 @@ async def get_all_products(category: Optional[str] = None, shop_id: Optional[str
     
     return products
 
+async def search_products(
+    db,
+    search: str,
+    category: Optional[str],
+    shop_id: Optional[str],
+    price_bucket: Optional[int],
+    limit: Optional[int],
+    after: Optional[str],
+    projection: Optional[dict] = None
+):
+    """
+    Recherche via l'index inversé puis charge uniquement la page demandée
+    
+    Le curseur encode le rang du dernier résultat renvoyé.
+    """
+    paginated = limit is not None or after is not None
+    
+    offset = 0
+    if after:
+        try:
+            offset, _ = decode_cursor(after, "_rank")
+        except InvalidCursorError:
+            raise HTTPException(status_code=400, detail="Curseur de pagination invalide")
+        if not isinstance(offset, int) or offset < 0:
+            raise HTTPException(status_code=400, detail="Curseur de pagination invalide")
+    
+    page_size = clamp_limit(limit)
+    # Un résultat de plus que la page pour savoir s'il existe une suite
+    top_k = offset + page_size + 1 if paginated else None
+    ranked = product_search_index.search(
+        search,
+        category=category,
+        shop_id=shop_id,
+        price_range=price_bucket_bounds(price_bucket) if price_bucket is not None else None,
+        top_k=top_k
+    )
+    page = ranked[offset:offset + page_size] if paginated else ranked
+    page_ids = [product_id for product_id, _ in page]
+    
+    # Le filtre de statut écarte les produits dépubliés depuis la dernière synchro
+    documents = {}
+    cursor = db.products.find(
+        {"_id": {"$in": [ObjectId(i) for i in page_ids]}, "status": "published"},
+        projection
+    )
+    async for product in cursor:
+        product["id"] = str(product["_id"])
+        del product["_id"]
+        documents[product["id"]] = product
+    products = [documents[i] for i in page_ids if i in documents]
+    
+    if not paginated:
+        return products
+    
+    next_cursor = None
+    if offset + page_size < len(ranked):
+        next_cursor = encode_cursor("_rank", {"_rank": offset + page_size, "_id": page_ids[-1]})
+    return {"items": products, "next_cursor": next_cursor, "limit": page_size}
+
+@app.get("/products/export")
+async def export_products(
+    export_format: str = Query("ndjson", alias="format", regex="^(ndjson|csv)$"),
+    category: Optional[str] = None,
+    shop_id: Optional[str] = None,
+    updated_since: Optional[datetime] = None,
+    updated_until: Optional[datetime] = None
+):
+    """
+    Exporter le catalogue publié en flux NDJSON ou CSV (flux partenaires)
+    
+    Les produits sont envoyés au fur et à mesure qu'ils sont lus : la mémoire
+    utilisée ne dépend pas de la taille du catalogue.
+    `updated_since` / `updated_until` bornent la date de dernière modification.
+    """
+    db = await get_database()
+    
+    query = {"status": "published"}
+    if category:
+        query["category"] = category
+    if shop_id:
+        query["shop_id"] = shop_id
+    if updated_since or updated_until:
+        query["updated_at"] = {}
+        if updated_since:
+            query["updated_at"]["$gte"] = updated_since
+        if updated_until:
+            query["updated_at"]["$lt"] = updated_until
+    
+    projection = {field: 1 for field in PRODUCT_EXPORT_FIELDS if field != "id"}
+    cursor = db.products.find(query, projection).batch_size(EXPORT_BATCH_SIZE)
+    
+    if export_format == "csv":
+        body = stream_csv(cursor, PRODUCT_EXPORT_FIELDS, transform=product_export_row)
+    else:
+        body = stream_ndjson(cursor, transform=product_export_row)
+    
+    filename = f"catalogue_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.{export_format}"
+    return StreamingResponse(
+        body,
+        media_type=MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@app.get("/products/facets")
+async def get_product_facets(
+    category: Optional[str] = None,
+    shop_id: Optional[str] = None,
+    price_bucket: Optional[int] = Query(None, ge=0, lt=len(PRICE_BUCKET_EDGES)),
+    search: Optional[str] = None
+):
+    """
+    Compter les produits publiés par catégorie, tranche de prix et boutique
+    
+    Les comptes sont calculés en mémoire pour la combinaison de filtres donnée ;
+    le compte d'une facette ignore son propre filtre.
+    """
+    if not product_facet_index.ready:
+        raise HTTPException(status_code=503, detail="Index des facettes en cours de construction")
+    
+    restrict_to = None
+    if search:
+        ranked = product_search_index.search(search)
+        restrict_to = product_facet_index.bits_for_ids(product_id for product_id, _ in ranked)
+    
+    return product_facet_index.counts(
+        category=category,
+        price=price_bucket,
+        shop_id=shop_id,
+        restrict_to=restrict_to
+    )
+
+@app.get("/products/suggest")
+async def suggest_products(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(8, ge=1, le=20)
+):
+    """
+    Suggestions d'autocomplétion pour la barre de recherche (public)
+    
+    Renvoie les noms de produits, boutiques et catégories commençant par `q`
+    (sur n'importe quel mot), les plus populaires en premier.
+    """
+    if not product_suggest_index.ready:
+        raise HTTPException(status_code=503, detail="Index d'autocomplétion en cours de construction")
+    
+    return {"query": q, "suggestions": product_suggest_index.suggest(q, limit)}
+
+@app.post("/admin/search/rebuild")
+async def rebuild_search_index(current_user: dict = Depends(get_current_user)):
+    """Reconstruire les index du catalogue : recherche, facettes et autocomplétion (admin uniquement)"""
+    db = await get_database()
+    
+    admin = await db.users.find_one({"_id": ObjectId(current_user["user_id"])})
+    if admin["role"] != UserRole.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Accès réservé aux administrateurs"
+        )
+    
+    stats = {}
+    for catalog_index in CATALOG_INDEXES:
+        stats[catalog_index.label] = await catalog_index.rebuild(db)
+    return {"message": "Index du catalogue reconstruits", "indexes": stats}
+
+@app.put("/admin/products/{product_id}/hot-stock")
+async def set_product_hot_stock(
+    product_id: str,
+    shards: int = Query(..., ge=0, le=stock_shards.MAX_SHARDS),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Répartir le stock d'un produit sur plusieurs compteurs pour une vente flash
+    (admin uniquement) ; `shards=0` ramène le stock sur le produit
+    """
+    db = await get_database()
+    
+    admin = await db.users.find_one({"_id": ObjectId(current_user["user_id"])})
+    if admin["role"] != UserRole.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Accès réservé aux administrateurs"
+        )
+    
+    product = await db.products.find_one({"_id": ObjectId(product_id)}, {"stock_shards": 1})
+    if not product:
+        raise HTTPException(status_code=404, detail="Produit non trouvé")
+    
+    current = stock_shards.shard_count(product)
+    if current == shards:
+        return {"message": "Aucun changement", "shards": shards}
+    
+    # Changement du nombre de compteurs : rapatrier puis répartir à nouveau
+    stock = None
+    if current:
+        stock = await stock_shards.disable(db, product_id)
+    if shards:
+        stock = await stock_shards.enable(db, product_id, shards)
+        if stock is None:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Stock modifié pendant la répartition, réessayez"
+            )
+    
+    return {"message": "Stock du produit mis à jour", "shards": shards, "stock_quantity": stock}
+
 @app.get("/products/{product_id}")
-async def get_product(product_id: str):
-    """Récupérer un produit par son ID (public)"""
+async def get_product(product_id: str, request: Request, response: Response):
+    """
+    Récupérer un produit par son ID (public)
+    
+    Supporte If-None-Match / If-Modified-Since : si `updated_at` n'a pas
+    changé, répond 304 sans relire ni sérialiser le document complet.
+    """
     db = await get_database()
     
-    product = await db.products.find_one({"_id": ObjectId(product_id)})
+    version = None
+    if has_conditional_headers(request):
+        version = await db.products.find_one({"_id": ObjectId(product_id)}, {"updated_at": 1, "stock_shards": 1})
+        if not version:
+            raise HTTPException(status_code=404, detail="Produit non trouvé")
+        etag = compute_etag(product_id, version.get("updated_at"))
+        # Stock réparti : le stock réel change sans `updated_at`, pas de 304
+        if not stock_shards.shard_count(version) and is_not_modified(request, etag, version.get("updated_at")):
+            return not_modified_response(etag, version.get("updated_at"))
+    
+    product = await product_cache.get(db, product_id)
+    if product and version and product.get("updated_at") != version.get("updated_at"):
+        # Entrée du cache plus ancienne que la version lue : relire MongoDB
+        product = await product_cache.get(db, product_id, fresh=True)
     if not product:
         raise HTTPException(status_code=404, detail="Produit non trouvé")
     
+    # Stock réel des produits répartis : somme de leurs compteurs
+    await stock_shards.with_live_stock(db, [product])
+    
+    response.headers.update(cache_headers(
+        compute_etag(product_id, product.get("updated_at")),
+        product.get("updated_at")
+    ))
     product["id"] = str(product["_id"])
     del product["_id"]
     return product
@@ -933,12 +1452,14 @@ async def create_product_with_image(
         "images": images,
         "seller_id": str(user["_id"]),
         "is_active": True,
+        **initial_rank_keys(user),
         "created_at": datetime.utcnow(),
         "updated_at": datetime.utcnow(),
     }
     
     result = await db.products.insert_one(product_dict)
     product_dict["id"] = str(result.inserted_id)
+    index_product(product_dict)
     
     # Supprimer _id ajouté par MongoDB (non sérialisable)
     if "_id" in product_dict:
@@ -984,6 +1505,7 @@ async def update_product_image(
         {"_id": ObjectId(product_id)},
         {"$set": {"images": [image_url], "updated_at": datetime.utcnow()}}
     )
+    product_cache.invalidate(product_id)
     
     return {"message": "Image mise à jour", "image_url": image_url}
 
@@ -1099,20 +1621,23 @@ class CartItem(BaseModel):
     quantity: int = 1
 
 @app.get("/cart")
-async def get_cart(current_user: dict = Depends(get_current_user)):
+async def get_cart(
+    current_user: dict = Depends(get_current_user),
+    loaders: Loaders = Depends(get_loaders)
+):
     """Récupérer le panier de l'utilisateur"""
     db = await get_database()
     
-    cart = await db.carts.find_one({"user_id": current_user["user_id"]})
-    if not cart:
+    items = await cart_store.get(db, current_user["user_id"])
+    if not items:
         return {"items": [], "total": 0}
     
-    # Enrichir les items avec les détails des produits
+    # Enrichir les items avec les détails des produits (une seule requête)
     enriched_items = []
     total = 0
     
-    for item in cart.get("items", []):
-        product = await db.products.find_one({"_id": ObjectId(item["product_id"])})
+    products = await loaders.products.load_many(item["product_id"] for item in items)
+    for item, product in zip(items, products):
         if product:
             item_total = product["price"] * item["quantity"]
             enriched_items.append({
@@ -1137,55 +1662,26 @@ async def add_to_cart(
     cart_item: CartItem,
     current_user: dict = Depends(get_current_user)
 ):
-    """Ajouter un produit au panier"""
+    """Ajouter un produit au panier (réserve le stock correspondant)"""
     db = await get_database()
     
-    # Vérifier que le produit existe
-    product = await db.products.find_one({"_id": ObjectId(cart_item.product_id)})
+    # Vérifier que le produit existe ; stock relu dans MongoDB pour la réservation
+    product = await product_cache.get(db, cart_item.product_id, fresh=True)
     if not product:
         raise HTTPException(status_code=404, detail="Produit non trouvé")
+    await stock_shards.with_live_stock(db, [product])
     
-    # Vérifier le stock
-    if product.get("stock_quantity", 0) < cart_item.quantity:
-        raise HTTPException(status_code=400, detail="Stock insuffisant")
+    # Quantité déjà présente dans le panier
+    items = await cart_store.get(db, current_user["user_id"])
+    existing_item = next((item for item in items if item["product_id"] == cart_item.product_id), None)
     
-    # Récupérer ou créer le panier
-    cart = await db.carts.find_one({"user_id": current_user["user_id"]})
+    # Réserver la quantité totale de la ligne (stock moins les réservations des autres paniers)
+    new_quantity = cart_item.quantity + (existing_item["quantity"] if existing_item else 0)
+    if not await place_hold(db, current_user["user_id"], product, new_quantity):
+        raise HTTPException(status_code=400, detail="Stock insuffisant")
     
-    if not cart:
-        # Créer un nouveau panier
-        await db.carts.insert_one({
-            "user_id": current_user["user_id"],
-            "items": [{"product_id": cart_item.product_id, "quantity": cart_item.quantity}],
-            "created_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow()
-        })
-    else:
-        # Vérifier si le produit est déjà dans le panier
-        existing_item = next(
-            (item for item in cart.get("items", []) if item["product_id"] == cart_item.product_id),
-            None
-        )
-        
-        if existing_item:
-            # Mettre à jour la quantité
-            new_quantity = existing_item["quantity"] + cart_item.quantity
-            if new_quantity > product.get("stock_quantity", 0):
-                raise HTTPException(status_code=400, detail="Stock insuffisant")
-            
-            await db.carts.update_one(
-                {"user_id": current_user["user_id"], "items.product_id": cart_item.product_id},
-                {"$set": {"items.$.quantity": new_quantity, "updated_at": datetime.utcnow()}}
-            )
-        else:
-            # Ajouter le nouveau produit
-            await db.carts.update_one(
-                {"user_id": current_user["user_id"]},
-                {
-                    "$push": {"items": {"product_id": cart_item.product_id, "quantity": cart_item.quantity}},
-                    "$set": {"updated_at": datetime.utcnow()}
-                }
-            )
+    # Ajouter la ligne ou mettre à jour sa quantité (écrit en différé dans MongoDB)
+    await cart_store.set_quantity(db, current_user["user_id"], cart_item.product_id, new_quantity)
     
     return {"message": "Produit ajouté au panier"}
 
@@ -1199,21 +1695,28 @@ async def update_cart_item(
     
     if cart_item.quantity <= 0:
         # Supprimer l'item si quantité <= 0
-        await db.carts.update_one(
-            {"user_id": current_user["user_id"]},
-            {"$pull": {"items": {"product_id": cart_item.product_id}}}
-        )
+        await cart_store.remove(db, current_user["user_id"], cart_item.product_id)
+        await release_holds(db, current_user["user_id"], [cart_item.product_id])
         return {"message": "Produit retiré du panier"}
     
-    # Vérifier le stock
-    product = await db.products.find_one({"_id": ObjectId(cart_item.product_id)})
-    if product and cart_item.quantity > product.get("stock_quantity", 0):
+    # Seule une ligne existante est modifiée : pas de réservation sans ligne
+    items = await cart_store.get(db, current_user["user_id"])
+    if not any(item["product_id"] == cart_item.product_id for item in items):
+        raise HTTPException(status_code=404, detail="Produit absent du panier")
+    
+    # Ajuster la réservation (stock relu dans MongoDB)
+    product = await product_cache.get(db, cart_item.product_id, fresh=True)
+    await stock_shards.with_live_stock(db, [product])
+    if product and not await place_hold(db, current_user["user_id"], product, cart_item.quantity):
         raise HTTPException(status_code=400, detail="Stock insuffisant")
     
-    await db.carts.update_one(
-        {"user_id": current_user["user_id"], "items.product_id": cart_item.product_id},
-        {"$set": {"items.$.quantity": cart_item.quantity, "updated_at": datetime.utcnow()}}
+    items = await cart_store.set_quantity(
+        db, current_user["user_id"], cart_item.product_id, cart_item.quantity, create=False
     )
+    if not any(item["product_id"] == cart_item.product_id for item in items):
+        # Ligne retirée entre-temps : la réservation posée ne doit pas survivre
+        await release_holds(db, current_user["user_id"], [cart_item.product_id])
+        raise HTTPException(status_code=404, detail="Produit absent du panier")
     
     return {"message": "Panier mis à jour"}
 
@@ -1225,10 +1728,8 @@ async def remove_from_cart(
     """Retirer un produit du panier"""
     db = await get_database()
     
-    await db.carts.update_one(
-        {"user_id": current_user["user_id"]},
-        {"$pull": {"items": {"product_id": product_id}}}
-    )
+    await cart_store.remove(db, current_user["user_id"], product_id)
+    await release_holds(db, current_user["user_id"], [product_id])
     
     return {"message": "Produit retiré du panier"}
 
@@ -1237,55 +1738,66 @@ async def clear_cart(current_user: dict = Depends(get_current_user)):
     """Vider le panier"""
     db = await get_database()
     
-    await db.carts.update_one(
-        {"user_id": current_user["user_id"]},
-        {"$set": {"items": [], "updated_at": datetime.utcnow()}}
-    )
+    await cart_store.clear(db, current_user["user_id"])
+    await release_holds(db, current_user["user_id"])
     
     return {"message": "Panier vidé"}
 
 # ==================== ROUTES HISTORIQUE D'ACHATS ====================
 
-@app.get("/orders/history")
-async def get_order_history(current_user: dict = Depends(get_current_user)):
-    """Récupérer l'historique des commandes de l'utilisateur"""
-    db = await get_database()
+async def list_my_orders(
+    db,
+    user_id: str,
+    projection: Optional[dict],
+    limit: Optional[int],
+    after: Optional[str]
+):
+    """
+    Commandes d'un client, des plus récentes aux plus anciennes
     
-    orders = []
-    cursor = db.orders.find({"user_id": current_user["user_id"]}).sort("created_at", -1)
+    Paginé par curseur sur (created_at, _id) si `limit` ou `after` est fourni
+    (enveloppe {"items", "next_cursor", "limit"}), sinon liste complète.
+    Les commandes archivées ne sont lues qu'au-delà de la fenêtre chaude
+    (voir order_archive).
+    """
+    query = {"user_id": user_id}
+    if limit is not None or after is not None:
+        try:
+            orders, next_cursor = await fetch_orders_page(db, query, limit, after, projection)
+        except InvalidCursorError:
+            raise HTTPException(status_code=400, detail="Curseur de pagination invalide")
+    else:
+        orders = await find_all_orders(db, query, projection)
     
-    async for order in cursor:
+    for order in orders:
         order["id"] = str(order["_id"])
         del order["_id"]
-        orders.append(order)
     
+    if limit is not None or after is not None:
+        return {"items": orders, "next_cursor": next_cursor, "limit": clamp_limit(limit)}
     return orders
 
-@app.get("/orders/my-orders")
-async def get_my_orders(current_user: dict = Depends(get_current_user)):
-    """Récupérer les commandes de l'utilisateur avec détails des produits"""
-    db = await get_database()
-    
-    orders = []
-    cursor = db.orders.find({"user_id": current_user["user_id"]}).sort("created_at", -1)
+def enrich_orders(orders: List[dict]):
+    """
+    Met en forme les lignes depuis leur instantané produit et formate l'adresse de livraison
     
-    async for order in cursor:
-        order["id"] = str(order["_id"])
-        del order["_id"]
-        
-        # Enrichir les items avec les détails des produits
+    Aucune lecture de `products` : les lignes portent nom, image et prix
+    (commandes antérieures complétées par backfill_order_snapshots.py).
+    """
+    for order in orders:
         enriched_items = []
         for item in order.get("items", []):
-            product = await db.products.find_one({"_id": ObjectId(item.get("product_id", ""))}) if item.get("product_id") else None
             enriched_items.append({
                 "product_id": item.get("product_id"),
                 "quantity": item.get("quantity", 1),
                 "price": item.get("unit_price", item.get("price", 0)),
                 "product": {
-                    "id": str(product["_id"]) if product else None,
-                    "name": item.get("product_name", product["name"] if product else "Produit inconnu"),
-                    "images": product.get("images", []) if product else [item.get("product_image")],
-                } if product or item.get("product_name") else None
+                    "id": item.get("product_id"),
+                    "name": item.get("product_name") or "Produit inconnu",
+                    "images": [item["product_image"]] if item.get("product_image") else [],
+                    "category": item.get("category"),
+                    "shop_id": item.get("shop_id"),
+                }
             })
         
         order["items"] = enriched_items
@@ -1294,10 +1806,65 @@ async def get_my_orders(current_user: dict = Depends(get_current_user)):
         shipping = order.get("shipping_address", {})
         if isinstance(shipping, dict):
             order["shipping_address"] = f"{shipping.get('full_name', '')}, {shipping.get('address', '')}, {shipping.get('city', '')} {shipping.get('postal_code', '')}"
-        
-        orders.append(order)
+
+@app.get("/orders/history")
+async def get_order_history(
+    fields: Optional[str] = None,
+    summary: bool = False,
+    limit: Optional[int] = Query(None, ge=1),
+    after: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Récupérer l'historique des commandes de l'utilisateur
     
-    return orders
+    `fields` : profil (card, summary, detail) ou liste de champs séparés par des virgules.
+    `summary=true` : id, date, total, statut et nombre d'articles uniquement.
+    `limit` / `after` : pagination par curseur (voir list_my_orders).
+    """
+    db = await get_database()
+    projection = ORDER_PROFILES["summary"] if summary else parse_fields(fields, ORDER_PROFILES)
+    
+    return await list_my_orders(db, current_user["user_id"], projection, limit, after)
+
+@app.get("/orders/my-orders")
+async def get_my_orders(
+    summary: bool = False,
+    limit: Optional[int] = Query(None, ge=1),
+    after: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Récupérer les commandes de l'utilisateur avec détails des produits
+    
+    `summary=true` : résumé de chaque commande, le détail d'une commande
+    ouverte est lu par GET /orders/my-orders/{order_id}.
+    `limit` / `after` : pagination par curseur.
+    """
+    db = await get_database()
+    
+    if summary:
+        return await list_my_orders(db, current_user["user_id"], ORDER_PROFILES["summary"], limit, after)
+    
+    result = await list_my_orders(db, current_user["user_id"], None, limit, after)
+    enrich_orders(result["items"] if isinstance(result, dict) else result)
+    return result
+
+@app.get("/orders/my-orders/{order_id}")
+async def get_my_order(order_id: str, current_user: dict = Depends(get_current_user)):
+    """Récupérer le détail d'une commande de l'utilisateur (format de /orders/my-orders)"""
+    db = await get_database()
+    
+    if not ObjectId.is_valid(order_id):
+        raise HTTPException(status_code=404, detail="Commande non trouvée")
+    order = await find_order(db, {"_id": ObjectId(order_id), "user_id": current_user["user_id"]})
+    if not order:
+        raise HTTPException(status_code=404, detail="Commande non trouvée")
+    
+    order["id"] = str(order["_id"])
+    del order["_id"]
+    enrich_orders([order])
+    return order
 
 # ==================== ROUTES CHECKOUT & COMMANDES ====================
 
@@ -1314,131 +1881,110 @@ class CheckoutRequest(BaseModel):
     delivery_method: str = "delivery"  # "delivery" ou "pickup"
 
 @app.post("/checkout")
-async def create_order(
+async def checkout(
     checkout_data: CheckoutRequest,
-    current_user: dict = Depends(get_current_user)
+    request: Request,
+    current_user: dict = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
+    """
+    Créer une commande à partir du panier
+    
+    Avec un en-tête Idempotency-Key, une requête rejouée renvoie la commande
+    déjà créée sans repasser par le panier, le stock ni les emails.
+    """
+    db = await get_database()
+    return await run_idempotent(
+        db, request, current_user["user_id"], idempotency_key,
+        lambda: create_order(checkout_data, current_user)
+    )
+
+async def create_order(checkout_data: CheckoutRequest, current_user: dict):
     """Créer une commande à partir du panier"""
     db = await get_database()
     
-    # Récupérer le panier
-    cart = await db.carts.find_one({"user_id": current_user["user_id"]})
-    if not cart or not cart.get("items") or len(cart["items"]) == 0:
-        raise HTTPException(status_code=400, detail="Votre panier est vide")
-    
-    # Vérifier le stock et calculer le total
-    order_items = []
-    total = 0
-    
-    for item in cart["items"]:
-        product = await db.products.find_one({"_id": ObjectId(item["product_id"])})
-        if not product:
-            raise HTTPException(status_code=400, detail=f"Produit non trouvé")
+    # Récupérer le panier (les mutations en attente sont d'abord écrites) ;
+    # les mutations concurrentes du panier attendent la fin du paiement
+    async with cart_store.checkout(db, current_user["user_id"]) as cart:
+        if not cart or not cart.get("items") or len(cart["items"]) == 0:
+            raise HTTPException(status_code=400, detail="Votre panier est vide")
         
-        if product.get("stock_quantity", 0) < item["quantity"]:
-            raise HTTPException(status_code=400, detail=f"Stock insuffisant pour {product['name']}")
+        # Relire les produits du panier (une requête) pour le prix et le stock
+        quantities = quantities_by_product(cart["items"])
+        products = {}
+        cursor = db.products.find({"_id": {"$in": [ObjectId(i) for i in quantities if ObjectId.is_valid(i)]}})
+        async for product in cursor:
+            products[str(product["_id"])] = product
+        await stock_shards.with_live_stock(db, products.values())
         
-        item_total = product["price"] * item["quantity"]
-        order_items.append({
-            "product_id": item["product_id"],
-            "product_name": product["name"],
-            "product_image": product.get("images", [None])[0] if product.get("images") else None,
-            "seller_id": product["seller_id"],
-            "quantity": item["quantity"],
-            "unit_price": product["price"],
-            "total": item_total
-        })
-        total += item_total
-    
-    # Créer la commande
-    order = {
-        "user_id": current_user["user_id"],
-        "items": order_items,
-        "shipping_address": checkout_data.shipping_address.dict(),
-        "payment_method": checkout_data.payment_method,
-        "delivery_method": checkout_data.delivery_method,
-        "subtotal": total,
-        "shipping_fee": 0,
-        "total": total,
-        "status": "pending",
-        "payment_status": "pending",
-        "created_at": datetime.utcnow(),
-        "updated_at": datetime.utcnow()
-    }
-    
-    result = await db.orders.insert_one(order)
-    order_id = str(result.inserted_id)
-    
-    # Mettre à jour le stock des produits
-    for item in cart["items"]:
-        await db.products.update_one(
-            {"_id": ObjectId(item["product_id"])},
-            {"$inc": {"stock_quantity": -item["quantity"]}}
-        )
-    
-    # Vider le panier
-    await db.carts.update_one(
-        {"user_id": current_user["user_id"]},
-        {"$set": {"items": [], "updated_at": datetime.utcnow()}}
-    )
-    
-    # Notifier les vendeurs concernés
-    seller_ids = list(set(item["seller_id"] for item in order_items))
-    for seller_id in seller_ids:
-        seller = await db.users.find_one({"_id": ObjectId(seller_id)})
-        if seller:
-            seller_items = [item for item in order_items if item["seller_id"] == seller_id]
-            seller_total = sum(item["total"] for item in seller_items)
-            
-            # Email au vendeur
-            send_new_order_email(
-                to_email=seller["email"],
-                seller_name=seller.get("full_name", "Vendeur"),
-                order_id=order_id,
-                items=seller_items,
-                total=seller_total
+        # Stock disponible pour l'acheteur : stock moins les réservations des autres paniers
+        available = await available_stock(db, products.values(), current_user["user_id"])
+        
+        # Vérifier le stock et calculer le total
+        order_items = []
+        total = 0
+        
+        for item in cart["items"]:
+            product = products.get(item["product_id"])
+            if not product:
+                raise HTTPException(status_code=400, detail=f"Produit non trouvé")
+        
+            # Pré-contrôle pour un message clair ; le décrément conditionnel fait foi
+            if available[item["product_id"]] < quantities[item["product_id"]]:
+                raise HTTPException(status_code=400, detail=f"Stock insuffisant pour {product['name']}")
+        
+            # Instantané complet du produit (nom, image, prix, catégorie, boutique)
+            line = order_line(product, item["quantity"])
+            order_items.append(line)
+            total += line["total"]
+        
+        # Créer la commande
+        order = {
+            "user_id": current_user["user_id"],
+            "items": order_items,
+            "shipping_address": checkout_data.shipping_address.dict(),
+            "payment_method": checkout_data.payment_method,
+            "delivery_method": checkout_data.delivery_method,
+            "subtotal": total,
+            "shipping_fee": 0,
+            "total": total,
+            "status": "pending",
+            "payment_status": "pending",
+            "created_at": datetime.utcnow(),
+            "updated_at": datetime.utcnow()
+        }
+        
+        # Décrément conditionnel du stock, insertion de la commande, vidage du
+        # panier et publication des effets de bord en une transaction
+        # (rien n'est écrit si une ligne échoue)
+        try:
+            sharded = {i: stock_shards.shard_count(p) for i, p in products.items() if stock_shards.shard_count(p)}
+            order_id = await place_order(db, order, quantities, sharded)
+            result = {"message": "Commande créée avec succès", "order_id": order_id, "total": total}
+            # Commande validée : réponse enregistrée pour Idempotency-Key avant
+            # tout autre point d'attente (une annulation ne la rejoue pas)
+            await record_response(db, result)
+        except InsufficientStockError as e:
+            names = [products[i]["name"] for i in e.product_ids if i in products]
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Stock insuffisant pour {', '.join(names) or 'un produit du panier'}"
             )
-            
-            # Notification in-app
-            await db.notifications.insert_one({
-                "user_id": seller_id,
-                "type": "new_order",
-                "title": f"🛒 Nouvelle commande #{order_id[-8:]}",
-                "message": f"Vous avez reçu une nouvelle commande de {len(seller_items)} article(s) pour {seller_total:.2f} €",
-                "read": False,
-                "created_at": datetime.utcnow()
-            })
+        finally:
+            for product_id in quantities:
+                product_cache.invalidate(product_id)
     
-    # Vérifier les stocks faibles après la commande
-    for item in cart["items"]:
-        product = await db.products.find_one({"_id": ObjectId(item["product_id"])})
-        if product and product.get("stock_quantity", 0) <= 5:
-            seller = await db.users.find_one({"_id": ObjectId(product["seller_id"])})
-            if seller:
-                # Alerte stock faible
-                send_low_stock_alert(
-                    to_email=seller["email"],
-                    seller_name=seller.get("full_name", "Vendeur"),
-                    product_name=product["name"],
-                    current_stock=product.get("stock_quantity", 0)
-                )
-                await db.notifications.insert_one({
-                    "user_id": product["seller_id"],
-                    "type": "low_stock",
-                    "title": f"⚠️ Stock faible: {product['name']}",
-                    "message": f"Il ne reste que {product.get('stock_quantity', 0)} unités en stock.",
-                    "read": False,
-                    "created_at": datetime.utcnow()
-                })
+    # Emails, notifications et alertes de stock faible : tâche `order_created`
+    # publiée dans la transaction, traitée par les workers (app/services/order_jobs.py)
     
-    return {"message": "Commande créée avec succès", "order_id": order_id, "total": total}
+    return result
 
 @app.get("/orders/{order_id}")
 async def get_order(order_id: str, current_user: dict = Depends(get_current_user)):
     """Récupérer les détails d'une commande"""
     db = await get_database()
     
-    order = await db.orders.find_one({"_id": ObjectId(order_id)})
+    order = await find_order(db, {"_id": ObjectId(order_id)})
     if not order:
         raise HTTPException(status_code=404, detail="Commande non trouvée")
     
@@ -1451,55 +1997,203 @@ async def get_order(order_id: str, current_user: dict = Depends(get_current_user
     del order["_id"]
     return order
 
+# Codes HTTP des refus d'un changement de statut unitaire
+STATUS_REJECTION_ERRORS = {
+    "invalid_id": (404, "Commande non trouvée"),
+    "not_found": (404, "Commande non trouvée"),
+    "forbidden": (403, "Accès non autorisé"),
+    "invalid_transition": (400, "Transition de statut non autorisée"),
+    "conflict": (409, "Commande modifiée entre-temps, veuillez réessayer"),
+}
+
 @app.put("/orders/{order_id}/status")
 async def update_order_status(
     order_id: str,
     new_status: str,
     current_user: dict = Depends(get_current_user)
 ):
-    """Mettre à jour le statut d'une commande (vendeur/admin)"""
+    """Mettre à jour le statut d'une commande (vendeur : ses commandes / admin)"""
     db = await get_database()
     
     user = await db.users.find_one({"_id": ObjectId(current_user["user_id"])})
     if user["role"] not in ["seller", "admin"]:
         raise HTTPException(status_code=403, detail="Accès non autorisé")
     
-    valid_statuses = ["pending", "confirmed", "processing", "shipped", "delivered", "cancelled"]
-    if new_status not in valid_statuses:
+    if new_status not in ORDER_STATUSES:
         raise HTTPException(status_code=400, detail="Statut invalide")
     
-    await db.orders.update_one(
-        {"_id": ObjectId(order_id)},
-        {"$set": {"status": new_status, "updated_at": datetime.utcnow()}}
-    )
+    result = await change_order_status(db, [order_id], new_status, user)
+    if result["rejected"]:
+        status_code, detail = STATUS_REJECTION_ERRORS[result["rejected"][0]["reason"]]
+        raise HTTPException(status_code=status_code, detail=detail)
     
     return {"message": f"Statut mis à jour: {new_status}"}
 
+class BulkStatusUpdate(BaseModel):
+    order_ids: List[str]
+    new_status: str
+
+@app.post("/orders/status/bulk")
+async def bulk_update_order_status(
+    data: BulkStatusUpdate,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Mettre à jour le statut d'une liste de commandes (vendeur/admin)
+    
+    Les transitions sont validées commande par commande et appliquées en un
+    seul `bulk_write` ; les notifications et emails des clients partent en
+    un lot par la file de tâches. Les commandes refusées sont listées avec
+    leur motif (invalid_id, not_found, forbidden, invalid_transition, conflict).
+    """
+    db = await get_database()
+    
+    user = await db.users.find_one({"_id": ObjectId(current_user["user_id"])})
+    if user["role"] not in ["seller", "admin"]:
+        raise HTTPException(status_code=403, detail="Accès non autorisé")
+    
+    if data.new_status not in ORDER_STATUSES:
+        raise HTTPException(status_code=400, detail="Statut invalide")
+    if not data.order_ids:
+        raise HTTPException(status_code=400, detail="Aucune commande fournie")
+    if len(data.order_ids) > MAX_BULK_ORDERS:
+        raise HTTPException(status_code=400, detail=f"{MAX_BULK_ORDERS} commandes maximum par appel")
+    
+    return await change_order_status(db, data.order_ids, data.new_status, user)
+
 @app.get("/seller/orders")
-async def get_seller_orders(current_user: dict = Depends(get_current_user)):
-    """Récupérer les commandes contenant des produits du vendeur"""
+async def get_seller_orders(
+    limit: Optional[int] = Query(None, ge=1),
+    after: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Récupérer les commandes contenant des produits du vendeur
+    
+    Lues dans `seller_order_lines` (lignes et sous-total du vendeur déjà
+    calculés). Paginé par curseur si `limit` ou `after` est fourni.
+    """
     db = await get_database()
     
     user = await db.users.find_one({"_id": ObjectId(current_user["user_id"])})
     if user["role"] != "seller":
         raise HTTPException(status_code=403, detail="Accès réservé aux vendeurs")
     
+    query = {"seller_id": str(user["_id"])}
+    if limit is not None or after is not None:
+        try:
+            lines, next_cursor = await fetch_page(db.seller_order_lines, query, limit=limit, after=after)
+        except InvalidCursorError:
+            raise HTTPException(status_code=400, detail="Curseur de pagination invalide")
+        return {
+            "items": [format_seller_order(line) for line in lines],
+            "next_cursor": next_cursor,
+            "limit": clamp_limit(limit)
+        }
+    
+    cursor = db.seller_order_lines.find(query).sort([("created_at", -1), ("_id", -1)])
+    return [format_seller_order(line) async for line in cursor]
+
+@app.get("/seller/stats", response_model=SellerStatsResponse)
+async def get_seller_stats(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Statistiques de ventes du vendeur sur une plage de jours (UTC, bornes incluses)
+    
+    Par défaut : les 30 derniers jours. Lues dans les agrégats pré-calculés
+    (app/services/rollup_service.py) : coût borné quel que soit le volume.
+    """
+    db = await get_database()
+    
+    user = await db.users.find_one({"_id": ObjectId(current_user["user_id"])})
+    if user["role"] != "seller":
+        raise HTTPException(status_code=403, detail="Accès réservé aux vendeurs")
+    
+    end = end or datetime.utcnow().date()
+    start = start or end - timedelta(days=29)
+    if start > end:
+        raise HTTPException(status_code=400, detail="La date de début doit précéder la date de fin")
+    if (end - start).days >= MAX_RANGE_DAYS:
+        raise HTTPException(status_code=400, detail=f"Plage limitée à {MAX_RANGE_DAYS} jours")
+    
     seller_id = str(user["_id"])
+    all_time = await seller_totals(db, seller_id)
     
-    orders = []
-    cursor = db.orders.find({"items.seller_id": seller_id}).sort("created_at", -1)
+    shop_stats = None
+    shop = await db.shops.find_one({"owner_id": seller_id})
+    if shop:
+        shop["id"] = str(shop["_id"])
+        del shop["_id"]
+        shop_stats = ShopStats(
+            **shop,
+            total_products=await db.products.count_documents({"seller_id": seller_id}),
+            total_sales=all_time["net_orders"],
+            average_rating=user.get("average_rating")
+        )
     
-    async for order in cursor:
-        seller_items = [item for item in order["items"] if item["seller_id"] == seller_id]
-        seller_total = sum(item["total"] for item in seller_items)
-        
-        order["id"] = str(order["_id"])
-        del order["_id"]
-        order["seller_items"] = seller_items
-        order["seller_total"] = seller_total
-        orders.append(order)
+    return {
+        "shop": shop_stats,
+        "start": start,
+        "end": end,
+        "totals": await seller_totals(db, seller_id, start, end),
+        "all_time": all_time,
+        "top_products": await top_products(db, seller_id, start, end)
+    }
+
+@app.get("/admin/reports/orders")
+async def export_order_report(
+    export_format: str = Query("csv", alias="format", regex="^(ndjson|csv)$"),
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    order_status: Optional[str] = Query(None, alias="status"),
+    seller_id: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Rapport des commandes et du chiffre d'affaires en flux CSV ou NDJSON (admin uniquement)
     
-    return orders
+    Un groupe par jour, vendeur, statut et moyen de paiement (commandes,
+    unités, montant), archive comprise. L'agrégation s'exécute dans MongoDB
+    et ses résultats sont envoyés par paquets au fil du curseur : le rapport
+    n'est jamais construit en mémoire. `start` / `end` : jours UTC inclus
+    (30 derniers jours par défaut).
+    """
+    db = await get_database()
+    
+    admin = await db.users.find_one({"_id": ObjectId(current_user["user_id"])})
+    if admin["role"] != UserRole.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Accès réservé aux administrateurs"
+        )
+    
+    end = end or datetime.utcnow().date()
+    start = start or end - timedelta(days=29)
+    if start > end:
+        raise HTTPException(status_code=400, detail="La date de début doit précéder la date de fin")
+    if order_status and order_status not in ORDER_STATUSES:
+        raise HTTPException(status_code=400, detail="Statut invalide")
+    
+    cursor = db.orders.aggregate(
+        order_report_pipeline(start, end, order_status, seller_id),
+        allowDiskUse=True,
+        batchSize=EXPORT_BATCH_SIZE
+    )
+    
+    if export_format == "csv":
+        body = stream_csv(cursor, ORDER_REPORT_FIELDS, transform=order_report_row)
+    else:
+        body = stream_ndjson(cursor, transform=order_report_row)
+    
+    filename = f"commandes_{start:%Y%m%d}_{end:%Y%m%d}.{export_format}"
+    return StreamingResponse(
+        body,
+        media_type=MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
 
 # ==================== ROUTES NOTIFICATIONS ====================
 
@@ -1595,10 +2289,20 @@ class ReviewCreate(BaseModel):
     comment: Optional[str] = None
 
 @app.post("/reviews")
-async def create_review(
+async def post_review(
     review_data: ReviewCreate,
-    current_user: dict = Depends(get_current_user)
+    request: Request,
+    current_user: dict = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
+    """Créer un avis sur un vendeur/produit après livraison (Idempotency-Key accepté)"""
+    db = await get_database()
+    return await run_idempotent(
+        db, request, current_user["user_id"], idempotency_key,
+        lambda: create_review(review_data, current_user)
+    )
+
+async def create_review(review_data: ReviewCreate, current_user: dict):
     """Créer un avis sur un vendeur/produit après livraison"""
     db = await get_database()
     
@@ -1607,7 +2311,7 @@ async def create_review(
         raise HTTPException(status_code=400, detail="La note doit être entre 1 et 5")
     
     # Vérifier que la commande existe et appartient à l'utilisateur
-    order = await db.orders.find_one({"_id": ObjectId(review_data.order_id)})
+    order = await find_order(db, {"_id": ObjectId(review_data.order_id)})
     if not order:
         raise HTTPException(status_code=404, detail="Commande non trouvée")
     
@@ -1644,6 +2348,9 @@ async def create_review(
     review["user_name"] = user.get("full_name", "Client")
     
     result = await db.reviews.insert_one(review)
+    response = {"message": "Avis enregistré avec succès", "review_id": str(result.inserted_id)}
+    # Avis inséré : réponse enregistrée pour Idempotency-Key
+    await record_response(db, response)
     
     # Mettre à jour la note moyenne du vendeur
     await update_seller_rating(db, review_data.seller_id)
@@ -1658,7 +2365,7 @@ async def create_review(
         "created_at": datetime.utcnow()
     })
     
-    return {"message": "Avis enregistré avec succès", "review_id": str(result.inserted_id)}
+    return response
 
 async def update_seller_rating(db, seller_id: str):
     """Mettre à jour la note moyenne d'un vendeur"""
@@ -1720,7 +2427,7 @@ async def get_product_reviews(product_id: str):
     db = await get_database()
     
     # Récupérer le produit pour avoir le seller_id
-    product = await db.products.find_one({"_id": ObjectId(product_id)})
+    product = await product_cache.get(db, product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Produit non trouvé")
     
@@ -1825,11 +2532,15 @@ async def get_order_reviews(order_id: str, current_user: dict = Depends(get_curr
     return reviews
 
 @app.get("/reviews/can-review/{order_id}")
-async def can_review_order(order_id: str, current_user: dict = Depends(get_current_user)):
+async def can_review_order(
+    order_id: str,
+    current_user: dict = Depends(get_current_user),
+    loaders: Loaders = Depends(get_loaders)
+):
     """Vérifier si l'utilisateur peut laisser un avis pour une commande"""
     db = await get_database()
     
-    order = await db.orders.find_one({"_id": ObjectId(order_id)})
+    order = await find_order(db, {"_id": ObjectId(order_id)})
     if not order:
         return {"can_review": False, "reason": "Commande non trouvée"}
     
@@ -1843,21 +2554,25 @@ async def can_review_order(order_id: str, current_user: dict = Depends(get_curre
     seller_ids = list(set(item.get("seller_id") for item in order.get("items", []) if item.get("seller_id")))
     
     # Vérifier quels vendeurs n'ont pas encore été notés
+    reviewed = await db.reviews.distinct("seller_id", {
+        "order_id": order_id,
+        "seller_id": {"$in": seller_ids},
+        "user_id": current_user["user_id"]
+    })
+    to_review = [seller_id for seller_id in seller_ids if seller_id not in reviewed]
+    
+    sellers, shops = await asyncio.gather(
+        loaders.users.load_many(to_review),
+        loaders.shops_by_owner.load_many(to_review)
+    )
+    
     pending_reviews = []
-    for seller_id in seller_ids:
-        existing = await db.reviews.find_one({
-            "order_id": order_id,
+    for seller_id, seller, shop in zip(to_review, sellers, shops):
+        pending_reviews.append({
             "seller_id": seller_id,
-            "user_id": current_user["user_id"]
+            "seller_name": seller.get("full_name", "Vendeur") if seller else "Vendeur",
+            "shop_name": shop.get("name", "Boutique") if shop else "Boutique"
         })
-        if not existing:
-            seller = await db.users.find_one({"_id": ObjectId(seller_id)})
-            shop = await db.shops.find_one({"owner_id": seller_id})
-            pending_reviews.append({
-                "seller_id": seller_id,
-                "seller_name": seller.get("full_name", "Vendeur") if seller else "Vendeur",
-                "shop_name": shop.get("name", "Boutique") if shop else "Boutique"
-            })
     
     return {
         "can_review": len(pending_reviews) > 0,
@@ -1925,7 +2640,10 @@ async def start_conversation(
     }
 
 @app.get("/conversations")
-async def get_conversations(current_user: dict = Depends(get_current_user)):
+async def get_conversations(
+    current_user: dict = Depends(get_current_user),
+    loaders: Loaders = Depends(get_loaders)
+):
     """Récupérer toutes les conversations de l'utilisateur"""
     db = await get_database()
     
@@ -1933,8 +2651,11 @@ async def get_conversations(current_user: dict = Depends(get_current_user)):
         "participants": current_user["user_id"]
     }).sort("updated_at", -1).to_list(100)
     
+    # Produits des conversations chargés en une seule requête
+    products = await loaders.products.load_many(conv.get("product_id") for conv in conversations)
+    
     result = []
-    for conv in conversations:
+    for conv, product in zip(conversations, products):
         # Déterminer si l'utilisateur est l'acheteur ou le vendeur
         is_buyer = conv.get("buyer_id") == current_user["user_id"]
         other_id = conv.get("seller_id") if is_buyer else conv.get("buyer_id")
@@ -1944,7 +2665,6 @@ async def get_conversations(current_user: dict = Depends(get_current_user)):
         # Récupérer les infos du produit si présent
         product_info = None
         if conv.get("product_id"):
-            product = await db.products.find_one({"_id": ObjectId(conv["product_id"])})
             if product:
                 product_info = {
                     "id": str(product["_id"]),
@@ -2007,11 +2727,21 @@ async def get_messages(
     } for msg in messages]
 
 @app.post("/conversations/{conversation_id}/messages")
-async def send_message(
+async def post_message(
     conversation_id: str,
     message: MessageCreate,
-    current_user: dict = Depends(get_current_user)
+    request: Request,
+    current_user: dict = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
+    """Envoyer un message dans une conversation (Idempotency-Key accepté)"""
+    db = await get_database()
+    return await run_idempotent(
+        db, request, current_user["user_id"], idempotency_key,
+        lambda: send_message(conversation_id, message, current_user)
+    )
+
+async def send_message(conversation_id: str, message: MessageCreate, current_user: dict):
     """Envoyer un message dans une conversation"""
     db = await get_database()
     
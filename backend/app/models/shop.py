@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import date, datetime
 from typing import Optional, List
 from pydantic import BaseModel, Field, validator
 from bson import ObjectId
@@ -76,4 +76,30 @@ class ShopStats(ShopResponse):
     """Modèle étendu avec des statistiques de la boutique"""
     total_products: int = 0
     total_sales: int = 0
-    average_rating: Optional[float] = None
\ No newline at end of file
+    average_rating: Optional[float] = None
+
+class SalesTotals(BaseModel):
+    """Agrégats de ventes sur une période (annulations comptées à part)"""
+    revenue: float = 0
+    units: int = 0
+    orders: int = 0
+    cancelled_orders: int = 0
+    cancelled_units: int = 0
+    cancelled_revenue: float = 0
+    net_revenue: float = 0
+    net_units: int = 0
+    net_orders: int = 0
+
+class ProductSales(SalesTotals):
+    """Agrégats de ventes d'un produit"""
+    product_id: str
+    product_name: Optional[str] = None
+
+class SellerStatsResponse(BaseModel):
+    """Statistiques de ventes d'un vendeur sur une plage de jours"""
+    shop: Optional[ShopStats] = None
+    start: date
+    end: date
+    totals: SalesTotals
+    all_time: SalesTotals
+    top_products: List[ProductSales] = []
@@ -0,0 +1,474 @@
+"""
+Stockage des paniers en écriture différée (write-behind).
+
+Les paniers sont les documents les plus écrits : chaque ajout, modification
+ou retrait faisait un `find_one` puis une mise à jour MongoDB. Les paniers
+actifs sont désormais tenus en mémoire, répartis en shards par `user_id`
+(plafond LRU par shard) ; un verrou par utilisateur sérialise les
+mutations d'un même panier sans bloquer les autres. Les mutations
+rapprochées sont regroupées : le panier est écrit dans MongoDB
+CART_FLUSH_DELAY_SECONDS après sa dernière modification, avant un paiement
+(`checkout`) et à l'arrêt de l'application.
+
+Journal d'écriture anticipée (WAL) : chaque mutation ajoute au fichier
+CART_WAL_PATH l'état complet du panier (une ligne JSON) et attend qu'il
+soit durable avant de répondre. Les écritures et `fsync` s'exécutent sur
+un thread dédié, par groupes : les lignes accumulées pendant un `fsync`
+partent ensemble au suivant, la boucle asyncio n'est jamais bloquée. Au
+démarrage, `recover` réécrit dans MongoDB le dernier état journalisé de
+chaque panier : un arrêt brutal ne perd aucune mutation confirmée.
+
+Point de contrôle : au-delà de CART_WAL_CHECKPOINT_BYTES, le journal est
+remplacé (fichier temporaire puis renommage) par l'état des seuls paniers
+pas encore écrits dans MongoDB ; sa taille reste bornée même sous un
+trafic continu.
+
+Le mode différé suppose qu'un utilisateur est servi par un seul processus
+(un worker uvicorn, ou une affinité de session) : il est donc désactivé par
+défaut et s'active avec CART_WRITE_BEHIND=true. Sans lui, rien n'est
+retenu en mémoire et chaque mutation est un opérateur atomique sur sa
+ligne (`$set` positionnel, `$push`, `$pull`) : plusieurs workers peuvent
+modifier le même panier sans perdre d'écriture.
+"""
+
+import asyncio
+import json
+import os
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from pymongo import ReturnDocument, UpdateOne
+
+from app.config.settings import settings
+
+
+class _CartEntry:
+    __slots__ = ("items", "version", "flushed_version")
+
+    def __init__(self, items: List[dict]):
+        self.items = items
+        # Incrémenté à chaque mutation ; comparé à la dernière version écrite
+        self.version = 0
+        self.flushed_version = 0
+
+    @property
+    def dirty(self) -> bool:
+        return self.version != self.flushed_version
+
+
+class _Shard:
+    __slots__ = ("entries",)
+
+    def __init__(self):
+        self.entries: "OrderedDict[str, _CartEntry]" = OrderedDict()
+
+
+class _UserLock:
+    __slots__ = ("lock", "holders")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        # Coroutines qui détiennent ou attendent le verrou
+        self.holders = 0
+
+
+class CartStore:
+    """Paniers en mémoire, shardés par utilisateur, écrits en différé dans MongoDB"""
+
+    def __init__(
+        self,
+        enabled: bool,
+        shard_count: int,
+        max_carts: int,
+        flush_delay: float,
+        wal_path: Optional[str],
+        checkpoint_bytes: int = 8 * 1024 * 1024,
+    ):
+        self.enabled = enabled
+        self.shards = [_Shard() for _ in range(shard_count)]
+        # Verrous des utilisateurs en cours (retirés quand plus personne ne les attend)
+        self._locks: Dict[str, _UserLock] = {}
+        # Nombre maximal de paniers retenus par shard
+        self.max_per_shard = max(1, max_carts // shard_count)
+        self.flush_delay = flush_delay
+        self.wal_path = wal_path
+        self.checkpoint_bytes = checkpoint_bytes
+        self._wal = None
+        self._wal_size = 0
+        # Taille du journal après le dernier point de contrôle
+        self._wal_base = 0
+        self._checkpoint_requested = False
+        # Lignes en attente d'écriture et numéros de séquence (écrites / durables)
+        self._wal_buffer: List[str] = []
+        self._wal_seq = 0
+        self._wal_synced = 0
+        self._wal_sync: Optional[asyncio.Future] = None
+        # Un seul thread : les écritures du journal restent ordonnées
+        self._wal_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cart-wal")
+        self.checkpoints = 0
+        self._pending: Dict[str, asyncio.TimerHandle] = {}
+        self.flushes = 0
+
+    def _shard(self, user_id: str) -> _Shard:
+        return self.shards[zlib.crc32(user_id.encode("utf-8")) % len(self.shards)]
+
+    @asynccontextmanager
+    async def _user_lock(self, user_id: str):
+        """Sérialise les opérations sur le panier d'un utilisateur"""
+        user_lock = self._locks.get(user_id)
+        if user_lock is None:
+            user_lock = self._locks[user_id] = _UserLock()
+        user_lock.holders += 1
+        try:
+            async with user_lock.lock:
+                yield
+        finally:
+            user_lock.holders -= 1
+            if not user_lock.holders:
+                del self._locks[user_id]
+
+    # ---------- Journal d'écriture anticipée ----------
+
+    async def _log(self, user_id: str, items: List[dict]):
+        """Journalise l'état complet d'un panier (durable au retour)"""
+        if not self.wal_path:
+            return
+        self._wal_buffer.append(json.dumps({"u": user_id, "items": items}, separators=(",", ":")) + "\n")
+        self._wal_seq += 1
+        await self._wait_durable(self._wal_seq)
+
+    async def _wait_durable(self, seq: int):
+        while self._wal_synced < seq:
+            if self._wal_sync is None:
+                self._wal_sync = asyncio.ensure_future(self._sync_wal())
+            await asyncio.shield(self._wal_sync)
+
+    async def _sync_wal(self):
+        """Écrit et synchronise un groupe de lignes, ou un point de contrôle"""
+        loop = asyncio.get_running_loop()
+        try:
+            seq = self._wal_seq
+            # Seuil relevé si les paniers en attente occupent déjà l'essentiel
+            # du journal : pas de point de contrôle à chaque groupe
+            threshold = max(self.checkpoint_bytes, 2 * self._wal_base)
+            if self._checkpoint_requested or self._wal_size >= threshold:
+                self._checkpoint_requested = False
+                # Les lignes en attente sont couvertes par l'état courant des paniers
+                self._wal_buffer = []
+                lines = [
+                    json.dumps({"u": user_id, "items": entry.items}, separators=(",", ":")) + "\n"
+                    for shard in self.shards
+                    for user_id, entry in shard.entries.items()
+                    if entry.dirty
+                ]
+                await loop.run_in_executor(self._wal_executor, self._rewrite_wal, lines)
+                self.checkpoints += 1
+            else:
+                lines, self._wal_buffer = self._wal_buffer, []
+                await loop.run_in_executor(self._wal_executor, self._append_wal, lines)
+            self._wal_synced = seq
+        finally:
+            self._wal_sync = None
+
+    def _append_wal(self, lines: List[str]):
+        if self._wal is None:
+            os.makedirs(os.path.dirname(self.wal_path) or ".", exist_ok=True)
+            self._wal = open(self.wal_path, "a", encoding="utf-8")
+            self._wal_size = self._wal.tell()
+        data = "".join(lines)
+        self._wal.write(data)
+        self._wal.flush()
+        os.fsync(self._wal.fileno())
+        self._wal_size += len(data.encode("utf-8"))
+
+    def _rewrite_wal(self, lines: List[str]):
+        directory = os.path.dirname(self.wal_path) or "."
+        os.makedirs(directory, exist_ok=True)
+        temporary = self.wal_path + ".tmp"
+        with open(temporary, "w", encoding="utf-8") as checkpoint:
+            checkpoint.write("".join(lines))
+            checkpoint.flush()
+            os.fsync(checkpoint.fileno())
+        os.replace(temporary, self.wal_path)
+        # Le renommage doit lui-même survivre à un arrêt brutal
+        directory_fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(directory_fd)
+        finally:
+            os.close(directory_fd)
+        if self._wal is not None:
+            self._wal.close()
+        self._wal = open(self.wal_path, "a", encoding="utf-8")
+        self._wal_size = self._wal_base = self._wal.tell()
+
+    async def recover(self, db) -> int:
+        """Rejoue le journal dans MongoDB (démarrage) ; renvoie le nombre de paniers restaurés"""
+        if not self.wal_path or not os.path.exists(self.wal_path):
+            return 0
+        latest: Dict[str, List[dict]] = {}
+        with open(self.wal_path, encoding="utf-8") as wal:
+            for line in wal:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Dernière ligne tronquée par l'arrêt brutal : jamais confirmée
+                    continue
+                latest[record["u"]] = record["items"]
+        if latest:
+            now = datetime.utcnow()
+            await db.carts.bulk_write([
+                UpdateOne(
+                    {"user_id": user_id},
+                    {"$set": {"items": items, "updated_at": now}, "$setOnInsert": {"created_at": now}},
+                    upsert=True,
+                )
+                for user_id, items in latest.items()
+            ], ordered=False)
+        open(self.wal_path, "w").close()
+        self._wal_size = self._wal_base = 0
+        return len(latest)
+
+    # ---------- Chargement et écriture ----------
+
+    async def _read(self, db, user_id: str) -> List[dict]:
+        cart = await db.carts.find_one({"user_id": user_id}, {"items": 1})
+        return [dict(item) for item in (cart or {}).get("items", [])]
+
+    async def _load(self, db, shard: _Shard, user_id: str) -> _CartEntry:
+        """Panier en mémoire (verrou de l'utilisateur détenu)"""
+        entry = shard.entries.get(user_id)
+        if entry is not None:
+            shard.entries.move_to_end(user_id)
+            return entry
+        entry = _CartEntry(await self._read(db, user_id))
+        shard.entries[user_id] = entry
+        return entry
+
+    async def _evict(self, db, shard: _Shard):
+        """
+        Retire les paniers les moins récemment utilisés au-delà du plafond du shard
+
+        Appelé sans verrou détenu : le verrou de chaque panier retiré est pris
+        à son tour (deux évictions croisées ne peuvent pas s'interbloquer).
+        """
+        while len(shard.entries) > self.max_per_shard:
+            user_id = next(iter(shard.entries))
+            async with self._user_lock(user_id):
+                entry = shard.entries.get(user_id)
+                if entry is not None and entry.dirty:
+                    await self._write(db, user_id, entry)
+                shard.entries.pop(user_id, None)
+
+    async def _write(self, db, user_id: str, entry: _CartEntry):
+        version, items = entry.version, [dict(item) for item in entry.items]
+        now = datetime.utcnow()
+        await db.carts.update_one(
+            {"user_id": user_id},
+            {"$set": {"items": items, "updated_at": now}, "$setOnInsert": {"created_at": now}},
+            upsert=True,
+        )
+        entry.flushed_version = max(entry.flushed_version, version)
+        self.flushes += 1
+
+    def _schedule_flush(self, db, user_id: str):
+        if user_id in self._pending:
+            # Débounce : l'écriture est repoussée à chaque nouvelle mutation
+            self._pending.pop(user_id).cancel()
+        loop = asyncio.get_running_loop()
+        self._pending[user_id] = loop.call_later(
+            self.flush_delay,
+            lambda: asyncio.ensure_future(self._flush_scheduled(db, user_id)),
+        )
+
+    async def _flush_scheduled(self, db, user_id: str):
+        self._pending.pop(user_id, None)
+        try:
+            await self.flush(db, user_id)
+        except Exception as e:
+            print(f"❌ Erreur écriture du panier {user_id}: {e}")
+            # Nouvelle tentative au prochain délai (le journal conserve l'état)
+            self._schedule_flush(db, user_id)
+
+    async def _mutate(self, db, user_id: str, change) -> List[dict]:
+        """Applique `change` au panier en mémoire (mode différé)"""
+        shard = self._shard(user_id)
+        async with self._user_lock(user_id):
+            entry = await self._load(db, shard, user_id)
+            if change(entry.items):
+                entry.version += 1
+                await self._log(user_id, entry.items)
+                self._schedule_flush(db, user_id)
+            items = [dict(item) for item in entry.items]
+        await self._evict(db, shard)
+        return items
+
+    async def _update(self, db, query: dict, update: dict) -> Optional[List[dict]]:
+        """Mise à jour atomique d'un panier ; lignes après mise à jour, None si `query` ne correspond pas"""
+        update.setdefault("$set", {})["updated_at"] = datetime.utcnow()
+        cart = await db.carts.find_one_and_update(
+            query, update, projection={"items": 1}, return_document=ReturnDocument.AFTER
+        )
+        return None if cart is None else [dict(item) for item in cart.get("items", [])]
+
+    # ---------- API ----------
+
+    async def get(self, db, user_id: str) -> List[dict]:
+        """Lignes du panier : [{"product_id", "quantity"}]"""
+        if not self.enabled:
+            return await self._read(db, user_id)
+        shard = self._shard(user_id)
+        async with self._user_lock(user_id):
+            entry = await self._load(db, shard, user_id)
+            items = [dict(item) for item in entry.items]
+        await self._evict(db, shard)
+        return items
+
+    async def set_quantity(self, db, user_id: str, product_id: str, quantity: int, create: bool = True) -> List[dict]:
+        """
+        Fixe la quantité d'une ligne
+
+        Args:
+            create: Ajouter la ligne si le produit n'est pas dans le panier
+        """
+        def change(items: List[dict]) -> bool:
+            for item in items:
+                if item["product_id"] == product_id:
+                    if item["quantity"] == quantity:
+                        return False
+                    item["quantity"] = quantity
+                    return True
+            if not create:
+                return False
+            items.append({"product_id": product_id, "quantity": quantity})
+            return True
+        if self.enabled:
+            return await self._mutate(db, user_id, change)
+
+        line = {"user_id": user_id, "items.product_id": product_id}
+        for _ in range(3):
+            items = await self._update(db, line, {"$set": {"items.$.quantity": quantity}})
+            if items is not None or not create:
+                return items if items is not None else await self._read(db, user_id)
+            items = await self._update(
+                db,
+                {"user_id": user_id, "items.product_id": {"$ne": product_id}},
+                {"$push": {"items": {"product_id": product_id, "quantity": quantity}}},
+            )
+            if items is not None:
+                return items
+            # Pas encore de panier : le créer, puis ajouter la ligne au tour suivant
+            now = datetime.utcnow()
+            await db.carts.update_one(
+                {"user_id": user_id},
+                {"$setOnInsert": {"items": [], "created_at": now, "updated_at": now}},
+                upsert=True,
+            )
+        return await self._read(db, user_id)
+
+    async def remove(self, db, user_id: str, product_id: str) -> List[dict]:
+        """Retire une ligne du panier"""
+        def change(items: List[dict]) -> bool:
+            kept = [item for item in items if item["product_id"] != product_id]
+            if len(kept) == len(items):
+                return False
+            items[:] = kept
+            return True
+        if self.enabled:
+            return await self._mutate(db, user_id, change)
+        items = await self._update(db, {"user_id": user_id}, {"$pull": {"items": {"product_id": product_id}}})
+        return items or []
+
+    async def clear(self, db, user_id: str) -> List[dict]:
+        """Vide le panier"""
+        def change(items: List[dict]) -> bool:
+            if not items:
+                return False
+            items.clear()
+            return True
+        if self.enabled:
+            return await self._mutate(db, user_id, change)
+        await self._update(db, {"user_id": user_id}, {"$set": {"items": []}})
+        return []
+
+    async def flush(self, db, user_id: str):
+        """Écrit immédiatement le panier dans MongoDB s'il a changé"""
+        handle = self._pending.pop(user_id, None)
+        if handle is not None:
+            handle.cancel()
+        async with self._user_lock(user_id):
+            entry = self._shard(user_id).entries.get(user_id)
+            if entry is not None and entry.dirty:
+                await self._write(db, user_id, entry)
+
+    @asynccontextmanager
+    async def checkout(self, db, user_id: str):
+        """
+        Panier à payer, lu dans MongoDB
+
+        Mode différé : le panier est d'abord écrit s'il a changé et les
+        mutations de ce seul utilisateur attendent la fin du bloc (un ajout
+        concurrent s'applique au panier vidé par le paiement, jamais à
+        l'état payé). Si le bloc se termine sans exception, le panier en
+        mémoire est oublié et un état vide est journalisé (`recover` ne
+        restaure pas les lignes payées). Sans mode différé, aucun verrou :
+        les mutations sont atomiques dans MongoDB.
+
+        Yields:
+            Le document `carts` de l'utilisateur, ou None
+        """
+        if not self.enabled:
+            yield await db.carts.find_one({"user_id": user_id})
+            return
+        handle = self._pending.pop(user_id, None)
+        if handle is not None:
+            handle.cancel()
+        shard = self._shard(user_id)
+        async with self._user_lock(user_id):
+            entry = shard.entries.get(user_id)
+            if entry is not None and entry.dirty:
+                await self._write(db, user_id, entry)
+            yield await db.carts.find_one({"user_id": user_id})
+            # Panier vidé dans MongoDB par le paiement
+            shard.entries.pop(user_id, None)
+            await self._log(user_id, [])
+
+    async def flush_all(self, db):
+        """Écrit tous les paniers modifiés (arrêt de l'application)"""
+        for handle in self._pending.values():
+            handle.cancel()
+        self._pending.clear()
+        for shard in self.shards:
+            for user_id in list(shard.entries):
+                async with self._user_lock(user_id):
+                    entry = shard.entries.get(user_id)
+                    if entry is not None and entry.dirty:
+                        await self._write(db, user_id, entry)
+        if self.wal_path and self.enabled:
+            # Tous les paniers sont écrits : point de contrôle vide
+            self._checkpoint_requested = True
+            self._wal_seq += 1
+            await self._wait_durable(self._wal_seq)
+
+    def stats(self) -> dict:
+        entries = [entry for shard in self.shards for entry in shard.entries.values()]
+        return {
+            "carts": len(entries),
+            "dirty": sum(1 for entry in entries if entry.dirty),
+            "flushes": self.flushes,
+            "checkpoints": self.checkpoints,
+        }
+
+
+# Instance partagée par l'application
+cart_store = CartStore(
+    enabled=settings.CART_WRITE_BEHIND,
+    shard_count=settings.CART_STORE_SHARDS,
+    max_carts=settings.CART_STORE_MAX_CARTS,
+    flush_delay=settings.CART_FLUSH_DELAY_SECONDS,
+    wal_path=settings.CART_WAL_PATH,
+    checkpoint_bytes=settings.CART_WAL_CHECKPOINT_BYTES,
+)
@@ -0,0 +1,127 @@
+"""
+Base commune des index en mémoire construits sur le catalogue produits.
+
+Un index est reconstruit depuis MongoDB au démarrage, mis à jour à chaque
+écriture sur un produit (`upsert` / `remove`), puis resynchronisé à
+intervalle régulier : chaque processus uvicorn possède sa propre copie et
+doit rattraper les écritures traitées par les autres processus.
+
+Une suppression ne laisse aucun document à relire : elle est consignée dans
+`product_deletions` (`record_deletion`), que la synchronisation parcourt
+aussi. Ces marqueurs expirent après DELETION_RETENTION_DAYS ; un index dont
+la dernière synchronisation est plus ancienne est reconstruit.
+"""
+
+import asyncio
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import Optional
+
+# Champs lus par défaut pour (re)construire un index
+CATALOG_PROJECTION = {
+    "name": 1,
+    "description": 1,
+    "category": 1,
+    "shop_id": 1,
+    "seller_id": 1,
+    "price": 1,
+    "status": 1,
+    "created_at": 1,
+}
+
+# Marqueurs de suppression des produits (purgés par un index TTL)
+DELETIONS_COLLECTION = "product_deletions"
+DELETION_RETENTION_DAYS = 7
+
+
+async def record_deletion(db, product_id: str):
+    """Consigne la suppression d'un produit pour les index des autres processus"""
+    await db[DELETIONS_COLLECTION].update_one(
+        {"_id": product_id},
+        {"$set": {"deleted_at": datetime.utcnow()}},
+        upsert=True,
+    )
+
+
+class CatalogIndex(ABC):
+    """Index en mémoire des produits publiés, reconstruit et synchronisé depuis MongoDB"""
+
+    # Nom affiché dans les journaux
+    label = "catalogue"
+    # Projection utilisée pour la reconstruction et la synchronisation
+    projection = CATALOG_PROJECTION
+    # Horodatages des produits suivis par la synchronisation
+    sync_fields = ("updated_at",)
+
+    def __init__(self):
+        self._reset()
+        self.ready = False
+        self.last_sync: Optional[datetime] = None
+
+    @abstractmethod
+    def _reset(self):
+        """Initialise les structures de l'index"""
+
+    @abstractmethod
+    def upsert(self, product: dict):
+        """Indexe (ou réindexe) un produit ; un produit non publié est retiré"""
+
+    @abstractmethod
+    def remove(self, product_id: str):
+        """Retire un produit de l'index"""
+
+    def stats(self) -> dict:
+        """Statistiques renvoyées après une reconstruction"""
+        return {}
+
+    async def load_references(self, db):
+        """Charge les données annexes (hors produits) avant une indexation"""
+
+    async def rebuild(self, db) -> dict:
+        """Reconstruit entièrement l'index depuis MongoDB (démarrage à froid)"""
+        started = time.perf_counter()
+        sync_started = datetime.utcnow()
+        fresh = self.__class__()
+        await fresh.load_references(db)
+        cursor = db.products.find({"status": "published"}, self.projection)
+        async for product in cursor:
+            fresh.upsert(product)
+
+        # Remplacement sans await : les lectures en cours voient l'ancien index
+        for attribute, value in vars(fresh).items():
+            setattr(self, attribute, value)
+        self.last_sync = sync_started
+        self.ready = True
+
+        return {
+            **self.stats(),
+            "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+
+    async def sync(self, db):
+        """Réindexe les produits modifiés et retire les produits supprimés depuis la dernière synchronisation"""
+        sync_started = datetime.utcnow()
+        if self.last_sync is None or self.last_sync < sync_started - timedelta(days=DELETION_RETENTION_DAYS):
+            # Marqueurs de suppression possiblement purgés depuis
+            await self.rebuild(db)
+            return
+        await self.load_references(db)
+        changed = [{field: {"$gte": self.last_sync}} for field in self.sync_fields]
+        query = changed[0] if len(changed) == 1 else {"$or": changed}
+        cursor = db.products.find(query, self.projection)
+        async for product in cursor:
+            self.upsert(product)
+        # Après les produits : une suppression postérieure à leur lecture l'emporte
+        async for deletion in db[DELETIONS_COLLECTION].find({"deleted_at": {"$gte": self.last_sync}}):
+            self.remove(deletion["_id"])
+        self.last_sync = sync_started
+
+    async def run_sync_loop(self, db, interval_seconds: float):
+        """Tâche de fond : synchronise l'index à intervalle régulier"""
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                await self.sync(db)
+            except Exception as e:
+                print(f"❌ Erreur synchronisation index {self.label}: {e}")
@@ -0,0 +1,254 @@
+"""
+Validation atomique d'une commande (décrément du stock, commande, panier).
+
+Le stock est décrémenté par un seul `bulk_write` de mises à jour
+conditionnelles (`stock_quantity >= quantité + réservations des autres
+paniers`, relues dans la transaction) : deux paiements simultanés ne
+peuvent pas vendre la même unité, ni une unité retenue dans un autre
+panier. Le décrément, l'insertion de la commande, le vidage du panier,
+la libération des réservations de l'acheteur (reservation_service),
+l'écriture des documents vendeurs (seller_orders) et la publication de la
+tâche `order_created` (job_queue) s'exécutent dans une transaction
+MongoDB : si une ligne manque de stock, rien n'est écrit.
+
+Les produits en stock réparti (stock_shards, ventes flash) sont décrémentés
+sur un de leurs compteurs plutôt que sur le document produit.
+
+Les transactions exigent un replica set (ou mongos). Sur un serveur
+autonome, les lignes sont décrémentées une à une et les décréments déjà
+appliqués sont annulés en cas d'échec : pas de survente, mais la commande
+et le panier sont écrits hors transaction et les réservations des autres
+paniers sont lues avant les décréments (une réservation posée entre-temps
+n'est pas vue).
+"""
+
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import OperationFailure
+
+from app.services.job_queue import enqueue
+from app.services.reservation_service import held_quantities, release_holds
+from app.services.seller_orders import write_seller_lines
+from app.services.stock_shards import give_stock, live_stock, take_stock
+
+# Codes d'erreur d'un serveur sans support des transactions
+# (20 : IllegalOperation, serveur autonome)
+TRANSACTIONS_UNSUPPORTED_CODES = {20}
+
+# Détecté au premier paiement (None : pas encore testé)
+_transactions_supported: Optional[bool] = None
+
+
+class InsufficientStockError(Exception):
+    """Au moins une ligne de la commande dépasse le stock disponible"""
+
+    def __init__(self, product_ids: List[str]):
+        super().__init__(f"Stock insuffisant: {', '.join(product_ids)}")
+        self.product_ids = product_ids
+
+
+class _StockShortfall(Exception):
+    """Un décrément du bulk_write n'a pas trouvé son stock (annule la transaction)"""
+
+
+def quantities_by_product(items: Iterable[dict]) -> Dict[str, int]:
+    """Quantités commandées par produit (lignes du panier regroupées)"""
+    quantities: Dict[str, int] = {}
+    for item in items:
+        quantities[item["product_id"]] = quantities.get(item["product_id"], 0) + item["quantity"]
+    return quantities
+
+
+def line_snapshot(product: Optional[dict]) -> dict:
+    """
+    Instantané du produit copié sur une ligne de commande
+
+    Les lectures de commandes (historique, vendeurs, emails) n'ont ainsi
+    jamais besoin de relire `products`, même après modification ou
+    suppression du produit. Un produit inconnu (supprimé) donne des champs
+    à None.
+    """
+    product = product or {}
+    images = product.get("images") or []
+    return {
+        "product_name": product.get("name"),
+        "product_image": images[0] if images else None,
+        "unit_price": product.get("price"),
+        "category": product.get("category"),
+        "shop_id": product.get("shop_id"),
+        "seller_id": product.get("seller_id"),
+    }
+
+
+# Champs de l'instantané (backfill des commandes antérieures)
+SNAPSHOT_FIELDS = tuple(line_snapshot(None))
+
+
+def order_line(product: dict, quantity: int) -> dict:
+    """Ligne de commande : identifiant, instantané du produit, quantité et total"""
+    return {
+        "product_id": str(product["_id"]),
+        **line_snapshot(product),
+        "quantity": quantity,
+        "total": product["price"] * quantity,
+    }
+
+
+def _decrement(product_id: str, quantity: int, now: datetime, held: int = 0) -> Tuple[dict, dict]:
+    """(filtre, mise à jour) du décrément conditionnel d'une ligne (`held` : unités réservées par les autres)"""
+    return (
+        # Un produit passé en stock réparti entre-temps n'est plus décrémenté ici
+        {"_id": ObjectId(product_id), "stock_quantity": {"$gte": quantity + held}, "stock_shards": {"$exists": False}},
+        {
+            "$inc": {"stock_quantity": -quantity, "units_sold": quantity},
+            "$set": {"updated_at": now},
+        },
+    )
+
+
+async def _short_products(db, user_id: str, quantities: Dict[str, int], sharded: Dict[str, int]) -> List[str]:
+    """Produits dont le stock actuel, hors réservations des autres, ne couvre pas la quantité demandée"""
+    stocks = {}
+    cursor = db.products.find(
+        {"_id": {"$in": [ObjectId(i) for i in quantities if i not in sharded]}},
+        {"stock_quantity": 1},
+    )
+    async for product in cursor:
+        stocks[str(product["_id"])] = product.get("stock_quantity", 0)
+    if sharded:
+        stocks.update(await live_stock(db, sharded))
+    held = await held_quantities(db, quantities, exclude_user=user_id)
+    return [i for i, quantity in quantities.items() if stocks.get(i, 0) - held.get(i, 0) < quantity]
+
+
+async def _sharded_short(db, product_id: str, quantity: int, held: int, session=None) -> bool:
+    """True si le stock réparti, hors réservations des autres, ne couvre pas la quantité"""
+    if not held:
+        return False
+    stock = (await live_stock(db, [product_id], session=session)).get(product_id, 0)
+    return stock - held < quantity
+
+
+async def _publish_order_created(db, order_id, session=None):
+    """Publie les effets de bord de la commande (emails, notifications) dans l'outbox"""
+    await enqueue(
+        db, "order_created", {"order_id": str(order_id)},
+        dedupe_key=f"order_created:{order_id}",
+        session=session,
+    )
+
+
+async def _place_in_transaction(db, order: dict, quantities: Dict[str, int], sharded: Dict[str, int]) -> str:
+    now = datetime.utcnow()
+
+    async def callback(session):
+        # Réservations actives des autres paniers, relues à chaque essai de la transaction
+        held = await held_quantities(db, quantities, exclude_user=order["user_id"], session=session)
+        operations = [
+            UpdateOne(*_decrement(i, quantity, now, held.get(i, 0)))
+            for i, quantity in quantities.items() if i not in sharded
+        ]
+        if operations:
+            result = await db.products.bulk_write(operations, ordered=True, session=session)
+            if result.matched_count < len(operations):
+                # L'exception annule la transaction (aucune écriture conservée)
+                raise _StockShortfall()
+        for product_id, shards in sharded.items():
+            if await _sharded_short(db, product_id, quantities[product_id], held.get(product_id, 0), session):
+                raise InsufficientStockError([product_id])
+            if not await take_stock(db, product_id, quantities[product_id], shards, session=session):
+                raise InsufficientStockError([product_id])
+        inserted = await db.orders.insert_one(order, session=session)
+        await write_seller_lines(db, order, str(inserted.inserted_id), session=session)
+        await db.carts.update_one(
+            {"user_id": order["user_id"]},
+            {"$set": {"items": [], "updated_at": now}},
+            session=session,
+        )
+        await release_holds(db, order["user_id"], session=session)
+        await _publish_order_created(db, inserted.inserted_id, session)
+        return str(inserted.inserted_id)
+
+    try:
+        async with await db.client.start_session() as session:
+            # with_transaction rejoue la transaction sur conflit d'écriture transitoire
+            return await session.with_transaction(callback)
+    except _StockShortfall:
+        # Relu hors de la transaction annulée : dans la session, les lignes
+        # déjà décrémentées paraîtraient à tort en rupture
+        raise InsufficientStockError(await _short_products(db, order["user_id"], quantities, sharded))
+
+
+async def _place_with_compensation(db, order: dict, quantities: Dict[str, int], sharded: Dict[str, int]) -> str:
+    now = datetime.utcnow()
+    # Sans transaction, les réservations des autres sont lues une fois avant les décréments
+    held = await held_quantities(db, quantities, exclude_user=order["user_id"])
+    applied = []
+    for product_id, quantity in quantities.items():
+        if product_id in sharded:
+            taken = (
+                not await _sharded_short(db, product_id, quantity, held.get(product_id, 0))
+                and await take_stock(db, product_id, quantity, sharded[product_id])
+            )
+        else:
+            result = await db.products.update_one(*_decrement(product_id, quantity, now, held.get(product_id, 0)))
+            taken = result.matched_count > 0
+        if not taken:
+            for done_id, done_quantity in applied:
+                if done_id in sharded:
+                    await give_stock(db, done_id, done_quantity, sharded[done_id])
+                    continue
+                await db.products.update_one(
+                    {"_id": ObjectId(done_id)},
+                    {"$inc": {"stock_quantity": done_quantity, "units_sold": -done_quantity}},
+                )
+            raise InsufficientStockError([product_id])
+        applied.append((product_id, quantity))
+
+    inserted = await db.orders.insert_one(order)
+    await write_seller_lines(db, order, str(inserted.inserted_id))
+    await db.carts.update_one(
+        {"user_id": order["user_id"]},
+        {"$set": {"items": [], "updated_at": now}},
+    )
+    await release_holds(db, order["user_id"])
+    await _publish_order_created(db, inserted.inserted_id)
+    return str(inserted.inserted_id)
+
+
+async def place_order(db, order: dict, quantities: Dict[str, int], sharded: Optional[Dict[str, int]] = None) -> str:
+    """
+    Décrémente le stock, insère la commande, vide le panier, libère les
+    réservations et publie la tâche `order_created`
+
+    Args:
+        db: Base de données Motor
+        order: Document de la commande (avec `user_id`)
+        quantities: Quantités par product_id (voir quantities_by_product)
+        sharded: Nombre de compteurs par product_id des produits en stock réparti
+
+    Returns:
+        str: ID de la commande créée
+
+    Raises:
+        InsufficientStockError: Si une ligne dépasse le stock (rien n'est écrit)
+    """
+    global _transactions_supported
+    sharded = sharded or {}
+
+    if _transactions_supported is not False:
+        try:
+            order_id = await _place_in_transaction(db, order, quantities, sharded)
+            _transactions_supported = True
+            return order_id
+        except OperationFailure as e:
+            if e.code not in TRANSACTIONS_UNSUPPORTED_CODES:
+                raise
+            print("⚠️  Transactions MongoDB indisponibles (serveur autonome) : décrément compensé")
+            _transactions_supported = False
+            order.pop("_id", None)
+
+    return await _place_with_compensation(db, order, quantities, sharded)
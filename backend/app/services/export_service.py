@@ -0,0 +1,198 @@
+"""
+Export en flux (NDJSON / CSV) de résultats MongoDB.
+
+Les documents sont encodés au fur et à mesure qu'ils sortent du curseur
+Motor et envoyés par paquets : la mémoire utilisée reste constante quelle
+que soit la taille de l'export.
+
+Le rapport des commandes (comptabilité) est une agrégation MongoDB dont les
+groupes sont calculés par le serveur et lus par le même curseur en flux.
+"""
+
+import csv
+import io
+import json
+from datetime import date, datetime, timedelta
+from typing import AsyncIterator, Callable, List, Optional
+
+from bson import ObjectId
+
+from app.services.order_archive import ARCHIVE_COLLECTION
+
+# Nombre de documents lus par aller-retour et encodés par paquet envoyé
+EXPORT_BATCH_SIZE = 500
+
+# Colonnes de l'export du catalogue
+PRODUCT_EXPORT_FIELDS = [
+    "id",
+    "name",
+    "description",
+    "price",
+    "category",
+    "stock_quantity",
+    "shop_id",
+    "seller_id",
+    "status",
+    "images",
+    "created_at",
+    "updated_at",
+]
+
+# Colonnes du rapport des commandes : un groupe par (jour, vendeur, statut,
+# moyen de paiement) ; une commande multi-vendeurs compte pour chacun
+ORDER_REPORT_FIELDS = [
+    "day",
+    "seller_id",
+    "status",
+    "payment_method",
+    "orders",
+    "units",
+    "revenue",
+]
+
+# Types MIME des formats d'export
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+def _json_default(value):
+    """Sérialise les types BSON non gérés par json"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, ObjectId):
+        return str(value)
+    return str(value)
+
+
+def _csv_value(value):
+    """Aplatit une valeur pour une cellule CSV"""
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (list, tuple)):
+        return "|".join(str(v) for v in value)
+    if isinstance(value, dict):
+        return json.dumps(value, default=_json_default, ensure_ascii=False)
+    return value
+
+
+def product_export_row(product: dict) -> dict:
+    """Met en forme un produit pour l'export"""
+    row = {field: product.get(field) for field in PRODUCT_EXPORT_FIELDS}
+    row["id"] = str(product["_id"])
+    return row
+
+
+def order_report_pipeline(
+    start: date,
+    end: date,
+    status: Optional[str] = None,
+    seller_id: Optional[str] = None,
+) -> List[dict]:
+    """
+    Agrégation du rapport des commandes sur une plage de jours UTC (bornes incluses)
+
+    Les commandes archivées sont incluses ($unionWith). Les groupes sont
+    triés par jour puis vendeur ; les montants viennent des lignes des
+    commandes (total de chaque ligne, sans frais de livraison).
+    """
+    match = {"created_at": {
+        "$gte": datetime(start.year, start.month, start.day),
+        "$lt": datetime(end.year, end.month, end.day) + timedelta(days=1),
+    }}
+    if status:
+        match["status"] = status
+    if seller_id:
+        match["items.seller_id"] = seller_id
+
+    pipeline = [
+        {"$match": match},
+        {"$unionWith": {"coll": ARCHIVE_COLLECTION, "pipeline": [{"$match": match}]}},
+        {"$project": {"created_at": 1, "status": 1, "payment_method": 1, "items": 1}},
+        {"$unwind": "$items"},
+    ]
+    if seller_id:
+        pipeline.append({"$match": {"items.seller_id": seller_id}})
+    pipeline += [
+        # Une ligne par (commande, vendeur) puis un groupe par clé du rapport
+        {"$group": {
+            "_id": {
+                "order_id": "$_id",
+                "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}},
+                "seller_id": "$items.seller_id",
+                "status": "$status",
+                "payment_method": "$payment_method",
+            },
+            "units": {"$sum": "$items.quantity"},
+            "revenue": {"$sum": "$items.total"},
+        }},
+        {"$group": {
+            "_id": {
+                "day": "$_id.day",
+                "seller_id": "$_id.seller_id",
+                "status": "$_id.status",
+                "payment_method": "$_id.payment_method",
+            },
+            "orders": {"$sum": 1},
+            "units": {"$sum": "$units"},
+            "revenue": {"$sum": "$revenue"},
+        }},
+        {"$sort": {"_id.day": 1, "_id.seller_id": 1, "_id.status": 1, "_id.payment_method": 1}},
+    ]
+    return pipeline
+
+
+def order_report_row(group: dict) -> dict:
+    """Met à plat un groupe du rapport des commandes"""
+    return {
+        **group["_id"],
+        "orders": group["orders"],
+        "units": group["units"],
+        "revenue": round(group["revenue"] or 0, 2),
+    }
+
+
+async def stream_ndjson(
+    cursor,
+    transform: Optional[Callable[[dict], dict]] = None,
+    batch_size: int = EXPORT_BATCH_SIZE,
+) -> AsyncIterator[bytes]:
+    """Encode un curseur en NDJSON (un objet JSON par ligne), par paquets"""
+    lines: List[str] = []
+    async for document in cursor:
+        if transform is not None:
+            document = transform(document)
+        lines.append(json.dumps(document, default=_json_default, ensure_ascii=False))
+        if len(lines) >= batch_size:
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+            lines = []
+    if lines:
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+async def stream_csv(
+    cursor,
+    columns: List[str],
+    transform: Optional[Callable[[dict], dict]] = None,
+    batch_size: int = EXPORT_BATCH_SIZE,
+) -> AsyncIterator[bytes]:
+    """Encode un curseur en CSV (ligne d'en-tête puis une ligne par document)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    pending = 0
+    async for document in cursor:
+        if transform is not None:
+            document = transform(document)
+        writer.writerow([_csv_value(document.get(column)) for column in columns])
+        pending += 1
+        if pending >= batch_size:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate(0)
+            pending = 0
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
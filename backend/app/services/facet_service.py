@@ -0,0 +1,184 @@
+"""
+Index de facettes des produits publiés (catégorie, tranche de prix, boutique).
+
+Chaque produit publié occupe un emplacement numéroté ; chaque valeur de
+facette est un bitset (entier Python) des emplacements qui la portent. Les
+comptes de toutes les facettes, pour n'importe quelle combinaison de
+filtres, s'obtiennent en une passe par intersections de bitsets au lieu
+d'une requête MongoDB par facette.
+"""
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.models.product import ProductCategory
+from app.services.catalog_index import CatalogIndex
+
+# Bornes des tranches de prix (€) : [0, 10[, [10, 25[, ..., [1000, +inf[
+PRICE_BUCKET_EDGES = [0, 10, 25, 50, 100, 250, 500, 1000]
+
+# Facettes maintenues par l'index
+FACETS = ("category", "price", "shop_id")
+
+
+def price_bucket(price) -> Optional[int]:
+    """Indice de la tranche de prix contenant `price`"""
+    if price is None:
+        return None
+    bucket = 0
+    for position, edge in enumerate(PRICE_BUCKET_EDGES):
+        if price >= edge:
+            bucket = position
+    return bucket
+
+
+def price_bucket_bounds(bucket: int) -> Tuple[float, Optional[float]]:
+    """Bornes (min inclus, max exclu) d'une tranche de prix"""
+    upper = PRICE_BUCKET_EDGES[bucket + 1] if bucket + 1 < len(PRICE_BUCKET_EDGES) else None
+    return PRICE_BUCKET_EDGES[bucket], upper
+
+
+class ProductFacetIndex(CatalogIndex):
+    """Bitsets des produits publiés par valeur de facette"""
+
+    label = "de facettes"
+
+    def _reset(self):
+        # product_id -> emplacement, et emplacement -> product_id
+        self.slots: Dict[str, int] = {}
+        self.slot_ids: List[Optional[str]] = []
+        self.free_slots: List[int] = []
+        # Bitset de tous les produits indexés
+        self.all_bits = 0
+        # facette -> valeur -> bitset
+        self.bits: Dict[str, Dict[object, int]] = {facet: {} for facet in FACETS}
+        # product_id -> valeurs de facettes (pour la suppression)
+        self.doc_values: Dict[str, Dict[str, object]] = {}
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    def stats(self) -> dict:
+        return {"documents": len(self.slots), "shops": len(self.bits["shop_id"])}
+
+    # ---------- Mise à jour ----------
+
+    def upsert(self, product: dict):
+        product_id = str(product.get("_id") or product.get("id"))
+        self.remove(product_id)
+        if product.get("status") != "published":
+            return
+
+        if self.free_slots:
+            slot = self.free_slots.pop()
+            self.slot_ids[slot] = product_id
+        else:
+            slot = len(self.slot_ids)
+            self.slot_ids.append(product_id)
+        self.slots[product_id] = slot
+
+        category = product.get("category")
+        values = {
+            "category": category.value if hasattr(category, "value") else category,
+            "price": price_bucket(product.get("price")),
+            "shop_id": product.get("shop_id"),
+        }
+        mask = 1 << slot
+        self.all_bits |= mask
+        for facet, value in values.items():
+            if value is not None:
+                self.bits[facet][value] = self.bits[facet].get(value, 0) | mask
+        self.doc_values[product_id] = values
+
+    def remove(self, product_id: str):
+        product_id = str(product_id)
+        slot = self.slots.pop(product_id, None)
+        if slot is None:
+            return
+        mask = ~(1 << slot)
+        self.all_bits &= mask
+        for facet, value in self.doc_values.pop(product_id).items():
+            if value is None:
+                continue
+            remaining = self.bits[facet][value] & mask
+            if remaining:
+                self.bits[facet][value] = remaining
+            else:
+                del self.bits[facet][value]
+        self.slot_ids[slot] = None
+        self.free_slots.append(slot)
+
+    # ---------- Lecture ----------
+
+    def bits_for_ids(self, product_ids: Iterable[str]) -> int:
+        """Bitset d'un ensemble de produits (ex : résultats de recherche)"""
+        bits = 0
+        for product_id in product_ids:
+            slot = self.slots.get(product_id)
+            if slot is not None:
+                bits |= 1 << slot
+        return bits
+
+    def counts(
+        self,
+        category: Optional[str] = None,
+        price: Optional[int] = None,
+        shop_id: Optional[str] = None,
+        restrict_to: Optional[int] = None,
+    ) -> dict:
+        """
+        Compte les produits de chaque valeur de facette pour les filtres donnés.
+
+        Le compte d'une facette ignore son propre filtre (les autres valeurs de
+        cette facette restent sélectionnables), mais applique tous les autres.
+
+        Args:
+            category, price, shop_id: Filtres actifs (indice de tranche pour price)
+            restrict_to: Bitset supplémentaire, par exemple les résultats d'une recherche
+
+        Returns:
+            dict: {"total": int, "facets": {"category": ..., "price": ..., "shop_id": ...}}
+        """
+        base = self.all_bits if restrict_to is None else self.all_bits & restrict_to
+        selected = {"category": category, "price": price, "shop_id": shop_id}
+        filter_bits = {
+            facet: self.bits[facet].get(value, 0)
+            for facet, value in selected.items()
+            if value is not None
+        }
+
+        def matching(excluded: Optional[str] = None) -> int:
+            bits = base
+            for facet, facet_bits in filter_bits.items():
+                if facet != excluded:
+                    bits &= facet_bits
+            return bits
+
+        facets = {}
+        for facet in FACETS:
+            scope = matching(excluded=facet)
+            facets[facet] = {
+                value: count
+                for value, value_bits in self.bits[facet].items()
+                if (count := (scope & value_bits).bit_count())
+            }
+
+        # Toutes les catégories de l'enum sont listées, même à zéro
+        facets["category"] = {
+            category.value: facets["category"].get(category.value, 0)
+            for category in ProductCategory
+        }
+        facets["price"] = [
+            {
+                "bucket": bucket,
+                "min": price_bucket_bounds(bucket)[0],
+                "max": price_bucket_bounds(bucket)[1],
+                "count": facets["price"].get(bucket, 0),
+            }
+            for bucket in range(len(PRICE_BUCKET_EDGES))
+        ]
+
+        return {"total": matching().bit_count(), "facets": facets}
+
+
+# Instance partagée par l'application
+product_facet_index = ProductFacetIndex()
@@ -0,0 +1,209 @@
+"""
+Clés d'idempotence (en-tête `Idempotency-Key`) des routes de création.
+
+Un client mobile qui rejoue POST /checkout après une coupure réseau ne doit
+ni créer une deuxième commande ni repasser par le panier, le stock et les
+emails. La première exécution enregistre sa réponse dans la collection
+`idempotency_keys` ; une nouvelle requête avec la même clé (même
+utilisateur, même route, même corps) renvoie la réponse enregistrée avec
+l'en-tête `Idempotent-Replayed: true`.
+
+- Même clé, corps différent : 422.
+- Même clé pendant que la première exécution est en cours : 409.
+- Une exécution en erreur libère la clé : le client peut réessayer.
+- Une exécution en cours renouvelle son bail (`locked_at`) : une
+  transaction qui se rejoue longtemps n'est jamais reprise par un autre
+  appel. Une exécution interrompue (processus arrêté) cesse de le
+  renouveler et est reprise après IDEMPOTENCY_LOCK_SECONDS.
+- Un gestionnaire dont l'effet est validé (commande insérée) enregistre
+  sa réponse aussitôt (`record_response`) : une annulation ultérieure
+  (déconnexion du client) ne libère plus la clé et la nouvelle tentative
+  rejoue la réponse.
+
+Les clés expirent après IDEMPOTENCY_TTL_HOURS (index TTL sur `expires_at`).
+"""
+
+import asyncio
+import hashlib
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Optional
+
+from bson import ObjectId
+
+from fastapi import HTTPException, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from app.config.settings import settings
+
+# Longueur maximale d'une clé fournie par le client
+MAX_KEY_LENGTH = 255
+
+# Exécution idempotente de la tâche courante : {"id", "owner", "completion"}
+_current: ContextVar[Optional[dict]] = ContextVar("idempotency_execution", default=None)
+
+
+async def _fingerprint(request: Request) -> str:
+    """Empreinte du corps et des paramètres de la requête"""
+    digest = hashlib.sha256()
+    digest.update(request.url.query.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(await request.body())
+    return digest.hexdigest()
+
+
+def _replay(record: dict) -> JSONResponse:
+    return JSONResponse(
+        content=record["body"],
+        status_code=record["status_code"],
+        headers={"Idempotent-Replayed": "true"},
+    )
+
+
+async def _acquire(db, record_id: str, fingerprint: str, owner: str) -> Optional[dict]:
+    """
+    Réserve la clé pour une première exécution
+
+    Returns:
+        None si la requête doit être exécutée, sinon l'enregistrement existant
+        (réponse terminée à rejouer)
+    """
+    now = datetime.utcnow()
+    try:
+        await db.idempotency_keys.insert_one({
+            "_id": record_id,
+            "fingerprint": fingerprint,
+            "status": "processing",
+            "owner": owner,
+            "locked_at": now,
+            "expires_at": now + timedelta(hours=settings.IDEMPOTENCY_TTL_HOURS),
+        })
+        return None
+    except DuplicateKeyError:
+        pass
+
+    existing = await db.idempotency_keys.find_one({"_id": record_id})
+    if existing is None:
+        # Clé expirée entre-temps : nouvelle tentative d'acquisition
+        return await _acquire(db, record_id, fingerprint, owner)
+    if existing["fingerprint"] != fingerprint:
+        raise HTTPException(
+            status_code=422,
+            detail="Clé d'idempotence déjà utilisée pour une requête différente"
+        )
+    if existing["status"] == "completed":
+        return existing
+
+    # Exécution en cours... ou abandonnée : reprise après le délai de verrou
+    stale_before = now - timedelta(seconds=settings.IDEMPOTENCY_LOCK_SECONDS)
+    taken_over = await db.idempotency_keys.find_one_and_update(
+        {"_id": record_id, "status": "processing", "locked_at": {"$lt": stale_before}},
+        {"$set": {"locked_at": now, "owner": owner}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if taken_over is None:
+        raise HTTPException(
+            status_code=409,
+            detail="Une requête avec cette clé d'idempotence est en cours de traitement",
+            headers={"Retry-After": "1"},
+        )
+    return None
+
+
+async def _renew_lease(db, record_id: str, owner: str):
+    """Repousse la reprise de la clé tant que l'exécution est en cours"""
+    while True:
+        await asyncio.sleep(settings.IDEMPOTENCY_LOCK_SECONDS / 3)
+        await db.idempotency_keys.update_one(
+            {"_id": record_id, "status": "processing", "owner": owner},
+            {"$set": {"locked_at": datetime.utcnow()}},
+        )
+
+
+async def _complete(db, record_id: str, owner: str, body: Any):
+    await db.idempotency_keys.update_one(
+        {"_id": record_id, "status": "processing", "owner": owner},
+        {"$set": {
+            "status": "completed",
+            "status_code": 200,
+            "body": jsonable_encoder(body),
+            "completed_at": datetime.utcnow(),
+        }},
+    )
+
+
+async def record_response(db, body: Any):
+    """
+    Enregistre la réponse dès que l'effet de la requête est validé
+
+    À appeler par le gestionnaire juste après son écriture décisive : une
+    annulation survenant ensuite rejoue cette réponse au lieu de
+    réexécuter la requête. Sans effet hors de `run_idempotent`.
+    """
+    execution = _current.get()
+    if execution is None or execution["completion"] is not None:
+        return
+    execution["completion"] = asyncio.ensure_future(
+        _complete(db, execution["id"], execution["owner"], body)
+    )
+    # L'écriture se termine même si la requête est annulée pendant l'attente
+    await asyncio.shield(execution["completion"])
+
+
+async def run_idempotent(
+    db,
+    request: Request,
+    user_id: str,
+    idempotency_key: Optional[str],
+    handler: Callable[[], Awaitable[Any]],
+) -> Any:
+    """
+    Exécute `handler` une seule fois par clé d'idempotence
+
+    Args:
+        db: Base de données Motor
+        request: Requête en cours (route et corps servent d'empreinte)
+        user_id: Utilisateur authentifié (les clés sont propres à chaque utilisateur)
+        idempotency_key: Valeur de l'en-tête Idempotency-Key (None : pas de déduplication)
+        handler: Exécution réelle de la route
+
+    Returns:
+        Le résultat de `handler`, ou la réponse enregistrée lors de la première exécution
+    """
+    if idempotency_key is None:
+        return await handler()
+    if not idempotency_key or len(idempotency_key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail="En-tête Idempotency-Key invalide")
+
+    record_id = f"{user_id}:{request.method} {request.url.path}:{idempotency_key}"
+    owner = str(ObjectId())
+    existing = await _acquire(db, record_id, await _fingerprint(request), owner)
+    if existing is not None:
+        return _replay(existing)
+
+    execution = {"id": record_id, "owner": owner, "completion": None}
+    context = _current.set(execution)
+    lease = asyncio.ensure_future(_renew_lease(db, record_id, owner))
+    release = {"_id": record_id, "status": "processing", "owner": owner}
+    try:
+        result = await handler()
+    except BaseException:
+        if execution["completion"] is None:
+            # Aucune réponse à rejouer : libérer la clé (même si la requête est annulée)
+            await asyncio.shield(db.idempotency_keys.delete_one(release))
+        raise
+    finally:
+        lease.cancel()
+        _current.reset(context)
+
+    if isinstance(result, Response):
+        # Réponse non JSON : non enregistrée
+        await db.idempotency_keys.delete_one(release)
+        return result
+
+    if execution["completion"] is None:
+        await asyncio.shield(_complete(db, record_id, owner, result))
+    return result
@@ -0,0 +1,208 @@
+"""
+File de tâches durable (outbox MongoDB) pour les effets de bord asynchrones.
+
+Une route publie une tâche (`enqueue`) dans la collection `outbox`, si
+possible dans la même transaction que l'écriture métier : la tâche existe
+si et seulement si l'écriture a eu lieu. Des workers (tâches asyncio
+lancées au démarrage) réclament les tâches une à une, exécutent le
+gestionnaire enregistré pour leur type et les rejouent en cas d'échec avec
+un délai exponentiel.
+
+Une tâche réclamée est louée pour JOB_LEASE_SECONDS : si le processus meurt
+pendant son exécution, elle redevient disponible à l'expiration du bail.
+Les gestionnaires doivent donc être idempotents (voir order_jobs).
+"""
+
+import asyncio
+import os
+import random
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from pymongo import InsertOne, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from app.config.settings import settings
+
+# Gestionnaire : (db, payload) -> None ; lève une exception pour être rejoué
+JobHandler = Callable[[object, dict], Awaitable[None]]
+
+# Type de tâche -> gestionnaire
+JOB_HANDLERS: Dict[str, JobHandler] = {}
+
+# Délai avant la première nouvelle tentative, puis doublé à chaque échec
+RETRY_BASE_SECONDS = 5
+RETRY_MAX_SECONDS = 3600
+
+
+def job_handler(job_type: str):
+    """Décorateur : enregistre le gestionnaire d'un type de tâche"""
+    def register(handler: JobHandler) -> JobHandler:
+        JOB_HANDLERS[job_type] = handler
+        return handler
+    return register
+
+
+def retry_delay(attempts: int) -> float:
+    """Délai avant la tentative suivante (exponentiel borné, avec gigue)"""
+    delay = min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+
+async def enqueue(
+    db,
+    job_type: str,
+    payload: dict,
+    dedupe_key: Optional[str] = None,
+    session=None,
+):
+    """
+    Publie une tâche dans l'outbox
+
+    Args:
+        db: Base de données Motor
+        job_type: Type de tâche (clé de JOB_HANDLERS)
+        payload: Données transmises au gestionnaire
+        dedupe_key: Clé unique optionnelle ; une tâche déjà publiée avec la
+            même clé n'est pas dupliquée (publication rejouée sans risque)
+        session: Session de la transaction en cours, le cas échéant
+    """
+    now = datetime.utcnow()
+    job = {
+        "type": job_type,
+        "payload": payload,
+        "status": "pending",
+        "attempts": 0,
+        "available_at": now,
+        "created_at": now,
+        "updated_at": now,
+    }
+    if dedupe_key is None:
+        await db.outbox.insert_one(job, session=session)
+        return
+    try:
+        await db.outbox.update_one(
+            {"dedupe_key": dedupe_key},
+            {"$setOnInsert": {**job, "dedupe_key": dedupe_key}},
+            upsert=True,
+            session=session,
+        )
+    except DuplicateKeyError:
+        # Publication concurrente de la même tâche
+        pass
+
+
+async def enqueue_many(db, jobs: List[Tuple[str, dict, Optional[str]]], session=None):
+    """
+    Publie plusieurs tâches en un seul `bulk_write`
+
+    Args:
+        jobs: (type, payload, clé de déduplication ou None) de chaque tâche
+    """
+    if not jobs:
+        return
+    now = datetime.utcnow()
+    operations = []
+    for job_type, payload, dedupe_key in jobs:
+        job = {
+            "type": job_type,
+            "payload": payload,
+            "status": "pending",
+            "attempts": 0,
+            "available_at": now,
+            "created_at": now,
+            "updated_at": now,
+        }
+        if dedupe_key is None:
+            operations.append(InsertOne(job))
+        else:
+            operations.append(UpdateOne(
+                {"dedupe_key": dedupe_key},
+                {"$setOnInsert": {**job, "dedupe_key": dedupe_key}},
+                upsert=True,
+            ))
+    try:
+        await db.outbox.bulk_write(operations, ordered=False, session=session)
+    except BulkWriteError as e:
+        # Seules les publications concurrentes d'une même clé sont tolérées
+        if any(error["code"] != 11000 for error in e.details.get("writeErrors", [])):
+            raise
+
+
+async def claim_job(db, worker_id: str) -> Optional[dict]:
+    """Réclame la prochaine tâche disponible (ou dont le bail a expiré)"""
+    now = datetime.utcnow()
+    return await db.outbox.find_one_and_update(
+        {"$or": [
+            {"status": "pending", "available_at": {"$lte": now}},
+            {"status": "processing", "locked_until": {"$lte": now}},
+        ]},
+        {
+            "$set": {
+                "status": "processing",
+                "locked_until": now + timedelta(seconds=settings.JOB_LEASE_SECONDS),
+                "worker": worker_id,
+                "updated_at": now,
+            },
+            "$inc": {"attempts": 1},
+        },
+        sort=[("available_at", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def complete_job(db, job: dict):
+    """Marque une tâche comme terminée (purgée ensuite par l'index TTL)"""
+    now = datetime.utcnow()
+    await db.outbox.update_one(
+        {"_id": job["_id"], "worker": job["worker"]},
+        {"$set": {"status": "done", "completed_at": now, "updated_at": now},
+         "$unset": {"locked_until": ""}},
+    )
+
+
+async def fail_job(db, job: dict, error: Exception):
+    """Reprogramme une tâche en échec, ou l'abandonne après JOB_MAX_ATTEMPTS tentatives"""
+    now = datetime.utcnow()
+    update = {"last_error": f"{type(error).__name__}: {error}", "updated_at": now}
+    if job["attempts"] >= settings.JOB_MAX_ATTEMPTS:
+        update["status"] = "failed"
+        print(f"❌ Tâche {job['type']} {job['_id']} abandonnée après {job['attempts']} tentatives: {error}")
+    else:
+        update["status"] = "pending"
+        update["available_at"] = now + timedelta(seconds=retry_delay(job["attempts"]))
+    await db.outbox.update_one(
+        {"_id": job["_id"], "worker": job["worker"]},
+        {"$set": update, "$unset": {"locked_until": ""}},
+    )
+
+
+async def process_job(db, job: dict):
+    """Exécute une tâche réclamée et enregistre son issue"""
+    handler = JOB_HANDLERS.get(job["type"])
+    try:
+        if handler is None:
+            raise LookupError(f"Aucun gestionnaire pour le type {job['type']}")
+        await handler(db, job["payload"])
+    except Exception as e:
+        await fail_job(db, job, e)
+    else:
+        await complete_job(db, job)
+
+
+async def run_worker(db, worker_id: Optional[str] = None, poll_interval: Optional[float] = None):
+    """Tâche de fond : traite les tâches de l'outbox en continu"""
+    worker_id = worker_id or f"{os.getpid()}-{id(asyncio.current_task())}"
+    poll_interval = poll_interval or settings.JOB_POLL_INTERVAL_SECONDS
+    while True:
+        try:
+            job = await claim_job(db, worker_id)
+            if job is None:
+                await asyncio.sleep(poll_interval)
+                continue
+            await process_job(db, job)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"❌ Erreur worker {worker_id}: {e}")
+            await asyncio.sleep(poll_interval)
@@ -0,0 +1,98 @@
+"""
+Chargeurs groupés (DataLoader) propres à une requête HTTP.
+
+Les routes qui enrichissent une liste (panier, commandes, conversations...)
+demandaient chaque document lié par un `find_one` séquentiel : un panier de
+30 articles coûtait 31 allers-retours. Un chargeur regroupe les clés
+demandées pendant un même tour de boucle asyncio, les dédoublonne et les
+résout par une seule requête `$in` par collection. Les résultats sont
+mémorisés pour toute la durée de la requête.
+
+Un jeu de chargeurs est créé par requête (dépendance `get_loaders` de
+main.py) : rien n'est partagé entre utilisateurs.
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
+
+from bson import ObjectId
+
+from app.services.product_cache import product_cache
+
+# Fonction de lot : clés -> {clé: document}
+BatchFunction = Callable[[List[str]], Awaitable[Dict[str, dict]]]
+
+
+class BatchLoader:
+    """Regroupe les chargements d'un tour de boucle en un seul appel de lot"""
+
+    def __init__(self, batch_fn: BatchFunction):
+        self._batch_fn = batch_fn
+        # Clé -> future du document (None si introuvable)
+        self._futures: Dict[str, asyncio.Future] = {}
+        self._queue: List[str] = []
+        # Nombre d'appels de lot (requêtes MongoDB) effectués
+        self.batches = 0
+
+    async def load(self, key) -> Optional[dict]:
+        """Document associé à `key`, ou None s'il n'existe pas"""
+        key = str(key)
+        future = self._futures.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._futures[key] = future
+            if not self._queue:
+                # Les clés demandées jusqu'au prochain tour partent ensemble
+                loop.call_soon(lambda: asyncio.ensure_future(self._dispatch()))
+            self._queue.append(key)
+        return await future
+
+    async def load_many(self, keys: Iterable) -> List[Optional[dict]]:
+        """Documents associés à `keys`, dans le même ordre (None si introuvable)"""
+        return await asyncio.gather(*(self.load(key) for key in keys))
+
+    async def _dispatch(self):
+        keys, self._queue = self._queue, []
+        self.batches += 1
+        try:
+            documents = await self._batch_fn(keys)
+        except Exception as e:
+            for key in keys:
+                self._futures.pop(key).set_exception(e)
+            return
+        for key in keys:
+            self._futures[key].set_result(documents.get(key))
+
+
+def _object_ids(keys: List[str]) -> List[ObjectId]:
+    return [ObjectId(key) for key in keys if ObjectId.is_valid(key)]
+
+
+class Loaders:
+    """Chargeurs d'une requête : produits, utilisateurs et boutiques"""
+
+    def __init__(self, db):
+        self.db = db
+        # Produits par _id (cache des produits consulté d'abord)
+        self.products = BatchLoader(self._load_products)
+        # Utilisateurs par _id
+        self.users = BatchLoader(self._load_users)
+        # Boutiques par owner_id (ID du vendeur)
+        self.shops_by_owner = BatchLoader(self._load_shops_by_owner)
+
+    @property
+    def batches(self) -> int:
+        """Nombre total d'appels de lot (au plus une requête MongoDB chacun)"""
+        return self.products.batches + self.users.batches + self.shops_by_owner.batches
+
+    async def _load_products(self, keys: List[str]) -> Dict[str, dict]:
+        return await product_cache.get_many(self.db, keys)
+
+    async def _load_users(self, keys: List[str]) -> Dict[str, dict]:
+        cursor = self.db.users.find({"_id": {"$in": _object_ids(keys)}}, {"hashed_password": 0})
+        return {str(user["_id"]): user async for user in cursor}
+
+    async def _load_shops_by_owner(self, keys: List[str]) -> Dict[str, dict]:
+        cursor = self.db.shops.find({"owner_id": {"$in": keys}})
+        return {shop["owner_id"]: shop async for shop in cursor}
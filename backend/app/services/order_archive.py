@@ -0,0 +1,167 @@
+"""
+Archivage des commandes terminées (tiering chaud / froid).
+
+Les commandes livrées ou annulées depuis plus de `ORDER_ARCHIVE_AFTER_DAYS`
+jours ne changent plus (aucune transition depuis ces statuts) : la tâche
+d'archivage les déplace par lots de `orders` vers `orders_archive`, créée
+avec une compression de blocs plus forte (zstd par défaut). La collection
+chaude et ses index ne contiennent plus que les commandes récentes ou en
+cours.
+
+Un lot est d'abord recopié (upserts idempotents), puis supprimé de la
+collection chaude : une interruption entre les deux laisse la commande
+dans les deux collections, la lecture privilégie alors la copie chaude et
+l'exécution suivante termine le déplacement.
+
+Lecture : une page d'historique entièrement plus récente que la commande
+archivée la plus récente (`newest_archived`) est servie par `orders`
+seule ; l'archive n'est lue que lorsque le curseur l'atteint
+(`fetch_orders_page`). La borne est lue dans l'archive plutôt que déduite
+de l'horizon : des commandes archivées sous un ORDER_ARCHIVE_AFTER_DAYS
+plus court restent visibles après une augmentation du réglage.
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from pymongo import ReplaceOne
+from pymongo.errors import CollectionInvalid, OperationFailure
+
+from app.config.settings import settings
+from app.utils.pagination import clamp_limit, encode_cursor, fetch_page
+
+ARCHIVE_COLLECTION = "orders_archive"
+
+# Statuts terminaux : une commande archivée n'est plus modifiée
+ARCHIVABLE_STATUSES = ("delivered", "cancelled")
+
+
+def archive_horizon(now: Optional[datetime] = None) -> datetime:
+    """Date avant laquelle une commande peut se trouver dans l'archive"""
+    return (now or datetime.utcnow()) - timedelta(days=settings.ORDER_ARCHIVE_AFTER_DAYS)
+
+
+async def newest_archived(db) -> Optional[datetime]:
+    """Date de création de la commande archivée la plus récente (None si l'archive est vide)"""
+    newest = await db[ARCHIVE_COLLECTION].find_one({}, {"created_at": 1}, sort=[("created_at", -1)])
+    return newest["created_at"] if newest else None
+
+
+async def ensure_archive_collection(db):
+    """Crée la collection d'archive compressée (avant ses index)"""
+    storage = {"wiredTiger": {"configString": f"block_compressor={settings.ORDER_ARCHIVE_COMPRESSOR}"}}
+    try:
+        await db.create_collection(ARCHIVE_COLLECTION, storageEngine=storage)
+    except CollectionInvalid:
+        pass
+    except OperationFailure as e:
+        if e.code == 48:  # NamespaceExists
+            return
+        # Ex : compresseur indisponible sur le serveur, la compression par défaut s'applique
+        print(f"⚠️  Collection {ARCHIVE_COLLECTION} créée sans compression {settings.ORDER_ARCHIVE_COMPRESSOR}: {e}")
+
+
+async def archive_orders(db, batch_size: int, max_batches: Optional[int] = None, now: Optional[datetime] = None) -> dict:
+    """
+    Déplace les commandes terminées avant l'horizon vers l'archive
+
+    Args:
+        db: Base de données Motor
+        batch_size: Commandes par lot (un bulk_write puis un delete_many)
+        max_batches: Nombre maximal de lots (None : jusqu'à épuisement)
+
+    Returns:
+        dict: {"archived": commandes déplacées, "batches": lots traités}
+    """
+    query = {"status": {"$in": list(ARCHIVABLE_STATUSES)}, "updated_at": {"$lt": archive_horizon(now)}}
+    archived = batches = 0
+
+    while max_batches is None or batches < max_batches:
+        orders = await db.orders.find(query).sort("updated_at", 1).limit(batch_size).to_list(batch_size)
+        if not orders:
+            break
+        archived_at = datetime.utcnow()
+        await db[ARCHIVE_COLLECTION].bulk_write([
+            ReplaceOne({"_id": order["_id"]}, {**order, "archived_at": archived_at}, upsert=True)
+            for order in orders
+        ], ordered=False)
+        # Le filtre d'archivage est repris : une commande sortie des statuts
+        # terminaux entre-temps reste dans la collection chaude
+        result = await db.orders.delete_many({"$and": [query, {"_id": {"$in": [o["_id"] for o in orders]}}]})
+        archived += result.deleted_count
+        batches += 1
+
+    return {"archived": archived, "batches": batches}
+
+
+async def run_archive_loop(db, interval_seconds: float):
+    """Tâche de fond : archive les commandes terminées par lots"""
+    while True:
+        try:
+            stats = await archive_orders(db, settings.ORDER_ARCHIVE_BATCH_SIZE)
+            if stats["archived"]:
+                print(f"✅ Commandes archivées: {stats['archived']}")
+        except Exception as e:
+            print(f"❌ Erreur archivage des commandes: {e}")
+        await asyncio.sleep(interval_seconds)
+
+
+def _merge(hot: List[dict], cold: List[dict], sort_field: str) -> List[dict]:
+    """Fusionne deux listes triées par (sort_field, _id) décroissants ; la copie chaude prime"""
+    hot_ids = {document["_id"] for document in hot}
+    merged = hot + [document for document in cold if document["_id"] not in hot_ids]
+    merged.sort(key=lambda document: (document.get(sort_field), document["_id"]), reverse=True)
+    return merged
+
+
+async def fetch_orders_page(
+    db,
+    query: dict,
+    limit: Optional[int] = None,
+    after: Optional[str] = None,
+    projection: Optional[dict] = None,
+) -> Tuple[List[dict], Optional[str]]:
+    """
+    Page de commandes triées par (created_at, _id) décroissants, archive comprise
+
+    Même contrat que `fetch_page` ; le curseur reste valable d'une
+    collection à l'autre.
+
+    Raises:
+        InvalidCursorError: Si le jeton `after` est invalide
+    """
+    documents, next_cursor = await fetch_page(db.orders, query, limit=limit, after=after, projection=projection)
+    if next_cursor:
+        # Borne lue après la page chaude : une commande supprimée de `orders`
+        # entre-temps a déjà été recopiée dans l'archive
+        newest = await newest_archived(db)
+        if newest is None or documents[-1]["created_at"] > newest:
+            # Page entière plus récente que toute commande archivée
+            return documents, next_cursor
+
+    archived, archive_cursor = await fetch_page(
+        db[ARCHIVE_COLLECTION], query, limit=limit, after=after, projection=projection
+    )
+    page_size = clamp_limit(limit)
+    merged = _merge(documents, archived, "created_at")
+    if len(merged) > page_size or next_cursor or archive_cursor:
+        merged = merged[:page_size]
+        return merged, encode_cursor("created_at", merged[-1])
+    return merged, None
+
+
+async def find_all_orders(db, query: dict, projection: Optional[dict] = None) -> List[dict]:
+    """Toutes les commandes d'un filtre, archive comprise, des plus récentes aux plus anciennes"""
+    sort = [("created_at", -1), ("_id", -1)]
+    hot = await db.orders.find(query, projection).sort(sort).to_list(None)
+    cold = await db[ARCHIVE_COLLECTION].find(query, projection).sort(sort).to_list(None)
+    return _merge(hot, cold, "created_at")
+
+
+async def find_order(db, query: dict, projection: Optional[dict] = None) -> Optional[dict]:
+    """Une commande : collection chaude, puis archive"""
+    order = await db.orders.find_one(query, projection)
+    if order is None:
+        order = await db[ARCHIVE_COLLECTION].find_one(query, projection)
+    return order
@@ -0,0 +1,232 @@
+"""
+Effets de bord d'une commande, exécutés par les workers de la file de tâches.
+
+`order_created` est publiée par le paiement dans la transaction de la
+commande. Elle se décompose en tâches plus fines, rejouées indépendamment :
+
+- `notify_seller_new_order` : notification et email à chaque vendeur
+- `check_low_stock` : relecture groupée du stock des produits commandés
+- `low_stock_alert` : notification et email d'alerte pour un produit
+- `rollup_order` : agrégats de ventes vendeurs et produits (rollup_service)
+
+Changements de statut (order_status_service) :
+
+- `order_status_batch` : notifications des clients d'un lot de commandes
+- `order_status_email` : email de changement de statut à un client
+
+Chaque tâche est idempotente : les sous-tâches portent une clé de
+déduplication et les notifications sont écrites par upsert, seul l'email
+(envoyé en dernier) peut être renvoyé si son envoi a échoué.
+"""
+
+import asyncio
+from datetime import datetime
+
+from bson import ObjectId
+
+from pymongo import UpdateOne
+
+from app.services.email_service import send_low_stock_alert, send_new_order_email, send_order_status_email
+from app.services.job_queue import enqueue, enqueue_many, job_handler
+from app.services.rollup_service import apply_order_event, publish_order_event
+
+# Seuil de stock déclenchant une alerte au vendeur
+LOW_STOCK_THRESHOLD = 5
+
+# Libellés des statuts dans les notifications clients
+STATUS_LABELS = {
+    "pending": "en attente",
+    "confirmed": "confirmée",
+    "processing": "en préparation",
+    "shipped": "expédiée",
+    "delivered": "livrée",
+    "cancelled": "annulée",
+}
+
+
+class EmailDeliveryError(Exception):
+    """L'envoi d'un email a échoué (la tâche sera rejouée)"""
+
+
+async def _send(send_function, **kwargs):
+    """Envoie un email hors de la boucle asyncio (SMTP bloquant)"""
+    if not await asyncio.to_thread(send_function, **kwargs):
+        raise EmailDeliveryError(f"Échec d'envoi à {kwargs.get('to_email')}")
+
+
+async def _notify(db, key: dict, title: str, message: str):
+    """Crée une notification une seule fois pour une clé donnée"""
+    await db.notifications.update_one(
+        key,
+        {"$setOnInsert": {
+            "title": title,
+            "message": message,
+            "read": False,
+            "created_at": datetime.utcnow(),
+        }},
+        upsert=True,
+    )
+
+
+@job_handler("order_created")
+async def handle_order_created(db, payload: dict):
+    """Publie les notifications vendeurs et le contrôle de stock d'une commande"""
+    order_id = payload["order_id"]
+    order = await db.orders.find_one({"_id": ObjectId(order_id)}, {"items": 1})
+    if order is None:
+        return
+
+    seller_ids = sorted(set(item["seller_id"] for item in order.get("items", [])))
+    for seller_id in seller_ids:
+        await enqueue(
+            db, "notify_seller_new_order",
+            {"order_id": order_id, "seller_id": seller_id},
+            dedupe_key=f"notify_seller_new_order:{order_id}:{seller_id}",
+        )
+    await enqueue(
+        db, "check_low_stock",
+        {"order_id": order_id, "product_ids": [item["product_id"] for item in order.get("items", [])]},
+        dedupe_key=f"check_low_stock:{order_id}",
+    )
+    await publish_order_event(db, order_id, "created", event_id=f"created:{order_id}")
+
+
+@job_handler("notify_seller_new_order")
+async def handle_notify_seller_new_order(db, payload: dict):
+    """Notification in-app puis email de nouvelle commande à un vendeur"""
+    order_id, seller_id = payload["order_id"], payload["seller_id"]
+    order = await db.orders.find_one({"_id": ObjectId(order_id)}, {"items": 1})
+    seller = await db.users.find_one({"_id": ObjectId(seller_id)}, {"email": 1, "full_name": 1})
+    if order is None or seller is None:
+        return
+
+    seller_items = [item for item in order.get("items", []) if item["seller_id"] == seller_id]
+    seller_total = sum(item["total"] for item in seller_items)
+
+    await _notify(
+        db,
+        {"user_id": seller_id, "type": "new_order", "order_id": order_id},
+        title=f"🛒 Nouvelle commande #{order_id[-8:]}",
+        message=f"Vous avez reçu une nouvelle commande de {len(seller_items)} article(s) pour {seller_total:.2f} €",
+    )
+    await _send(
+        send_new_order_email,
+        to_email=seller["email"],
+        seller_name=seller.get("full_name", "Vendeur"),
+        order_id=order_id,
+        items=seller_items,
+        total=seller_total,
+    )
+
+
+@job_handler("check_low_stock")
+async def handle_check_low_stock(db, payload: dict):
+    """Relit le stock des produits commandés (une requête) et publie les alertes"""
+    order_id = payload["order_id"]
+    cursor = db.products.find(
+        {
+            "_id": {"$in": [ObjectId(i) for i in payload["product_ids"]]},
+            "stock_quantity": {"$lte": LOW_STOCK_THRESHOLD},
+        },
+        {"_id": 1},
+    )
+    async for product in cursor:
+        product_id = str(product["_id"])
+        await enqueue(
+            db, "low_stock_alert",
+            {"order_id": order_id, "product_id": product_id},
+            dedupe_key=f"low_stock_alert:{order_id}:{product_id}",
+        )
+
+
+@job_handler("low_stock_alert")
+async def handle_low_stock_alert(db, payload: dict):
+    """Notification in-app puis email d'alerte de stock faible au vendeur"""
+    product = await db.products.find_one(
+        {"_id": ObjectId(payload["product_id"])},
+        {"name": 1, "seller_id": 1, "stock_quantity": 1},
+    )
+    if product is None:
+        return
+    seller = await db.users.find_one({"_id": ObjectId(product["seller_id"])}, {"email": 1, "full_name": 1})
+    if seller is None:
+        return
+
+    stock = product.get("stock_quantity", 0)
+    await _notify(
+        db,
+        {
+            "user_id": product["seller_id"],
+            "type": "low_stock",
+            "product_id": payload["product_id"],
+            "order_id": payload["order_id"],
+        },
+        title=f"⚠️ Stock faible: {product['name']}",
+        message=f"Il ne reste que {stock} unités en stock.",
+    )
+    await _send(
+        send_low_stock_alert,
+        to_email=seller["email"],
+        seller_name=seller.get("full_name", "Vendeur"),
+        product_name=product["name"],
+        current_stock=stock,
+    )
+
+
+@job_handler("rollup_order")
+async def handle_rollup_order(db, payload: dict):
+    """Replie un événement de commande (création, annulation) dans les agrégats de ventes"""
+    await apply_order_event(db, payload["order_id"], payload["event"], payload["event_id"])
+
+
+@job_handler("order_status_batch")
+async def handle_order_status_batch(db, payload: dict):
+    """Notifications in-app d'un lot de changements de statut, puis un email par commande"""
+    order_ids, new_status = payload["order_ids"], payload["status"]
+    cursor = db.orders.find({"_id": {"$in": [ObjectId(i) for i in order_ids]}}, {"user_id": 1})
+    orders = await cursor.to_list(None)
+    if not orders:
+        return
+
+    label = STATUS_LABELS.get(new_status, new_status)
+    now = datetime.utcnow()
+    await db.notifications.bulk_write([
+        UpdateOne(
+            {"user_id": order["user_id"], "type": "order_status", "order_id": str(order["_id"]), "status": new_status},
+            {"$setOnInsert": {
+                "title": f"📦 Commande #{str(order['_id'])[-8:]} {label}",
+                "message": f"Votre commande est désormais {label}.",
+                "read": False,
+                "created_at": now,
+            }},
+            upsert=True,
+        )
+        for order in orders
+    ], ordered=False)
+
+    await enqueue_many(db, [
+        (
+            "order_status_email",
+            {"order_id": str(order["_id"]), "status": new_status},
+            f"order_status_email:{order['_id']}:{new_status}",
+        )
+        for order in orders
+    ])
+
+
+@job_handler("order_status_email")
+async def handle_order_status_email(db, payload: dict):
+    """Email de changement de statut au client d'une commande"""
+    order = await db.orders.find_one({"_id": ObjectId(payload["order_id"])}, {"user_id": 1})
+    if order is None:
+        return
+    customer = await db.users.find_one({"_id": ObjectId(order["user_id"])}, {"email": 1, "full_name": 1})
+    if customer is None:
+        return
+    await _send(
+        send_order_status_email,
+        to_email=customer["email"],
+        customer_name=customer.get("full_name", "Client"),
+        order_id=payload["order_id"],
+        new_status=payload["status"],
+    )
@@ -0,0 +1,140 @@
+"""
+Changements de statut des commandes (unitaires ou par lot).
+
+Un vendeur qui expédie des centaines de colis par jour met à jour leurs
+commandes en un appel : les transitions sont validées pour toute la liste,
+appliquées par un seul `bulk_write`, puis les effets de bord sont publiés
+en un lot dans l'outbox :
+
+- `order_status_batch` : notifications in-app des clients (un bulk_write)
+  et une tâche `order_status_email` par commande (voir order_jobs) ;
+- `rollup_order` pour les annulations (agrégats de ventes).
+
+Chaque mise à jour est conditionnée au statut lu : une commande modifiée
+entre-temps est signalée en conflit plutôt qu'écrasée.
+"""
+
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from app.services.job_queue import enqueue_many
+from app.services.order_archive import ARCHIVE_COLLECTION
+from app.services.rollup_service import order_event_job, status_change_event
+from app.services.seller_orders import set_order_status
+
+ORDER_STATUSES = ("pending", "confirmed", "processing", "shipped", "delivered", "cancelled")
+
+# Progression normale d'une commande (les étapes peuvent être sautées)
+STATUS_PROGRESSION = ("pending", "confirmed", "processing", "shipped", "delivered")
+# Statuts depuis lesquels une commande peut encore être annulée
+CANCELLABLE_STATUSES = {"pending", "confirmed", "processing"}
+
+# Nombre maximal de commandes par appel
+MAX_BULK_ORDERS = 500
+
+
+def can_transition(current: Optional[str], new: str) -> bool:
+    """Transition autorisée : progression vers l'avant, ou annulation avant expédition"""
+    if new == "cancelled":
+        return current in CANCELLABLE_STATUSES
+    if current not in STATUS_PROGRESSION or new not in STATUS_PROGRESSION:
+        return False
+    return STATUS_PROGRESSION.index(new) > STATUS_PROGRESSION.index(current)
+
+
+async def _owned_order_ids(db, seller_id: str, order_ids: Iterable[str]) -> set:
+    """Commandes de la liste contenant des articles du vendeur"""
+    cursor = db.seller_order_lines.find(
+        {"order_id": {"$in": list(order_ids)}, "seller_id": seller_id},
+        {"order_id": 1},
+    )
+    return {line["order_id"] async for line in cursor}
+
+
+async def change_order_status(db, order_ids: List[str], new_status: str, actor: dict) -> Dict[str, list]:
+    """
+    Valide et applique un nouveau statut à une liste de commandes
+
+    Args:
+        db: Base de données Motor
+        order_ids: Commandes à modifier
+        new_status: Statut cible (ORDER_STATUSES)
+        actor: Utilisateur à l'origine du changement (vendeur : ses commandes uniquement)
+
+    Returns:
+        dict: {"updated": [ids], "unchanged": [ids], "rejected": [{"order_id", "reason"}]}
+            avec reason parmi invalid_id, not_found, forbidden, invalid_transition, conflict
+    """
+    result = {"updated": [], "unchanged": [], "rejected": []}
+    order_ids = list(dict.fromkeys(order_ids))
+
+    valid_ids = []
+    for order_id in order_ids:
+        if ObjectId.is_valid(order_id):
+            valid_ids.append(order_id)
+        else:
+            result["rejected"].append({"order_id": order_id, "reason": "invalid_id"})
+
+    statuses = {}
+    cursor = db.orders.find({"_id": {"$in": [ObjectId(i) for i in valid_ids]}}, {"status": 1})
+    async for order in cursor:
+        statuses[str(order["_id"])] = order.get("status")
+    missing = [ObjectId(i) for i in valid_ids if i not in statuses]
+    if missing:
+        # Commandes archivées : statut terminal, aucune transition possible
+        async for order in db[ARCHIVE_COLLECTION].find({"_id": {"$in": missing}}, {"status": 1}):
+            statuses[str(order["_id"])] = order.get("status")
+
+    owned = None
+    if actor.get("role") != "admin":
+        owned = await _owned_order_ids(db, str(actor["_id"]), statuses)
+
+    # Précision de MongoDB (millisecondes) : `updated_at` relu à l'identique
+    now = datetime.utcnow()
+    now = now.replace(microsecond=now.microsecond // 1000 * 1000)
+    operations, previous = [], {}
+    for order_id in valid_ids:
+        if order_id not in statuses:
+            reason = "not_found"
+        elif owned is not None and order_id not in owned:
+            reason = "forbidden"
+        elif statuses[order_id] == new_status:
+            result["unchanged"].append(order_id)
+            continue
+        elif not can_transition(statuses[order_id], new_status):
+            reason = "invalid_transition"
+        else:
+            previous[order_id] = statuses[order_id]
+            operations.append(UpdateOne(
+                {"_id": ObjectId(order_id), "status": statuses[order_id]},
+                {"$set": {"status": new_status, "updated_at": now}},
+            ))
+            continue
+        result["rejected"].append({"order_id": order_id, "reason": reason})
+
+    if not operations:
+        return result
+
+    write = await db.orders.bulk_write(operations, ordered=False)
+    updated = list(previous)
+    if write.modified_count < len(operations):
+        # Commandes modifiées entre la lecture et l'écriture
+        cursor = db.orders.find({"_id": {"$in": [ObjectId(i) for i in previous]}}, {"status": 1, "updated_at": 1})
+        applied = {str(o["_id"]) async for o in cursor if o.get("status") == new_status and o.get("updated_at") == now}
+        updated = [i for i in previous if i in applied]
+        result["rejected"].extend({"order_id": i, "reason": "conflict"} for i in previous if i not in applied)
+    result["updated"] = updated
+
+    if updated:
+        await set_order_status(db, updated, new_status, now)
+        jobs = [("order_status_batch", {"order_ids": updated, "status": new_status}, None)]
+        for order_id in updated:
+            event = status_change_event(previous[order_id], new_status)
+            if event:
+                jobs.append(order_event_job(order_id, event))
+        await enqueue_many(db, jobs)
+
+    return result
@@ -0,0 +1,153 @@
+"""
+Cache en lecture des produits (LRU + TTL, budget mémoire en octets).
+
+Les routes panier, commande, conversations et la fiche produit relisent
+sans cesse les mêmes produits populaires. Le cache sert les champs qui
+peuvent être légèrement périmés (nom, images, prix) depuis la mémoire ;
+les chemins critiques pour le stock passent `fresh=True` pour relire
+MongoDB. Chaque écriture sur un produit doit appeler `invalidate`.
+
+Le TTL borne la péremption des entrées modifiées par un autre processus.
+"""
+
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+import bson
+from bson import ObjectId
+
+from app.config.settings import settings
+
+
+class ProductCache:
+    """Cache LRU borné en octets avec expiration des entrées"""
+
+    def __init__(self, max_bytes: int, ttl_seconds: float):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        # product_id -> (expiration, taille en octets, document)
+        self._entries: "OrderedDict[str, Tuple[float, int, dict]]" = OrderedDict()
+        self._size = 0
+        # Incrémenté à chaque invalidation pour écarter les lectures concurrentes
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _drop(self, product_id: str):
+        entry = self._entries.pop(product_id, None)
+        if entry is not None:
+            self._size -= entry[1]
+
+    def _store(self, product_id: str, product: dict):
+        size = len(bson.encode(product))
+        if size > self.max_bytes:
+            return
+        self._drop(product_id)
+        self._entries[product_id] = (time.monotonic() + self.ttl_seconds, size, product)
+        self._size += size
+        while self._size > self.max_bytes:
+            _, (_, evicted_size, _) = self._entries.popitem(last=False)
+            self._size -= evicted_size
+            self.evictions += 1
+
+    def _lookup(self, product_id: str) -> Optional[dict]:
+        """Copie de l'entrée encore valide, ou None"""
+        entry = self._entries.get(product_id)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            self._drop(product_id)
+            return None
+        self._entries.move_to_end(product_id)
+        self.hits += 1
+        return dict(entry[2])
+
+    async def get(self, db, product_id: str, fresh: bool = False) -> Optional[dict]:
+        """
+        Récupère un produit par son ID
+
+        Args:
+            db: Base de données Motor
+            product_id: ID du produit (chaîne)
+            fresh: Ignorer le cache et relire MongoDB (stock, checkout)
+
+        Returns:
+            Une copie superficielle du document, ou None si le produit n'existe pas
+        """
+        product_id = str(product_id)
+        if not fresh:
+            cached = self._lookup(product_id)
+            if cached is not None:
+                return cached
+
+        self.misses += 1
+        generation = self._generation
+        product = await db.products.find_one({"_id": ObjectId(product_id)})
+        if product is None:
+            return None
+
+        # Une écriture survenue pendant la lecture rend le document douteux
+        if generation == self._generation:
+            self._store(product_id, product)
+        return dict(product)
+
+    async def get_many(self, db, product_ids: Iterable[str]) -> Dict[str, dict]:
+        """
+        Récupère plusieurs produits : les absents du cache sont lus en une requête $in
+
+        Returns:
+            dict: product_id -> copie du document (IDs inconnus ou invalides absents)
+        """
+        found: Dict[str, dict] = {}
+        missing = []
+        for product_id in dict.fromkeys(str(i) for i in product_ids):
+            cached = self._lookup(product_id)
+            if cached is not None:
+                found[product_id] = cached
+            elif ObjectId.is_valid(product_id):
+                missing.append(product_id)
+
+        if missing:
+            self.misses += len(missing)
+            generation = self._generation
+            cursor = db.products.find({"_id": {"$in": [ObjectId(i) for i in missing]}})
+            async for product in cursor:
+                product_id = str(product["_id"])
+                if generation == self._generation:
+                    self._store(product_id, product)
+                found[product_id] = dict(product)
+        return found
+
+    def invalidate(self, product_id: str):
+        """Retire un produit du cache après une écriture"""
+        self._generation += 1
+        self._drop(str(product_id))
+
+    def clear(self):
+        """Vide entièrement le cache"""
+        self._generation += 1
+        self._entries.clear()
+        self._size = 0
+
+    def stats(self) -> dict:
+        """Statistiques d'utilisation du cache"""
+        return {
+            "entries": len(self._entries),
+            "bytes": self._size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+# Instance partagée par l'application
+product_cache = ProductCache(
+    max_bytes=settings.PRODUCT_CACHE_MAX_BYTES,
+    ttl_seconds=settings.PRODUCT_CACHE_TTL_SECONDS,
+)
@@ -0,0 +1,153 @@
+"""
+Clés de tri dénormalisées du catalogue (prix, note, popularité).
+
+Les tris "mieux notés" et "meilleures ventes" dépendent des avis et des
+commandes. Plutôt que de les calculer à chaque requête (jointures ou tri en
+mémoire), chaque produit porte ses clés de tri :
+
+- `seller_rating` : note moyenne du vendeur (users.average_rating)
+- `units_sold` : unités vendues hors commandes annulées
+- `popularity_score` : ventes récentes + une fraction des ventes totales
+
+Une tâche de fond les recalcule périodiquement et ne réécrit que les
+produits dont une clé a changé, horodatés par `rank_updated_at` :
+`updated_at` reste réservé aux changements du contenu (ETag, exports,
+synchronisation des index de recherche). Chaque clé est couverte par des index
+composés (app/config/indexes.py) : tous les modes de tri se paginent par
+curseur sans tri bloquant.
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from app.services.order_archive import ARCHIVE_COLLECTION
+from app.services.order_status_service import STATUS_PROGRESSION
+from app.services.product_cache import product_cache
+
+# Modes de tri de GET /products : nom -> (champ, direction)
+SORT_MODES: Dict[str, Tuple[str, int]] = {
+    "newest": ("created_at", -1),
+    "price_asc": ("price", 1),
+    "price_desc": ("price", -1),
+    "rating": ("seller_rating", -1),
+    "popularity": ("popularity_score", -1),
+}
+DEFAULT_SORT = "newest"
+
+# Fenêtre des ventes "récentes" du score de popularité
+POPULARITY_WINDOW_DAYS = 30
+# Poids des ventes totales dans le score (les ventes récentes comptent pour 1)
+LIFETIME_SALES_WEIGHT = 0.1
+
+# Nombre d'écritures envoyées par bulk_write
+RANK_WRITE_BATCH_SIZE = 500
+
+# Commandes comptées dans les ventes (toutes sauf annulées) ; filtre servi
+# par l'index (status, updated_at) des deux collections
+SALES_QUERY = {"status": {"$in": list(STATUS_PROGRESSION)}}
+# Vendeurs dont la note est recopiée sur leurs produits (index role)
+SELLERS_QUERY = {"role": "seller"}
+
+
+def popularity_score(units_sold: int, recent_units: int) -> float:
+    """Score de popularité : les ventes récentes priment sur l'historique"""
+    return round(recent_units + LIFETIME_SALES_WEIGHT * units_sold, 3)
+
+
+def initial_rank_keys(seller: Optional[dict]) -> dict:
+    """Clés de tri d'un produit qui vient d'être créé"""
+    return {
+        "seller_rating": (seller or {}).get("average_rating") or 0.0,
+        "units_sold": 0,
+        "popularity_score": 0.0,
+    }
+
+
+async def _sales_by_product(db, since: datetime) -> Dict[str, Tuple[int, int]]:
+    """Unités vendues par produit : (total, depuis `since`), commandes archivées comprises"""
+    pipeline = [
+        {"$match": SALES_QUERY},
+        {"$unwind": "$items"},
+        {"$group": {
+            "_id": "$items.product_id",
+            "units_sold": {"$sum": "$items.quantity"},
+            "recent_units": {"$sum": {
+                "$cond": [{"$gte": ["$created_at", since]}, "$items.quantity", 0]
+            }},
+        }},
+    ]
+    sales = {}
+    for collection in (db.orders, db[ARCHIVE_COLLECTION]):
+        async for row in collection.aggregate(pipeline):
+            units_sold, recent_units = sales.get(str(row["_id"]), (0, 0))
+            sales[str(row["_id"])] = (units_sold + row["units_sold"], recent_units + row["recent_units"])
+    return sales
+
+
+async def refresh_rank_keys(db) -> dict:
+    """
+    Recalcule les clés de tri de tous les produits
+
+    Seuls les produits dont une clé a changé sont réécrits, avec
+    `rank_updated_at` (l'autocomplétion, pondérée par les ventes, suit ce
+    champ) ; `updated_at` n'est pas modifié.
+
+    Returns:
+        dict: {"products": nombre lu, "updated": nombre réécrit}
+    """
+    since = datetime.utcnow() - timedelta(days=POPULARITY_WINDOW_DAYS)
+    sales = await _sales_by_product(db, since)
+
+    ratings = {}
+    async for seller in db.users.find(SELLERS_QUERY, {"average_rating": 1}):
+        ratings[str(seller["_id"])] = seller.get("average_rating") or 0.0
+
+    scanned = updated = 0
+    operations = []
+    changed_ids = []
+    projection = {"seller_id": 1, "seller_rating": 1, "units_sold": 1, "popularity_score": 1}
+    async for product in db.products.find({}, projection):
+        scanned += 1
+        product_id = str(product["_id"])
+        units_sold, recent_units = sales.get(product_id, (0, 0))
+        keys = {
+            "seller_rating": ratings.get(product.get("seller_id"), 0.0),
+            "units_sold": units_sold,
+            "popularity_score": popularity_score(units_sold, recent_units),
+        }
+        if all(product.get(field) == value for field, value in keys.items()):
+            continue
+
+        operations.append(UpdateOne(
+            {"_id": product["_id"]},
+            {"$set": {**keys, "rank_updated_at": datetime.utcnow()}}
+        ))
+        changed_ids.append(product_id)
+        if len(operations) >= RANK_WRITE_BATCH_SIZE:
+            await db.products.bulk_write(operations, ordered=False)
+            updated += len(operations)
+            operations = []
+
+    if operations:
+        await db.products.bulk_write(operations, ordered=False)
+        updated += len(operations)
+
+    for product_id in changed_ids:
+        product_cache.invalidate(product_id)
+
+    return {"products": scanned, "updated": updated}
+
+
+async def run_rank_keys_loop(db, interval_seconds: float):
+    """Tâche de fond : recalcule les clés de tri au démarrage puis à intervalle régulier"""
+    while True:
+        try:
+            stats = await refresh_rank_keys(db)
+            if stats["updated"]:
+                print(f"✅ Clés de tri recalculées: {stats['updated']}/{stats['products']} produits")
+        except Exception as e:
+            print(f"❌ Erreur recalcul des clés de tri: {e}")
+        await asyncio.sleep(interval_seconds)
@@ -0,0 +1,102 @@
+"""
+Réservations de stock temporaires (articles retenus dans les paniers).
+
+Ajouter un produit au panier pose une réservation (`stock_holds`) qui expire
+après CART_HOLD_TTL_SECONDS ; chaque modification de la ligne la prolonge. Le
+stock disponible pour un acheteur est le stock moins les réservations
+actives des autres paniers : lors d'une vente flash, les acheteurs sont
+refusés à l'ajout au panier plutôt qu'au paiement.
+
+Un index TTL supprime les réservations expirées ; comme sa purge passe
+environ toutes les 60 s, les lectures filtrent aussi sur `expires_at`.
+Le paiement convertit les réservations de l'acheteur en décrément du stock
+(voir checkout_service) ; les réservations des autres paniers y sont
+relues dans la transaction et exclues du stock vendable.
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional
+
+from pymongo import ReturnDocument
+
+from app.config.settings import settings
+
+
+async def held_quantities(
+    db,
+    product_ids: Iterable[str],
+    exclude_user: Optional[str] = None,
+    session=None,
+) -> Dict[str, int]:
+    """Quantités réservées (réservations actives) par produit"""
+    match = {
+        "product_id": {"$in": list(product_ids)},
+        "expires_at": {"$gt": datetime.utcnow()},
+    }
+    if exclude_user is not None:
+        match["user_id"] = {"$ne": exclude_user}
+    pipeline = [
+        {"$match": match},
+        {"$group": {"_id": "$product_id", "quantity": {"$sum": "$quantity"}}},
+    ]
+    return {row["_id"]: row["quantity"] async for row in db.stock_holds.aggregate(pipeline, session=session)}
+
+
+async def available_stock(db, products: Iterable[dict], user_id: str) -> Dict[str, int]:
+    """Stock disponible pour un acheteur : stock moins les réservations des autres"""
+    products = list(products)
+    held = await held_quantities(db, (str(p["_id"]) for p in products), exclude_user=user_id)
+    return {
+        str(p["_id"]): max(0, p.get("stock_quantity", 0) - held.get(str(p["_id"]), 0))
+        for p in products
+    }
+
+
+async def place_hold(db, user_id: str, product: dict, quantity: int) -> bool:
+    """
+    Réserve `quantity` unités d'un produit pour un acheteur (remplace sa réservation)
+
+    La réservation est posée puis vérifiée : si le total réservé dépasse le
+    stock (ajouts simultanés), la réservation précédente est restaurée.
+
+    Returns:
+        bool: False si le stock disponible est insuffisant
+    """
+    product_id = str(product["_id"])
+    now = datetime.utcnow()
+    previous = await db.stock_holds.find_one_and_update(
+        {"product_id": product_id, "user_id": user_id},
+        {"$set": {
+            "quantity": quantity,
+            "expires_at": now + timedelta(seconds=settings.CART_HOLD_TTL_SECONDS),
+        }},
+        upsert=True,
+        return_document=ReturnDocument.BEFORE,
+    )
+
+    previous_active = previous is not None and previous["expires_at"] > now
+    if previous_active and quantity <= previous["quantity"]:
+        # Une réduction de quantité est toujours acceptée
+        return True
+
+    held = await held_quantities(db, [product_id])
+    if held.get(product_id, 0) <= product.get("stock_quantity", 0):
+        return True
+
+    # Dépassement : restaurer l'état antérieur de la réservation
+    if previous_active:
+        await db.stock_holds.update_one(
+            {"_id": previous["_id"]},
+            {"$set": {"quantity": previous["quantity"], "expires_at": previous["expires_at"]}},
+        )
+    else:
+        await db.stock_holds.delete_one({"product_id": product_id, "user_id": user_id})
+    return False
+
+
+async def release_holds(db, user_id: str, product_ids: Optional[Iterable[str]] = None, session=None):
+    """Libère les réservations d'un acheteur (toutes, ou celles des produits donnés)"""
+    query = {"user_id": user_id}
+    if product_ids is not None:
+        query["product_id"] = {"$in": list(product_ids)}
+    await db.stock_holds.delete_many(query, session=session)
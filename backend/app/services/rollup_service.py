@@ -0,0 +1,289 @@
+"""
+Agrégats de ventes pré-calculés par vendeur et par produit (rollups).
+
+Chaque événement de commande est replié en incréments sur des compteurs
+par période, pour chaque vendeur (`seller_sales_rollups`) et chaque produit
+(`product_sales_rollups`) :
+
+- `created` : chiffre d'affaires, unités et nombre de commandes
+- `cancelled` / `reinstated` : annulation (ou retour d'une commande annulée)
+
+Les compteurs existent à trois granularités : jour, mois et total. Une
+requête sur une plage de dates lit les mois entiers de la plage et les
+jours des mois incomplets, soit au plus ~62 documents plus un par mois,
+quelle que soit l'activité du vendeur. Les montants annulés sont comptés à
+part ; les valeurs nettes sont calculées à la lecture.
+
+Les événements sont publiés dans l'outbox (job_queue) et repliés par le
+gestionnaire `rollup_order` (order_jobs). Chaque événement porte un
+identifiant : un marqueur dans `rollup_events`, écrit dans la même
+transaction que les incréments, empêche qu'une tâche rejouée compte deux
+fois. Sans transactions (serveur autonome), le marqueur est écrit d'abord :
+un arrêt entre les deux écritures perd l'événement, que
+rebuild_sales_rollups.py permet de rattraper. Les jours sont en UTC.
+"""
+
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+from app.services.checkout_service import TRANSACTIONS_UNSUPPORTED_CODES
+from app.services.job_queue import enqueue
+from app.services.seller_orders import seller_lines
+
+GRANULARITIES = ("day", "month", "all")
+METRICS = ("revenue", "units", "orders", "cancelled_orders", "cancelled_units", "cancelled_revenue")
+
+# Période unique des compteurs "total"
+ALL_TIME = datetime(1970, 1, 1)
+
+# Plage maximale d'une requête (jours)
+MAX_RANGE_DAYS = 5 * 366
+
+# Détecté au premier événement (None : pas encore testé)
+_transactions_supported: Optional[bool] = None
+
+
+def period_start(granularity: str, moment: datetime) -> datetime:
+    """Début de la période contenant `moment`"""
+    if granularity == "day":
+        return datetime(moment.year, moment.month, moment.day)
+    if granularity == "month":
+        return datetime(moment.year, moment.month, 1)
+    return ALL_TIME
+
+
+def bucket_id(owner_id: str, granularity: str, period: datetime) -> str:
+    return f"{owner_id}:{granularity}:{period:%Y-%m-%d}"
+
+
+def _next_month(day: date) -> date:
+    return date(day.year + day.month // 12, day.month % 12 + 1, 1)
+
+
+def plan_range(start: date, end: date) -> List[Tuple[str, datetime]]:
+    """
+    Découpe une plage de jours (bornes incluses) en mois entiers et jours isolés
+
+    Returns:
+        list: (granularité, début de période) à lire
+    """
+    buckets = []
+    current = start
+    while current <= end:
+        following_month = _next_month(current)
+        if current.day == 1 and following_month - timedelta(days=1) <= end:
+            buckets.append(("month", datetime(current.year, current.month, 1)))
+            current = following_month
+        else:
+            buckets.append(("day", datetime(current.year, current.month, current.day)))
+            current += timedelta(days=1)
+    return buckets
+
+
+def _line_deltas(line: dict, event: str) -> Tuple[Dict[str, float], Dict[str, Dict[str, float]]]:
+    """Incréments (vendeur, par produit) d'un événement sur les lignes d'un vendeur"""
+    items = line["seller_items"]
+    units = sum(item.get("quantity", 0) for item in items)
+    products: Dict[str, Dict[str, float]] = {}
+
+    if event == "created":
+        seller = {"revenue": line["seller_total"], "units": units, "orders": 1}
+        for item in items:
+            delta = products.setdefault(item["product_id"], {"revenue": 0, "units": 0, "orders": 1})
+            delta["revenue"] += item.get("total", 0)
+            delta["units"] += item.get("quantity", 0)
+        return seller, products
+
+    sign = 1 if event == "cancelled" else -1
+    seller = {
+        "cancelled_orders": sign,
+        "cancelled_units": sign * units,
+        "cancelled_revenue": sign * line["seller_total"],
+    }
+    for item in items:
+        delta = products.setdefault(item["product_id"], {"cancelled_orders": sign, "cancelled_units": 0, "cancelled_revenue": 0})
+        delta["cancelled_units"] += sign * item.get("quantity", 0)
+        delta["cancelled_revenue"] += sign * item.get("total", 0)
+    return seller, products
+
+
+def rollup_operations(order: dict, event: str) -> Tuple[List[UpdateOne], List[UpdateOne]]:
+    """Upserts des compteurs vendeurs et produits pour un événement de commande"""
+    created_at = order["created_at"]
+    names = {item["product_id"]: item.get("product_name") for item in order.get("items", [])}
+    seller_ops, product_ops = [], []
+
+    for line in seller_lines(order, str(order["_id"])):
+        seller_delta, product_deltas = _line_deltas(line, event)
+        for granularity in GRANULARITIES:
+            period = period_start(granularity, created_at)
+            seller_ops.append(UpdateOne(
+                {"_id": bucket_id(line["seller_id"], granularity, period)},
+                {
+                    "$inc": seller_delta,
+                    "$setOnInsert": {"seller_id": line["seller_id"], "granularity": granularity, "period": period},
+                },
+                upsert=True,
+            ))
+            for product_id, delta in product_deltas.items():
+                update = {
+                    "$inc": delta,
+                    "$setOnInsert": {
+                        "product_id": product_id,
+                        "seller_id": line["seller_id"],
+                        "granularity": granularity,
+                        "period": period,
+                    },
+                }
+                if names.get(product_id):
+                    # Nom de l'instantané de la ligne (affichage des meilleures ventes)
+                    update["$set"] = {"product_name": names[product_id]}
+                product_ops.append(UpdateOne(
+                    {"_id": bucket_id(product_id, granularity, period)}, update, upsert=True
+                ))
+    return seller_ops, product_ops
+
+
+async def _write(db, seller_ops: List[UpdateOne], product_ops: List[UpdateOne], session=None):
+    if seller_ops:
+        await db.seller_sales_rollups.bulk_write(seller_ops, ordered=False, session=session)
+    if product_ops:
+        await db.product_sales_rollups.bulk_write(product_ops, ordered=False, session=session)
+
+
+async def apply_order_event(db, order_id: str, event: str, event_id: str) -> bool:
+    """
+    Replie un événement de commande dans les compteurs (une seule fois par `event_id`)
+
+    Returns:
+        bool: False si l'événement avait déjà été replié ou si la commande n'existe pas
+    """
+    global _transactions_supported
+
+    order = await db.orders.find_one({"_id": ObjectId(order_id)}, {"items": 1, "created_at": 1})
+    if order is None:
+        return False
+    seller_ops, product_ops = rollup_operations(order, event)
+    marker = {"_id": event_id, "order_id": order_id, "event": event, "applied_at": datetime.utcnow()}
+
+    if _transactions_supported is not False:
+        async def callback(session):
+            await db.rollup_events.insert_one(marker, session=session)
+            await _write(db, seller_ops, product_ops, session=session)
+
+        try:
+            async with await db.client.start_session() as session:
+                await session.with_transaction(callback)
+            _transactions_supported = True
+            return True
+        except DuplicateKeyError:
+            return False
+        except OperationFailure as e:
+            if e.code not in TRANSACTIONS_UNSUPPORTED_CODES:
+                raise
+            _transactions_supported = False
+
+    # Sans transaction : au plus une fois (marqueur d'abord)
+    try:
+        await db.rollup_events.insert_one(marker)
+    except DuplicateKeyError:
+        return False
+    await _write(db, seller_ops, product_ops)
+    return True
+
+
+def order_event_job(order_id: str, event: str, event_id: Optional[str] = None) -> Tuple[str, dict, str]:
+    """Tâche `rollup_order` d'un événement de commande : (type, payload, clé de déduplication)"""
+    event_id = event_id or f"{event}:{order_id}:{ObjectId()}"
+    return (
+        "rollup_order",
+        {"order_id": order_id, "event": event, "event_id": event_id},
+        f"rollup_order:{event_id}",
+    )
+
+
+def status_change_event(previous_status: Optional[str], new_status: str) -> Optional[str]:
+    """Événement à replier quand le statut franchit `cancelled` (None sinon)"""
+    was_cancelled = previous_status == "cancelled"
+    if was_cancelled == (new_status == "cancelled"):
+        return None
+    return "reinstated" if was_cancelled else "cancelled"
+
+
+async def publish_order_event(db, order_id: str, event: str, event_id: Optional[str] = None, session=None):
+    """Publie un événement de commande à replier (tâche `rollup_order`)"""
+    job_type, payload, dedupe_key = order_event_job(order_id, event, event_id)
+    await enqueue(db, job_type, payload, dedupe_key=dedupe_key, session=session)
+
+
+def _sum(documents: Iterable[dict]) -> Dict[str, float]:
+    totals = {metric: 0 for metric in METRICS}
+    for document in documents:
+        for metric in METRICS:
+            totals[metric] += document.get(metric, 0)
+    return totals
+
+
+def with_net(totals: Dict[str, float]) -> Dict[str, float]:
+    """Ajoute les valeurs nettes des annulations"""
+    return {
+        **totals,
+        "net_revenue": round(totals["revenue"] - totals["cancelled_revenue"], 2),
+        "net_units": totals["units"] - totals["cancelled_units"],
+        "net_orders": totals["orders"] - totals["cancelled_orders"],
+    }
+
+
+async def seller_totals(db, seller_id: str, start: Optional[date] = None, end: Optional[date] = None) -> Dict[str, float]:
+    """Totaux d'un vendeur sur une plage de jours (bornes incluses), ou depuis toujours"""
+    if start is None or end is None:
+        ids = [bucket_id(seller_id, "all", ALL_TIME)]
+    else:
+        ids = [bucket_id(seller_id, granularity, period) for granularity, period in plan_range(start, end)]
+    documents = await db.seller_sales_rollups.find({"_id": {"$in": ids}}).to_list(None)
+    return with_net(_sum(documents))
+
+
+async def top_products(db, seller_id: str, start: date, end: date, limit: int = 5) -> List[dict]:
+    """
+    Produits du vendeur les plus vendus (unités nettes) sur une plage de jours
+
+    Les compteurs de la plage (mois entiers et jours isolés de `plan_range`,
+    match servi par l'index seller_id/granularity/period) sont sommés et
+    classés par MongoDB : seules les `limit` lignes sont renvoyées.
+    """
+    buckets = plan_range(start, end)
+    query = {
+        "seller_id": seller_id,
+        "$or": [
+            {"granularity": granularity, "period": {"$in": [period for g, period in buckets if g == granularity]}}
+            for granularity in ("day", "month")
+            if any(g == granularity for g, _ in buckets)
+        ],
+    }
+    pipeline = [
+        {"$match": query},
+        {"$group": {
+            "_id": "$product_id",
+            "product_name": {"$last": "$product_name"},
+            **{metric: {"$sum": f"${metric}"} for metric in METRICS},
+        }},
+        {"$addFields": {
+            "net_units": {"$subtract": ["$units", "$cancelled_units"]},
+            "net_revenue": {"$subtract": ["$revenue", "$cancelled_revenue"]},
+        }},
+        {"$sort": {"net_units": -1, "net_revenue": -1, "_id": 1}},
+        {"$limit": limit},
+    ]
+    return [
+        {
+            "product_id": row["_id"],
+            "product_name": row.get("product_name"),
+            **with_net({metric: row[metric] for metric in METRICS}),
+        }
+        async for row in db.product_sales_rollups.aggregate(pipeline)
+    ]
@@ -0,0 +1,248 @@
+"""
+Moteur de recherche produits en mémoire (index inversé + classement BM25).
+
+Remplace la recherche `$regex` sur `name`, qui ne peut pas utiliser d'index
+et parcourt tous les produits publiés à chaque frappe. L'index couvre
+`name`, `description` et `category` des produits publiés ; sa construction
+et sa synchronisation sont héritées de `CatalogIndex`.
+"""
+
+import heapq
+import math
+import re
+import unicodedata
+from bisect import bisect_left, insort
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+from app.services.catalog_index import CatalogIndex
+
+# Paramètres BM25
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Poids de chaque champ dans le score (BM25F simplifié)
+FIELD_WEIGHTS = {"name": 3.0, "category": 1.5, "description": 1.0}
+
+# Nombre maximal de termes du vocabulaire développés pour un préfixe
+MAX_PREFIX_EXPANSION = 50
+
+# Mots vides français ignorés à l'indexation et à la recherche
+STOP_WORDS = {
+    "a", "au", "aux", "avec", "ce", "ces", "d", "dans", "de", "des", "du",
+    "en", "et", "l", "la", "le", "les", "ou", "par", "pour", "sur", "un", "une",
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def fold_accents(text: str) -> str:
+    """Supprime les accents et passe en minuscules ("Été" -> "ete")"""
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def _stem(token: str) -> str:
+    """Racinisation légère : retire la marque du pluriel"""
+    if len(token) > 3 and token[-1] in ("s", "x"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Découpe un texte français en termes normalisés"""
+    if not text:
+        return []
+    return [
+        _stem(token)
+        for token in _TOKEN_RE.findall(fold_accents(str(text)))
+        if token not in STOP_WORDS
+    ]
+
+
+def _in_range(price, price_range: Tuple[float, Optional[float]]) -> bool:
+    """Vérifie que `price` appartient à [min, max["""
+    lower, upper = price_range
+    return price is not None and price >= lower and (upper is None or price < upper)
+
+
+class ProductSearchIndex(CatalogIndex):
+    """Index inversé des produits publiés avec classement BM25"""
+
+    label = "de recherche"
+
+    def _reset(self):
+        # terme -> {product_id: fréquence pondérée}
+        self.postings: Dict[str, Dict[str, float]] = defaultdict(dict)
+        # product_id -> longueur pondérée du document
+        self.doc_lengths: Dict[str, float] = {}
+        # product_id -> termes du document (pour la suppression)
+        self.doc_terms: Dict[str, Set[str]] = {}
+        # product_id -> attributs filtrables (category, shop_id, price)
+        self.doc_meta: Dict[str, dict] = {}
+        # Vocabulaire trié pour la recherche par préfixe
+        self.vocabulary: List[str] = []
+        self.total_length = 0.0
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def stats(self) -> dict:
+        return {"documents": len(self.doc_lengths), "terms": len(self.vocabulary)}
+
+    # ---------- Mise à jour ----------
+
+    def upsert(self, product: dict):
+        """Indexe (ou réindexe) un produit ; un produit non publié est retiré"""
+        product_id = str(product.get("_id") or product.get("id"))
+        self.remove(product_id)
+        if product.get("status") != "published":
+            return
+
+        frequencies: Dict[str, float] = defaultdict(float)
+        length = 0.0
+        for field, weight in FIELD_WEIGHTS.items():
+            value = product.get(field)
+            if hasattr(value, "value"):
+                value = value.value
+            for term in tokenize(value):
+                frequencies[term] += weight
+                length += weight
+
+        for term, frequency in frequencies.items():
+            if term not in self.postings:
+                insort(self.vocabulary, term)
+            self.postings[term][product_id] = frequency
+
+        category = product.get("category")
+        self.doc_lengths[product_id] = length
+        self.doc_terms[product_id] = set(frequencies)
+        self.doc_meta[product_id] = {
+            "category": category.value if hasattr(category, "value") else category,
+            "shop_id": product.get("shop_id"),
+            "price": product.get("price"),
+        }
+        self.total_length += length
+
+    def remove(self, product_id: str):
+        """Retire un produit de l'index"""
+        product_id = str(product_id)
+        terms = self.doc_terms.pop(product_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self.postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(product_id, None)
+            if not postings:
+                del self.postings[term]
+                position = bisect_left(self.vocabulary, term)
+                if position < len(self.vocabulary) and self.vocabulary[position] == term:
+                    self.vocabulary.pop(position)
+        self.total_length -= self.doc_lengths.pop(product_id, 0.0)
+        self.doc_meta.pop(product_id, None)
+
+    # ---------- Recherche ----------
+
+    def _expand_prefix(self, prefix: str) -> List[str]:
+        """Termes du vocabulaire commençant par `prefix`"""
+        start = bisect_left(self.vocabulary, prefix)
+        terms = []
+        for term in self.vocabulary[start:start + MAX_PREFIX_EXPANSION]:
+            if not term.startswith(prefix):
+                break
+            terms.append(term)
+        return terms
+
+    def _idf(self, term: str) -> float:
+        document_frequency = len(self.postings.get(term, ()))
+        total = len(self.doc_lengths)
+        return math.log(1 + (total - document_frequency + 0.5) / (document_frequency + 0.5))
+
+    def search(
+        self,
+        query: str,
+        category: Optional[str] = None,
+        shop_id: Optional[str] = None,
+        price_range: Optional[Tuple[float, Optional[float]]] = None,
+        top_k: Optional[int] = None,
+    ) -> List[Tuple[str, float]]:
+        """
+        Recherche les produits correspondant à tous les termes de la requête.
+
+        Le dernier terme est traité comme un préfixe (saisie en cours).
+        Avec `top_k`, seuls les k meilleurs résultats sont triés et renvoyés.
+
+        Returns:
+            Liste de (product_id, score) triée par pertinence décroissante
+        """
+        raw_tokens = _TOKEN_RE.findall(fold_accents(query or ""))
+        tokens = [t for t in raw_tokens if t not in STOP_WORDS]
+        if not tokens or not self.doc_lengths:
+            return []
+
+        average_length = self.total_length / len(self.doc_lengths) or 1.0
+
+        # Un groupe de termes par mot de la requête (le dernier est un préfixe)
+        groups = []
+        for position, token in enumerate(tokens):
+            terms = {_stem(token)}
+            if position == len(tokens) - 1:
+                terms.update(self._expand_prefix(token))
+            terms = [t for t in terms if t in self.postings]
+            if not terms:
+                return []
+            groups.append(terms)
+
+        # Les groupes les plus sélectifs d'abord : les suivants ne sont évalués
+        # que sur les candidats restants (ET logique)
+        groups.sort(key=lambda terms: sum(len(self.postings[t]) for t in terms))
+
+        scores: Optional[Dict[str, float]] = None
+        for terms in groups:
+            weighted = [(self.postings[t], self._idf(t)) for t in terms]
+            if scores is None:
+                candidates = set()
+                for postings, _ in weighted:
+                    candidates.update(postings)
+            else:
+                candidates = scores
+
+            group_scores: Dict[str, float] = {}
+            for product_id in candidates:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[product_id] / average_length)
+                score = 0.0
+                for postings, idf in weighted:
+                    frequency = postings.get(product_id)
+                    if frequency:
+                        score += idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+                if score:
+                    group_scores[product_id] = score + (scores[product_id] if scores else 0.0)
+
+            scores = group_scores
+            if not scores:
+                return []
+
+        results = []
+        for product_id, score in scores.items():
+            meta = self.doc_meta[product_id]
+            if category and meta["category"] != category:
+                continue
+            if shop_id and meta["shop_id"] != shop_id:
+                continue
+            if price_range and not _in_range(meta["price"], price_range):
+                continue
+            results.append((product_id, score))
+
+        def rank(item):
+            return (-item[1], item[0])
+
+        if top_k is not None and top_k < len(results):
+            return heapq.nsmallest(top_k, results, key=rank)
+        results.sort(key=rank)
+        return results
+
+
+# Instance partagée par l'application
+product_search_index = ProductSearchIndex()
@@ -0,0 +1,90 @@
+"""
+Vue matérialisée des commandes par vendeur (`seller_order_lines`).
+
+Une commande peut regrouper les articles de plusieurs vendeurs. Plutôt que
+de relire les commandes entières sur l'index multiclé `items.seller_id` et
+de filtrer les lignes en Python, le paiement écrit, dans la même
+transaction que la commande, un document par couple (commande, vendeur) :
+lignes du vendeur, sous-total, statut et informations de livraison.
+
+GET /seller/orders devient un parcours de plage sur
+(seller_id, created_at, _id). Toute modification du statut d'une commande
+doit être répercutée par `set_order_status`.
+
+Les commandes antérieures sont projetées par `project_orders`
+(voir backfill_seller_order_lines.py) ; la projection est idempotente.
+"""
+
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from pymongo import UpdateOne
+
+# Champs de la commande recopiés sur chaque document vendeur
+ORDER_FIELDS = ("user_id", "status", "payment_status", "delivery_method", "shipping_address", "created_at")
+
+
+def seller_lines(order: dict, order_id: str) -> List[dict]:
+    """Documents vendeurs d'une commande : un par vendeur présent dans ses lignes"""
+    items_by_seller: Dict[str, List[dict]] = {}
+    for item in order.get("items", []):
+        items_by_seller.setdefault(item.get("seller_id"), []).append(item)
+
+    now = datetime.utcnow()
+    return [
+        {
+            "order_id": order_id,
+            "seller_id": seller_id,
+            **{field: order.get(field) for field in ORDER_FIELDS},
+            "seller_items": items,
+            "seller_total": sum(item.get("total", 0) for item in items),
+            "updated_at": order.get("updated_at") or now,
+        }
+        for seller_id, items in items_by_seller.items()
+        if seller_id
+    ]
+
+
+async def write_seller_lines(db, order: dict, order_id: str, session=None):
+    """Écrit les documents vendeurs d'une commande qui vient d'être créée"""
+    lines = seller_lines(order, order_id)
+    if lines:
+        await db.seller_order_lines.insert_many(lines, ordered=True, session=session)
+
+
+async def set_order_status(db, order_ids: List[str], status: str, now: Optional[datetime] = None, session=None):
+    """Répercute un nouveau statut de commande sur les documents vendeurs"""
+    await db.seller_order_lines.update_many(
+        {"order_id": {"$in": list(order_ids)}},
+        {"$set": {"status": status, "updated_at": now or datetime.utcnow()}},
+        session=session,
+    )
+
+
+async def project_orders(db, orders: List[dict]) -> int:
+    """
+    Projette des commandes existantes (upsert par couple commande/vendeur)
+
+    Returns:
+        int: Nombre de documents vendeurs créés ou mis à jour
+    """
+    operations = []
+    for order in orders:
+        for line in seller_lines(order, str(order["_id"])):
+            operations.append(UpdateOne(
+                {"order_id": line["order_id"], "seller_id": line["seller_id"]},
+                {"$set": line},
+                upsert=True,
+            ))
+    if not operations:
+        return 0
+    result = await db.seller_order_lines.bulk_write(operations, ordered=False)
+    return result.upserted_count + result.modified_count
+
+
+def format_seller_order(line: dict) -> dict:
+    """Document vendeur au format de la réponse (`id` : identifiant de la commande)"""
+    line = dict(line)
+    line.pop("_id", None)
+    line["id"] = line["order_id"]
+    return line
@@ -0,0 +1,418 @@
+"""
+Compteurs de stock répartis pour les produits "chauds" (ventes flash).
+
+Pendant une vente flash, chaque paiement décrémente `stock_quantity` sur le
+même document `products` : les écritures se sérialisent sur ce document et
+les transactions concurrentes entrent en conflit. En mode "hot SKU" (activé
+par un administrateur), le stock d'un produit est réparti entre
+`stock_shards` compteurs de la collection `stock_shards` :
+
+- un décrément vise un compteur tiré au hasard (une mise à jour
+  conditionnelle, comme pour un produit ordinaire) ;
+- si ce compteur ne suffit pas, la quantité est prélevée sur les compteurs
+  les mieux pourvus, et le produit est marqué pour rééquilibrage ;
+- une tâche de fond rééquilibre les compteurs marqués ou vides et recopie
+  la somme des compteurs dans `products.stock_quantity` (vue des listes et
+  de la recherche).
+
+La somme des compteurs fait foi : la fiche produit, le panier et le
+paiement la relisent (`with_live_stock`). `units_sold` n'est pas incrémenté
+sur le produit pour ne pas recréer la contention : les clés de tri le
+recalculent depuis les commandes (ranking_service).
+
+Pendant l'activation ou la désactivation, les paiements du produit sont
+refusés (stock insuffisant) le temps du transfert. Le transfert s'exécute
+dans une transaction ; sur un serveur autonome, ses étapes sont ordonnées
+pour qu'une interruption ne laisse jamais un produit marqué réparti sans
+ses compteurs (voir `enable` et `disable`).
+"""
+
+import asyncio
+import random
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from bson import ObjectId
+from pymongo import DeleteMany, UpdateOne
+from pymongo.errors import OperationFailure
+
+from app.services.product_cache import product_cache
+
+# Champ du produit portant le nombre de compteurs (absent : stock ordinaire)
+SHARDS_FIELD = "stock_shards"
+# Unités déjà rapatriées par une désactivation sans transaction interrompue
+DRAINED_FIELD = "stock_shards_drained"
+MAX_SHARDS = 64
+
+# Tentatives d'activation sans transaction face aux ventes concurrentes
+ENABLE_ATTEMPTS = 5
+
+# Détecté à la première activation (None : pas encore testé)
+_transactions_supported: Optional[bool] = None
+
+# Produits dont un décrément n'a pas trouvé son compteur suffisant
+_dry_products = set()
+
+
+def shard_count(product: dict) -> int:
+    """Nombre de compteurs du produit (0 : stock porté par le document produit)"""
+    return product.get(SHARDS_FIELD) or 0
+
+
+def split_quantity(quantity: int, shards: int) -> List[int]:
+    """Répartit une quantité aussi également que possible"""
+    base, extra = divmod(quantity, shards)
+    return [base + (1 if i < extra else 0) for i in range(shards)]
+
+
+async def live_stock(db, product_ids: Iterable[str], session=None) -> Dict[str, int]:
+    """Stock réel (somme des compteurs) des produits en mode réparti"""
+    pipeline = [
+        {"$match": {"product_id": {"$in": list(product_ids)}}},
+        {"$group": {"_id": "$product_id", "quantity": {"$sum": "$quantity"}}},
+    ]
+    return {
+        row["_id"]: row["quantity"]
+        async for row in db.stock_shards.aggregate(pipeline, session=session)
+    }
+
+
+async def with_live_stock(db, products: Iterable[dict]) -> None:
+    """Remplace `stock_quantity` par la somme des compteurs pour les produits répartis"""
+    sharded = [p for p in products if p and shard_count(p)]
+    if not sharded:
+        return
+    stocks = await live_stock(db, (str(p["_id"]) for p in sharded))
+    for product in sharded:
+        product["stock_quantity"] = stocks.get(str(product["_id"]), 0)
+
+
+async def take_stock(db, product_id: str, quantity: int, shards: int, session=None) -> bool:
+    """
+    Décrémente `quantity` unités d'un produit réparti
+
+    Returns:
+        bool: False si la somme des compteurs ne couvre pas la quantité
+            (aucun compteur n'est alors modifié)
+    """
+    now = datetime.utcnow()
+    result = await db.stock_shards.update_one(
+        {"product_id": product_id, "shard": random.randrange(shards), "quantity": {"$gte": quantity}},
+        {"$inc": {"quantity": -quantity}, "$set": {"updated_at": now}},
+        session=session,
+    )
+    if result.matched_count:
+        return True
+
+    # Compteur tiré insuffisant : prélever sur les mieux pourvus
+    _dry_products.add(product_id)
+    rows = await db.stock_shards.find(
+        {"product_id": product_id, "quantity": {"$gt": 0}},
+        {"shard": 1, "quantity": 1},
+        session=session,
+    ).sort("quantity", -1).to_list(None)
+
+    taken = []
+    remaining = quantity
+    for row in rows:
+        part = min(row["quantity"], remaining)
+        result = await db.stock_shards.update_one(
+            {"product_id": product_id, "shard": row["shard"], "quantity": {"$gte": part}},
+            {"$inc": {"quantity": -part}, "$set": {"updated_at": now}},
+            session=session,
+        )
+        if result.matched_count:
+            taken.append((row["shard"], part))
+            remaining -= part
+            if remaining == 0:
+                return True
+
+    for shard, part in taken:
+        await give_stock(db, product_id, part, shards, shard=shard, session=session)
+    return False
+
+
+async def give_stock(db, product_id: str, quantity: int, shards: int, shard: Optional[int] = None, session=None):
+    """Rend `quantity` unités à un compteur (tiré au hasard si non précisé)"""
+    await db.stock_shards.update_one(
+        {"product_id": product_id, "shard": random.randrange(shards) if shard is None else shard},
+        {"$inc": {"quantity": quantity}, "$set": {"updated_at": datetime.utcnow()}},
+        session=session,
+    )
+
+
+async def set_stock(db, product_id: str, quantity: int, shards: int) -> int:
+    """
+    Fixe le stock d'un produit réparti (réassort par le vendeur)
+
+    L'écart avec la somme actuelle est appliqué par incréments : les ventes
+    concurrentes ne sont pas écrasées.
+
+    Returns:
+        int: Stock réel après ajustement
+    """
+    for _ in range(3):
+        current = (await live_stock(db, [product_id])).get(product_id, 0)
+        delta = quantity - current
+        if delta == 0:
+            return current
+        if delta > 0:
+            for shard, part in enumerate(split_quantity(delta, shards)):
+                if part:
+                    await give_stock(db, product_id, part, shards, shard=shard)
+            return quantity
+        if await take_stock(db, product_id, -delta, shards):
+            return quantity
+        # Ventes concurrentes : recalculer l'écart
+    return (await live_stock(db, [product_id])).get(product_id, 0)
+
+
+async def _in_transaction(db, callback):
+    """
+    Exécute `callback(session)` dans une transaction
+
+    Returns:
+        (True, résultat), ou (False, None) si le serveur ne supporte pas
+        les transactions
+    """
+    global _transactions_supported
+    # Import local : checkout_service importe ce module
+    from app.services.checkout_service import TRANSACTIONS_UNSUPPORTED_CODES
+
+    if _transactions_supported is False:
+        return False, None
+    try:
+        async with await db.client.start_session() as session:
+            result = await session.with_transaction(callback)
+        _transactions_supported = True
+        return True, result
+    except OperationFailure as e:
+        if e.code not in TRANSACTIONS_UNSUPPORTED_CODES:
+            raise
+        _transactions_supported = False
+        return False, None
+
+
+def _counter_writes(product_id: str, stock: int, shards: int, now: datetime) -> list:
+    """Compteurs d'une activation (remplacent les restes d'une activation interrompue)"""
+    return [
+        UpdateOne(
+            {"product_id": product_id, "shard": shard},
+            {"$set": {"quantity": part, "updated_at": now}},
+            upsert=True,
+        )
+        for shard, part in enumerate(split_quantity(stock, shards))
+    ] + [DeleteMany({"product_id": product_id, "shard": {"$gte": shards}})]
+
+
+async def enable(db, product_id: str, shards: int) -> Optional[int]:
+    """
+    Passe un produit en stock réparti sur `shards` compteurs
+
+    Sans transaction, les compteurs sont écrits avant le marquage du
+    produit, conditionné à un stock inchangé : une vente intercalée fait
+    recommencer l'écriture. Les compteurs d'un produit non marqué ne sont
+    jamais lus ; une activation interrompue est réécrite par la suivante.
+
+    Returns:
+        Le stock transféré, ou None si le produit n'existe pas, est déjà
+        réparti ou si son stock a changé à chaque tentative
+    """
+    async def callback(session):
+        now = datetime.utcnow()
+        product = await db.products.find_one_and_update(
+            {"_id": ObjectId(product_id), SHARDS_FIELD: {"$exists": False}},
+            {"$set": {SHARDS_FIELD: shards, "updated_at": now}},
+            projection={"stock_quantity": 1},
+            session=session,
+        )
+        if product is None:
+            return None
+        stock = product.get("stock_quantity", 0)
+        await db.stock_shards.bulk_write(_counter_writes(product_id, stock, shards, now), session=session)
+        return stock
+
+    transactional, stock = await _in_transaction(db, callback)
+    if not transactional:
+        stock = None
+        for _ in range(ENABLE_ATTEMPTS):
+            product = await db.products.find_one(
+                {"_id": ObjectId(product_id), SHARDS_FIELD: {"$exists": False}},
+                {"stock_quantity": 1},
+            )
+            if product is None:
+                break
+            now = datetime.utcnow()
+            await db.stock_shards.bulk_write(
+                _counter_writes(product_id, product.get("stock_quantity", 0), shards, now)
+            )
+            result = await db.products.update_one(
+                {
+                    "_id": product["_id"],
+                    SHARDS_FIELD: {"$exists": False},
+                    "stock_quantity": product.get("stock_quantity"),
+                },
+                {"$set": {SHARDS_FIELD: shards, "updated_at": now}},
+            )
+            if result.modified_count:
+                stock = product.get("stock_quantity", 0)
+                break
+    product_cache.invalidate(product_id)
+    return stock
+
+
+async def disable(db, product_id: str) -> Optional[int]:
+    """
+    Ramène le stock d'un produit réparti sur son document
+
+    Sans transaction, chaque compteur est vidé puis sa quantité ajoutée à
+    `stock_shards_drained` sur le produit, qui reste marqué réparti jusqu'à
+    la fin : une désactivation interrompue est reprise par la suivante sans
+    perdre les unités déjà rapatriées. Les compteurs vidés sont supprimés
+    en dernier.
+
+    Returns:
+        Le stock rapatrié, ou None si le produit n'est pas réparti
+    """
+    async def callback(session):
+        product = await db.products.find_one(
+            {"_id": ObjectId(product_id), SHARDS_FIELD: {"$exists": True}},
+            {DRAINED_FIELD: 1},
+            session=session,
+        )
+        if product is None:
+            return None
+        stocks = await live_stock(db, [product_id], session=session)
+        stock = product.get(DRAINED_FIELD, 0) + stocks.get(product_id, 0)
+        await db.stock_shards.delete_many({"product_id": product_id}, session=session)
+        await db.products.update_one(
+            {"_id": product["_id"]},
+            {"$set": {"stock_quantity": stock, "updated_at": datetime.utcnow()},
+             "$unset": {SHARDS_FIELD: "", DRAINED_FIELD: ""}},
+            session=session,
+        )
+        return stock
+
+    transactional, stock = await _in_transaction(db, callback)
+    if not transactional:
+        product = await db.products.find_one(
+            {"_id": ObjectId(product_id), SHARDS_FIELD: {"$exists": True}},
+            {SHARDS_FIELD: 1},
+        )
+        if product is None:
+            return None
+        for shard in range(shard_count(product)):
+            row = await db.stock_shards.find_one_and_update(
+                {"product_id": product_id, "shard": shard, "quantity": {"$ne": 0}},
+                {"$set": {"quantity": 0, "updated_at": datetime.utcnow()}},
+            )
+            if row and row.get("quantity"):
+                await db.products.update_one(
+                    {"_id": product["_id"]}, {"$inc": {DRAINED_FIELD: row["quantity"]}}
+                )
+        drained = await db.products.find_one({"_id": product["_id"]}, {DRAINED_FIELD: 1})
+        stock = (drained or {}).get(DRAINED_FIELD, 0)
+        await db.products.update_one(
+            {"_id": product["_id"], SHARDS_FIELD: {"$exists": True}},
+            {"$set": {"stock_quantity": stock, "updated_at": datetime.utcnow()},
+             "$unset": {SHARDS_FIELD: "", DRAINED_FIELD: ""}},
+        )
+        await db.stock_shards.delete_many({"product_id": product_id})
+    product_cache.invalidate(product_id)
+    return stock
+
+
+async def rebalance(db, product_id: str, shards: int) -> bool:
+    """
+    Égalise les compteurs d'un produit
+
+    Les unités sont retirées des compteurs excédentaires (décrément
+    conditionnel) puis ajoutées aux compteurs déficitaires : pendant le
+    transfert, le stock peut paraître brièvement inférieur, jamais supérieur.
+
+    Returns:
+        bool: True si des unités ont été déplacées
+    """
+    rows = await db.stock_shards.find({"product_id": product_id}, {"shard": 1, "quantity": 1}).to_list(None)
+    current = {row["shard"]: row["quantity"] for row in rows}
+    targets = split_quantity(sum(current.values()), shards)
+    # Les plus gros objectifs vont aux compteurs les plus pourvus : moins de déplacements
+    order = sorted(range(shards), key=lambda shard: -current.get(shard, 0))
+    target = {shard: targets[rank] for rank, shard in enumerate(order)}
+
+    moved = 0
+    for shard in order:
+        excess = current.get(shard, 0) - target[shard]
+        if excess <= 0:
+            continue
+        result = await db.stock_shards.update_one(
+            {"product_id": product_id, "shard": shard, "quantity": {"$gte": excess}},
+            {"$inc": {"quantity": -excess}},
+        )
+        if result.matched_count:
+            moved += excess
+    if not moved:
+        return False
+
+    # Redistribuer les unités retirées vers les compteurs déficitaires
+    for shard in reversed(order):
+        deficit = min(target[shard] - current.get(shard, 0), moved)
+        if deficit <= 0:
+            continue
+        await give_stock(db, product_id, deficit, shards, shard=shard)
+        moved -= deficit
+    if moved:
+        await give_stock(db, product_id, moved, shards)
+    return True
+
+
+async def refresh_hot_stock(db) -> dict:
+    """
+    Rééquilibre les compteurs et recopie le stock réel dans `products.stock_quantity`
+
+    Returns:
+        dict: {"products": produits répartis, "rebalanced": ..., "updated": vues réécrites}
+    """
+    products = await db.products.find(
+        {SHARDS_FIELD: {"$exists": True}},
+        {SHARDS_FIELD: 1, DRAINED_FIELD: 1, "stock_quantity": 1},
+    ).to_list(None)
+    if not products:
+        return {"products": 0, "rebalanced": 0, "updated": 0}
+
+    dry = set(_dry_products)
+    _dry_products.difference_update(dry)
+
+    rebalanced = updated = 0
+    for product in products:
+        product_id = str(product["_id"])
+        if product_id in dry and await rebalance(db, product_id, shard_count(product)):
+            rebalanced += 1
+
+    stocks = await live_stock(db, (str(p["_id"]) for p in products))
+    for product in products:
+        product_id = str(product["_id"])
+        # Désactivation en cours, ou aucun compteur : la vue n'est pas réécrite
+        if DRAINED_FIELD in product or product_id not in stocks:
+            continue
+        stock = stocks[product_id]
+        if product.get("stock_quantity") == stock:
+            continue
+        await db.products.update_one(
+            {"_id": product["_id"], SHARDS_FIELD: {"$exists": True}},
+            {"$set": {"stock_quantity": stock, "updated_at": datetime.utcnow()}},
+        )
+        product_cache.invalidate(product_id)
+        updated += 1
+
+    return {"products": len(products), "rebalanced": rebalanced, "updated": updated}
+
+
+async def run_hot_stock_loop(db, interval_seconds: float):
+    """Tâche de fond : maintient les compteurs répartis et la vue du stock"""
+    while True:
+        try:
+            await refresh_hot_stock(db)
+        except Exception as e:
+            print(f"❌ Erreur maintenance des stocks répartis: {e}")
+        await asyncio.sleep(interval_seconds)
@@ -0,0 +1,332 @@
+"""
+Autocomplétion de la barre de recherche (arbre de préfixes compressé).
+
+Les suggestions couvrent les noms de produits publiés, les noms de boutiques
+et les catégories. Chaque suggestion est insérée dans un arbre radix sous
+chacun de ses mots significatifs ("robe d'été" est trouvée par "rob" et par
+"et"). Chaque nœud mémorise le poids maximal de son sous-arbre, ce qui permet
+d'extraire les k meilleures suggestions par un parcours du meilleur d'abord
+sans visiter tout le sous-arbre.
+
+Poids (popularité) :
+- produit : 1 + unités vendues (`units_sold`)
+- catégorie et boutique : nombre de produits publiés rattachés
+"""
+
+import heapq
+import itertools
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from app.services.catalog_index import CATALOG_PROJECTION, CatalogIndex
+from app.services.search_service import STOP_WORDS, _TOKEN_RE, fold_accents
+
+# Nombre maximal de mots d'une suggestion servant de point d'entrée
+MAX_ENTRY_WORDS = 6
+
+# Clé d'une suggestion : (type, texte normalisé)
+SuggestionKey = Tuple[str, str]
+
+
+def normalize(text: str) -> str:
+    """Texte sans accents, en minuscules, mots séparés par un espace"""
+    return " ".join(_TOKEN_RE.findall(fold_accents(text or "")))
+
+
+def entry_keys(normalized: str) -> List[str]:
+    """Clés d'insertion : le texte à partir de chacun de ses mots significatifs"""
+    words = normalized.split(" ")
+    keys = []
+    for position, word in enumerate(words[:MAX_ENTRY_WORDS]):
+        if position == 0 or word not in STOP_WORDS:
+            keys.append(" ".join(words[position:]))
+    return keys
+
+
+class _Node:
+    """Nœud de l'arbre radix : l'arête entrante porte `label`"""
+
+    __slots__ = ("label", "children", "suggestions", "max_weight")
+
+    def __init__(self, label: str = ""):
+        self.label = label
+        self.children: Dict[str, "_Node"] = {}
+        self.suggestions: Set[SuggestionKey] = set()
+        self.max_weight = 0.0
+
+
+class _Suggestion:
+    __slots__ = ("text", "type", "refs", "keys")
+
+    def __init__(self, text: str, suggestion_type: str):
+        self.text = text
+        self.type = suggestion_type
+        # Référence (product_id, shop_id ou catégorie) -> poids
+        self.refs: Dict[str, float] = {}
+        self.keys = entry_keys(normalize(text))
+
+    @property
+    def weight(self) -> float:
+        return sum(self.refs.values())
+
+
+class RadixTrie:
+    """Arbre de préfixes compressé associant des clés à des suggestions pondérées"""
+
+    def __init__(self):
+        self.root = _Node()
+
+    def insert(self, key: str, suggestion_key: SuggestionKey):
+        node = self.root
+        remaining = key
+        while remaining:
+            child = node.children.get(remaining[0])
+            if child is None:
+                leaf = _Node(remaining)
+                node.children[remaining[0]] = leaf
+                node = leaf
+                break
+            common = 0
+            limit = min(len(child.label), len(remaining))
+            while common < limit and child.label[common] == remaining[common]:
+                common += 1
+            if common < len(child.label):
+                # Découper l'arête : nœud intermédiaire pour le préfixe commun
+                middle = _Node(child.label[:common])
+                child.label = child.label[common:]
+                middle.children[child.label[0]] = child
+                middle.max_weight = child.max_weight
+                node.children[remaining[0]] = middle
+                child = middle
+            node = child
+            remaining = remaining[common:]
+        node.suggestions.add(suggestion_key)
+
+    def remove(self, key: str, suggestion_key: SuggestionKey):
+        path = self._path(key)
+        if path is None:
+            return
+        node = path[-1]
+        node.suggestions.discard(suggestion_key)
+        # Élaguer les feuilles devenues vides
+        for parent, child in zip(reversed(path[:-1]), reversed(path[1:])):
+            if child.suggestions or child.children:
+                break
+            del parent.children[child.label[0]]
+
+    def _path(self, key: str) -> Optional[List[_Node]]:
+        """Nœuds traversés pour une clé exacte"""
+        node = self.root
+        path = [node]
+        remaining = key
+        while remaining:
+            child = node.children.get(remaining[0])
+            if child is None or not remaining.startswith(child.label):
+                return None
+            node = child
+            path.append(node)
+            remaining = remaining[len(child.label):]
+        return path
+
+    def refresh_weights(self, key: str, weight_of: Callable[[SuggestionKey], float]):
+        """Recalcule les poids maximaux le long du chemin d'une clé"""
+        path = self._path(key)
+        if path is None:
+            return
+        for node in reversed(path):
+            best = max((weight_of(s) for s in node.suggestions), default=0.0)
+            for child in node.children.values():
+                best = max(best, child.max_weight)
+            node.max_weight = best
+
+    def locate(self, prefix: str) -> Optional[_Node]:
+        """Nœud dont le sous-arbre contient toutes les clés commençant par `prefix`"""
+        node = self.root
+        remaining = prefix
+        while remaining:
+            child = node.children.get(remaining[0])
+            if child is None:
+                return None
+            if remaining.startswith(child.label):
+                remaining = remaining[len(child.label):]
+                node = child
+            elif child.label.startswith(remaining):
+                return child
+            else:
+                return None
+        return node
+
+
+class SuggestIndex(CatalogIndex):
+    """Suggestions d'autocomplétion (produits, boutiques, catégories)"""
+
+    label = "d'autocomplétion"
+    projection = {**CATALOG_PROJECTION, "units_sold": 1}
+    # Poids des produits recalculés par ranking_service
+    sync_fields = ("updated_at", "rank_updated_at")
+
+    def _reset(self):
+        self.trie = RadixTrie()
+        self.suggestions: Dict[SuggestionKey, _Suggestion] = {}
+        # product_id -> [(clé de suggestion, référence, poids)] pour la suppression
+        self.product_refs: Dict[str, List[Tuple[SuggestionKey, str, float]]] = {}
+        # owner_id -> (shop_id, nom de la boutique)
+        self.shops: Dict[str, Tuple[str, str]] = {}
+
+    def stats(self) -> dict:
+        return {"documents": len(self.product_refs), "suggestions": len(self.suggestions)}
+
+    # ---------- Mise à jour ----------
+
+    def _weight_of(self, key: SuggestionKey) -> float:
+        suggestion = self.suggestions.get(key)
+        return suggestion.weight if suggestion is not None else 0.0
+
+    def _add_ref(self, suggestion_type: str, text: str, ref: str, weight: float) -> Optional[SuggestionKey]:
+        normalized = normalize(text)
+        if not normalized:
+            return None
+        key = (suggestion_type, normalized)
+        suggestion = self.suggestions.get(key)
+        if suggestion is None:
+            suggestion = _Suggestion(text, suggestion_type)
+            self.suggestions[key] = suggestion
+            for entry in suggestion.keys:
+                self.trie.insert(entry, key)
+        suggestion.refs[ref] = suggestion.refs.get(ref, 0.0) + weight
+        for entry in suggestion.keys:
+            self.trie.refresh_weights(entry, self._weight_of)
+        return key
+
+    def _drop_ref(self, key: SuggestionKey, ref: str, weight: float):
+        suggestion = self.suggestions.get(key)
+        if suggestion is None:
+            return
+        remaining = suggestion.refs.get(ref, 0.0) - weight
+        if remaining > 0:
+            suggestion.refs[ref] = remaining
+        else:
+            suggestion.refs.pop(ref, None)
+        # Les boutiques restent suggérées même sans produit publié
+        if not suggestion.refs and key[0] != "shop":
+            del self.suggestions[key]
+            for entry in suggestion.keys:
+                self.trie.remove(entry, key)
+        for entry in suggestion.keys:
+            self.trie.refresh_weights(entry, self._weight_of)
+
+    def add_shop(self, owner_id: str, shop_id: str, name: str):
+        """
+        Ajoute une boutique (poids nul tant qu'elle n'a pas de produit)
+
+        Une boutique déjà indexée sous un autre nom est renommée : son poids
+        et les références de ses produits passent sur le nouveau nom.
+        """
+        previous = self.shops.get(owner_id)
+        if previous == (shop_id, name):
+            return
+        self.shops[owner_id] = (shop_id, name)
+        key = self._add_ref("shop", name, shop_id, 0.0)
+        if previous is None or key is None:
+            return
+
+        old_shop_id, old_name = previous
+        old_key = ("shop", normalize(old_name))
+        if old_key == key and old_shop_id == shop_id:
+            # Même nom normalisé (casse, accents) : seul l'affichage change
+            self.suggestions[key].text = name
+            return
+        for product_id, refs in self.product_refs.items():
+            for position, (ref_key, ref, weight) in enumerate(refs):
+                if ref_key == old_key and ref == old_shop_id:
+                    self._drop_ref(old_key, ref, weight)
+                    self._add_ref("shop", name, shop_id, weight)
+                    refs[position] = (key, shop_id, weight)
+        old = self.suggestions.get(old_key)
+        if old is not None and old.refs.get(old_shop_id, 0.0) == 0.0:
+            # Ancien nom sans autre boutique : retiré des suggestions
+            old.refs.pop(old_shop_id, None)
+            if not old.refs:
+                del self.suggestions[old_key]
+                for entry in old.keys:
+                    self.trie.remove(entry, old_key)
+                    self.trie.refresh_weights(entry, self._weight_of)
+
+    async def load_references(self, db):
+        # Toutes les boutiques sont relues : un renommage est repris à la synchronisation
+        cursor = db.shops.find({}, {"owner_id": 1, "name": 1})
+        async for shop in cursor:
+            if shop.get("owner_id") and shop.get("name"):
+                self.add_shop(shop["owner_id"], str(shop["_id"]), shop["name"])
+
+    def upsert(self, product: dict):
+        product_id = str(product.get("_id") or product.get("id"))
+        self.remove(product_id)
+        if product.get("status") != "published":
+            return
+
+        category = product.get("category")
+        category = category.value if hasattr(category, "value") else category
+        targets = [("product", product.get("name"), product_id, 1.0 + (product.get("units_sold") or 0))]
+        if category:
+            targets.append(("category", category, category, 1.0))
+        shop = self.shops.get(product.get("seller_id"))
+        if shop:
+            shop_id, shop_name = shop
+            targets.append(("shop", shop_name, shop_id, 1.0))
+
+        refs = []
+        for suggestion_type, text, ref, weight in targets:
+            key = self._add_ref(suggestion_type, text, ref, weight)
+            if key is not None:
+                refs.append((key, ref, weight))
+        self.product_refs[product_id] = refs
+
+    def remove(self, product_id: str):
+        for key, ref, weight in self.product_refs.pop(str(product_id), []):
+            self._drop_ref(key, ref, weight)
+
+    # ---------- Lecture ----------
+
+    def suggest(self, prefix: str, limit: int = 8) -> List[dict]:
+        """
+        Les `limit` suggestions les plus populaires commençant par `prefix`
+
+        Returns:
+            list: [{"text", "type", "value", "weight"}]
+        """
+        normalized = normalize(prefix)
+        if not normalized:
+            return []
+        node = self.trie.locate(normalized)
+        if node is None:
+            return []
+
+        counter = itertools.count()
+        heap = [(-node.max_weight, next(counter), node, None)]
+        results: List[dict] = []
+        seen: Set[SuggestionKey] = set()
+        while heap and len(results) < limit:
+            _, _, current, key = heapq.heappop(heap)
+            if key is not None:
+                if key in seen:
+                    continue
+                seen.add(key)
+                suggestion = self.suggestions[key]
+                results.append({
+                    "text": suggestion.text,
+                    "type": suggestion.type,
+                    "value": max(suggestion.refs, key=suggestion.refs.get) if suggestion.refs else None,
+                    "weight": suggestion.weight,
+                })
+                continue
+            for suggestion_key in current.suggestions:
+                if suggestion_key not in seen:
+                    weight = self.suggestions[suggestion_key].weight
+                    heapq.heappush(heap, (-weight, next(counter), None, suggestion_key))
+            for child in current.children.values():
+                heapq.heappush(heap, (-child.max_weight, next(counter), child, None))
+        return results
+
+
+# Instance partagée par l'application
+product_suggest_index = SuggestIndex()
@@ -0,0 +1,73 @@
+"""
+Requêtes conditionnelles HTTP (ETag / If-None-Match, Last-Modified / If-Modified-Since).
+
+Les routes calculent une version à partir d'une lecture légère (updated_at,
+compteurs...) ; si le client possède déjà cette version, elles répondent
+304 sans relire ni sérialiser le document complet.
+"""
+
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+
+from fastapi import Request, Response
+
+
+def compute_etag(*parts) -> str:
+    """ETag fort dérivé des éléments de version d'une ressource"""
+    digest = hashlib.sha1("|".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+    return f'"{digest}"'
+
+
+def latest(*dates: Optional[datetime]) -> Optional[datetime]:
+    """Date la plus récente parmi celles fournies (None ignorés)"""
+    known = [d for d in dates if d is not None]
+    return max(known) if known else None
+
+
+def has_conditional_headers(request: Request) -> bool:
+    """Indique si le client a envoyé un en-tête de requête conditionnelle"""
+    return "if-none-match" in request.headers or "if-modified-since" in request.headers
+
+
+def _to_http_date(value: datetime) -> str:
+    # Les dates MongoDB sont en UTC naïf, à la milliseconde près
+    return format_datetime(value.replace(tzinfo=timezone.utc, microsecond=0), usegmt=True)
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime]) -> bool:
+    """
+    Vérifie si la version du client est à jour (RFC 7232)
+
+    If-None-Match est prioritaire ; If-Modified-Since n'est consulté qu'en son absence.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        candidates = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in candidates or etag in candidates
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return last_modified.replace(tzinfo=timezone.utc, microsecond=0) <= since
+
+    return False
+
+
+def cache_headers(etag: str, last_modified: Optional[datetime]) -> dict:
+    """En-têtes de validation à renvoyer avec la ressource"""
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if last_modified is not None:
+        headers["Last-Modified"] = _to_http_date(last_modified)
+    return headers
+
+
+def not_modified_response(etag: str, last_modified: Optional[datetime]) -> Response:
+    """Réponse 304 sans corps"""
+    return Response(status_code=304, headers=cache_headers(etag, last_modified))
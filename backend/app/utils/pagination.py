@@ -0,0 +1,140 @@
+"""
+Pagination par curseur (keyset) pour les listes MongoDB.
+
+Le curseur est un jeton opaque qui encode la clé de tri et l'_id du dernier
+document renvoyé. La page suivante est obtenue avec un filtre de plage
+((clé, _id) < dernier), ce qui reste en temps constant quelle que soit la
+profondeur de page, contrairement à skip/offset.
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+# Taille de page par défaut et maximale
+DEFAULT_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursorError(ValueError):
+    """Jeton de pagination illisible ou falsifié"""
+
+
+def _encode_value(value: Any) -> dict:
+    """Sérialise une valeur de clé de tri en JSON typé"""
+    if isinstance(value, datetime):
+        return {"t": "dt", "v": value.isoformat()}
+    if isinstance(value, ObjectId):
+        return {"t": "oid", "v": str(value)}
+    return {"t": "raw", "v": value}
+
+
+def _decode_value(data: dict) -> Any:
+    """Reconstruit une valeur de clé de tri depuis le JSON typé"""
+    kind, value = data.get("t"), data.get("v")
+    if kind == "dt":
+        return datetime.fromisoformat(value)
+    if kind == "oid":
+        return ObjectId(value)
+    if kind == "raw":
+        return value
+    raise InvalidCursorError("Type de clé inconnu")
+
+
+def encode_cursor(sort_field: str, document: dict) -> str:
+    """Construit le jeton opaque à partir du dernier document d'une page"""
+    payload = {
+        "f": sort_field,
+        "k": _encode_value(document.get(sort_field)),
+        "i": str(document["_id"]),
+    }
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str, sort_field: str) -> Tuple[Any, ObjectId]:
+    """Décode un jeton et renvoie (valeur de la clé de tri, _id)"""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if payload.get("f") != sort_field:
+            raise InvalidCursorError("Curseur émis pour un autre tri")
+        return _decode_value(payload["k"]), ObjectId(payload["i"])
+    except InvalidCursorError:
+        raise
+    except (ValueError, KeyError, TypeError, AttributeError, InvalidId) as e:
+        raise InvalidCursorError(str(e))
+
+
+def keyset_filter(sort_field: str, direction: int, value: Any, last_id: ObjectId) -> dict:
+    """Filtre Mongo qui sélectionne les documents situés après (value, last_id)"""
+    op = "$lt" if direction < 0 else "$gt"
+    return {
+        "$or": [
+            {sort_field: {op: value}},
+            {sort_field: value, "_id": {op: last_id}},
+        ]
+    }
+
+
+def clamp_limit(limit: Optional[int]) -> int:
+    """Ramène la taille de page demandée dans les bornes autorisées"""
+    if not limit or limit < 1:
+        return DEFAULT_PAGE_SIZE
+    return min(limit, MAX_PAGE_SIZE)
+
+
+async def fetch_page(
+    collection,
+    query: dict,
+    limit: Optional[int] = None,
+    after: Optional[str] = None,
+    sort_field: str = "created_at",
+    direction: int = -1,
+    projection: Optional[dict] = None,
+) -> Tuple[List[dict], Optional[str]]:
+    """
+    Lit une page de documents triés par (sort_field, _id).
+
+    Args:
+        collection: Collection Motor interrogée
+        query: Filtre de base (statut, catégorie, ...)
+        limit: Taille de page souhaitée
+        after: Jeton renvoyé par la page précédente
+        sort_field: Champ de tri principal
+        direction: -1 pour décroissant, 1 pour croissant
+        projection: Projection Mongo optionnelle
+
+    Returns:
+        (documents bruts, jeton de la page suivante ou None)
+
+    Raises:
+        InvalidCursorError: Si le jeton `after` est invalide
+    """
+    page_size = clamp_limit(limit)
+    filters = dict(query)
+    if after:
+        value, last_id = decode_cursor(after, sort_field)
+        filters = {"$and": [query, keyset_filter(sort_field, direction, value, last_id)]}
+
+    if projection and all(projection.values()):
+        # La clé de tri doit être lue pour construire le curseur suivant
+        projection = {**projection, sort_field: 1}
+
+    cursor = (
+        collection.find(filters, projection)
+        .sort([(sort_field, direction), ("_id", direction)])
+        .limit(page_size + 1)
+    )
+    documents = await cursor.to_list(page_size + 1)
+
+    next_cursor = None
+    if len(documents) > page_size:
+        documents = documents[:page_size]
+        next_cursor = encode_cursor(sort_field, documents[-1])
+
+    return documents, next_cursor
@@ -0,0 +1,90 @@
+"""
+Champs partiels (`fields=`) traduits en projections MongoDB.
+
+Le client choisit soit un profil prédéfini (`card`, `detail`), soit une liste
+de champs séparés par des virgules. La projection est transmise à MongoDB :
+les champs non demandés ne sont ni lus ni sérialisés.
+"""
+
+import re
+from typing import Dict, Optional
+
+# Profils des produits : vignette de grille et fiche complète (None = tout)
+PRODUCT_PROFILES: Dict[str, Optional[dict]] = {
+    "card": {
+        "name": 1,
+        "price": 1,
+        "category": 1,
+        "seller_id": 1,
+        "shop_id": 1,
+        "stock_quantity": 1,
+        "images": {"$slice": 1},  # Vignette : première image uniquement
+    },
+    "detail": None,
+}
+
+# Profils des commandes : ligne d'historique, résumé et détail complet
+ORDER_PROFILES: Dict[str, Optional[dict]] = {
+    "card": {
+        "created_at": 1,
+        "status": 1,
+        "payment_status": 1,
+        "delivery_method": 1,
+        "total": 1,
+        "items.product_name": 1,
+        "items.product_image": 1,
+        "items.quantity": 1,
+    },
+    # Liste compacte : nombre d'articles calculé par MongoDB (lignes non lues)
+    "summary": {
+        "created_at": 1,
+        "status": 1,
+        "total": 1,
+        "item_count": {"$sum": "$items.quantity"},
+    },
+    "detail": None,
+}
+
+_FIELD_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)*$")
+
+
+class InvalidFieldsError(ValueError):
+    """Paramètre `fields` mal formé"""
+
+
+def build_projection(fields: Optional[str], profiles: Dict[str, Optional[dict]]) -> Optional[dict]:
+    """
+    Construit la projection MongoDB correspondant au paramètre `fields`
+
+    Args:
+        fields: Nom de profil ou liste de champs ("name,price,images")
+        profiles: Profils prédéfinis de la ressource
+
+    Returns:
+        La projection, ou None pour renvoyer le document complet
+
+    Raises:
+        InvalidFieldsError: Si un nom de champ est invalide
+    """
+    if fields is None or not fields.strip():
+        return None
+
+    fields = fields.strip()
+    if fields in profiles:
+        profile = profiles[fields]
+        return dict(profile) if profile is not None else None
+
+    projection = {}
+    for field in fields.split(","):
+        field = field.strip()
+        if not field:
+            continue
+        if field == "id":
+            # _id est toujours renvoyé (converti en "id")
+            continue
+        if not _FIELD_RE.match(field):
+            raise InvalidFieldsError(f"Champ invalide: {field}")
+        projection[field] = 1
+
+    # Seulement "id" demandé : projection minimale
+    return projection or {"_id": 1}
@@ -0,0 +1,60 @@
+"""
+Archivage des commandes livrées ou annulées (orders -> orders_archive)
+Exécuter : python archive_orders.py [--batch-size 500] [--max-batches N] [--dry-run]
+
+Même traitement que la tâche de fond de l'API (app/services/order_archive.py),
+pour un premier archivage massif ou une exécution planifiée (cron) avec
+ORDER_ARCHIVE_INTERVAL_SECONDS élevé. Crée la collection d'archive
+compressée et ses index si besoin.
+
+Le script est idempotent : il peut être interrompu et relancé.
+"""
+
+import argparse
+import asyncio
+import time
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.config.database import DATABASE_NAME, MONGODB_URL
+from app.config.indexes import INDEXES
+from app.config.settings import settings
+from app.services.order_archive import (
+    ARCHIVABLE_STATUSES, ARCHIVE_COLLECTION, archive_horizon, archive_orders, ensure_archive_collection
+)
+
+
+async def run(batch_size: int, max_batches: int, dry_run: bool):
+    client = AsyncIOMotorClient(MONGODB_URL)
+    db = client[DATABASE_NAME]
+    started = time.perf_counter()
+    horizon = archive_horizon()
+
+    try:
+        if dry_run:
+            count = await db.orders.count_documents({
+                "status": {"$in": list(ARCHIVABLE_STATUSES)},
+                "updated_at": {"$lt": horizon},
+            })
+            print(f"✅ {count} commandes à archiver (terminées avant le {horizon:%Y-%m-%d})")
+            return
+
+        await ensure_archive_collection(db)
+        for keys, options in INDEXES[ARCHIVE_COLLECTION]:
+            await db[ARCHIVE_COLLECTION].create_index(keys, **options)
+
+        stats = await archive_orders(db, batch_size, max_batches)
+        duration = time.perf_counter() - started
+        print(f"✅ {stats['archived']} commandes archivées en {stats['batches']} lots ({duration:.1f} s)")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive les commandes livrées ou annulées")
+    parser.add_argument("--batch-size", type=int, default=settings.ORDER_ARCHIVE_BATCH_SIZE, help="Commandes par lot")
+    parser.add_argument("--max-batches", type=int, default=None, help="Nombre maximal de lots")
+    parser.add_argument("--dry-run", action="store_true", help="Compter sans déplacer")
+    args = parser.parse_args()
+
+    asyncio.run(run(args.batch_size, args.max_batches, args.dry_run))
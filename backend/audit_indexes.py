@@ -0,0 +1,53 @@
+"""
+Script d'audit des index MongoDB de la plateforme Makiti
+Crée les index déclarés puis exécute explain() sur chaque forme de requête
+émise par l'API. Échoue (code 1) si une requête parcourt toute la collection.
+
+Exécuter : python audit_indexes.py
+"""
+
+import asyncio
+import sys
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.config.database import DATABASE_NAME, MONGODB_URL
+from app.config.indexes import ensure_indexes, audit_query_plans
+
+async def audit_indexes() -> int:
+    """Audite les plans d'exécution et renvoie le code de sortie"""
+    
+    # Connexion à MongoDB
+    client = AsyncIOMotorClient(MONGODB_URL)
+    db = client[DATABASE_NAME]
+    
+    try:
+        await ensure_indexes(db)
+        reports = await audit_query_plans(db)
+        
+        print("=" * 70)
+        print("AUDIT DES PLANS D'EXÉCUTION")
+        print("=" * 70)
+        for report in reports:
+            if report["collscan"]:
+                marker = "❌"
+            elif report["blocking_sort"]:
+                marker = "⚠️ "
+            else:
+                marker = "✅"
+            sort = f" tri={report['sort']}" if report["sort"] else ""
+            print(f"{marker} {report['collection']}: {report['filter']}{sort}")
+            print(f"   Étapes: {' > '.join(report['stages'])}")
+        
+        collscans = [r for r in reports if r["collscan"]]
+        print("=" * 70)
+        if collscans:
+            print(f"❌ {len(collscans)} requête(s) en COLLSCAN sur {len(reports)}")
+            return 1
+        print(f"✅ Aucune requête en COLLSCAN ({len(reports)} formes auditées)")
+        return 0
+        
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(audit_indexes()))
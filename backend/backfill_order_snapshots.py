@@ -0,0 +1,121 @@
+"""
+Migration : instantané produit complet sur les lignes des commandes existantes
+Exécuter : python backfill_order_snapshots.py [--batch-size 500] [--dry-run]
+
+Les commandes passées avant l'instantané complet (checkout_service.line_snapshot)
+n'ont pas toutes nom, image, prix, catégorie et boutique sur leurs lignes.
+Le script les parcourt par lots (pagination sur _id), lit en une requête les
+produits de chaque lot et complète les champs manquants par un `bulk_write`.
+Les commandes archivées (`orders_archive`, les plus anciennes donc les plus
+souvent incomplètes) sont traitées après `orders` : l'historique ne relit
+plus `products`.
+Les valeurs déjà présentes ne sont jamais écrasées ; un produit supprimé
+laisse des champs à None (la ligne n'est alors plus resélectionnée).
+
+Le script est idempotent : il peut être interrompu et relancé.
+"""
+
+import argparse
+import asyncio
+import time
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+
+from app.config.database import DATABASE_NAME, MONGODB_URL
+from app.services.checkout_service import SNAPSHOT_FIELDS, line_snapshot
+from app.services.order_archive import ARCHIVE_COLLECTION
+
+# Commandes dont au moins une ligne n'a pas l'instantané complet
+INCOMPLETE_QUERY = {"$or": [
+    {"items": {"$elemMatch": {field: {"$exists": False}}}}
+    for field in SNAPSHOT_FIELDS
+]}
+
+
+def complete_items(items: list, products: dict) -> list:
+    """Lignes complétées : les champs existants priment sur l'instantané du produit"""
+    completed = []
+    for item in items:
+        snapshot = line_snapshot(products.get(item.get("product_id")))
+        if item.get("unit_price") is None and item.get("price") is not None:
+            # Anciennes lignes : prix unitaire stocké sous `price`
+            snapshot["unit_price"] = item["price"]
+        completed.append({**snapshot, **item})
+    return completed
+
+
+async def backfill_collection(db, collection, batch_size: int, dry_run: bool):
+    """
+    Complète les commandes d'une collection
+
+    Returns:
+        (commandes lues, commandes complétées)
+    """
+    scanned = updated = 0
+    last_id = None
+    while True:
+        query = INCOMPLETE_QUERY if last_id is None else {"$and": [INCOMPLETE_QUERY, {"_id": {"$gt": last_id}}]}
+        orders = await collection.find(query, {"items": 1}).sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not orders:
+            break
+        last_id = orders[-1]["_id"]
+        scanned += len(orders)
+
+        # Produits du lot : une seule requête
+        product_ids = {
+            item["product_id"]
+            for order in orders
+            for item in order.get("items", [])
+            if ObjectId.is_valid(item.get("product_id") or "")
+        }
+        products = {}
+        cursor = db.products.find(
+            {"_id": {"$in": [ObjectId(i) for i in product_ids]}},
+            {"name": 1, "images": {"$slice": 1}, "price": 1, "category": 1, "shop_id": 1, "seller_id": 1},
+        )
+        async for product in cursor:
+            products[str(product["_id"])] = product
+
+        operations = [
+            UpdateOne(
+                # Les lignes d'une commande ne changent pas : filtre sur leur état lu
+                {"_id": order["_id"], "items": order["items"]},
+                {"$set": {"items": complete_items(order["items"], products)}},
+            )
+            for order in orders
+        ]
+        if not dry_run:
+            result = await collection.bulk_write(operations, ordered=False)
+            updated += result.modified_count
+        else:
+            updated += len(operations)
+        print(f"   {collection.name}: {scanned} commandes traitées...")
+    return scanned, updated
+
+
+async def backfill(batch_size: int, dry_run: bool):
+    client = AsyncIOMotorClient(MONGODB_URL)
+    db = client[DATABASE_NAME]
+    started = time.perf_counter()
+
+    try:
+        action = "à compléter" if dry_run else "complétées"
+        # Archive en second : une commande archivée pendant le passage sur
+        # `orders` y est reprise
+        for collection in (db.orders, db[ARCHIVE_COLLECTION]):
+            scanned, updated = await backfill_collection(db, collection, batch_size, dry_run)
+            print(f"✅ {collection.name}: {updated} commandes {action} sur {scanned} lues")
+        print(f"✅ Terminé en {time.perf_counter() - started:.1f} s")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Complète l'instantané produit des lignes de commande")
+    parser.add_argument("--batch-size", type=int, default=500, help="Commandes par bulk_write")
+    parser.add_argument("--dry-run", action="store_true", help="Compter sans écrire")
+    args = parser.parse_args()
+
+    asyncio.run(backfill(args.batch_size, args.dry_run))
@@ -0,0 +1,57 @@
+"""
+Migration : projection des commandes existantes dans `seller_order_lines`
+Exécuter : python backfill_seller_order_lines.py [--batch-size 500]
+
+Les commandes créées avant la vue matérialisée par vendeur n'y figurent pas.
+Le script parcourt toutes les commandes par lots (pagination sur _id) et
+écrit, pour chaque lot, un `bulk_write` d'upserts par couple
+(commande, vendeur) : il peut être interrompu et relancé sans doublon, et
+resynchronise au passage le statut des documents déjà présents.
+"""
+
+import argparse
+import asyncio
+import time
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.config.database import DATABASE_NAME, MONGODB_URL
+from app.config.indexes import ensure_indexes
+from app.services.seller_orders import ORDER_FIELDS, project_orders
+
+# Champs de la commande lus pour la projection
+PROJECTION = {"items": 1, "updated_at": 1, **{field: 1 for field in ORDER_FIELDS}}
+
+
+async def backfill(batch_size: int):
+    client = AsyncIOMotorClient(MONGODB_URL)
+    db = client[DATABASE_NAME]
+    started = time.perf_counter()
+    scanned = written = 0
+    last_id = None
+
+    try:
+        # L'index unique (order_id, seller_id) garantit l'absence de doublons
+        await ensure_indexes(db)
+        while True:
+            query = {} if last_id is None else {"_id": {"$gt": last_id}}
+            orders = await db.orders.find(query, PROJECTION).sort("_id", 1).limit(batch_size).to_list(batch_size)
+            if not orders:
+                break
+            last_id = orders[-1]["_id"]
+            scanned += len(orders)
+            written += await project_orders(db, orders)
+            print(f"   {scanned} commandes projetées...")
+
+        duration = time.perf_counter() - started
+        print(f"✅ {written} documents vendeurs écrits pour {scanned} commandes en {duration:.1f} s")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Projette les commandes existantes par vendeur")
+    parser.add_argument("--batch-size", type=int, default=500, help="Commandes par bulk_write")
+    args = parser.parse_args()
+
+    asyncio.run(backfill(args.batch_size))
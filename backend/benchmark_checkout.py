@@ -0,0 +1,166 @@
+"""
+Banc d'essai de concurrence du paiement : aucune survente possible
+Exécuter : python benchmark_checkout.py [--checkouts 500] [--stock 100] [--replays 0.2] [--allow-standalone]
+
+Lance N paiements simultanés d'une unité sur un même produit dont le stock
+est inférieur à N, puis vérifie que :
+- exactement `stock` commandes ont été créées, au plus une par acheteur ;
+- le stock final vaut 0 (jamais négatif) ;
+- les paniers des acheteurs refusés sont intacts ;
+- une requête rejouée avec la même Idempotency-Key ne crée pas de seconde
+  commande et renvoie la commande d'origine.
+
+Les paiements passent par la route POST /checkout de l'application, montée
+en processus (httpx.ASGITransport) : jeton JWT, Idempotency-Key,
+cart_store.checkout, pré-contrôle des réservations et place_order sont
+exercés comme en production. Une fraction des acheteurs (`--replays`)
+envoie la même requête deux fois en parallèle.
+
+Le chemin transactionnel n'existe que sur un replica set (ou mongos) : le
+banc refuse un serveur autonome, qui n'exercerait que le décrément
+compensé, sauf avec --allow-standalone. Le chemin effectivement exercé est
+affiché avec le résultat.
+
+Le banc utilise une base dédiée (<DATABASE_NAME>_checkout_bench), supprimée
+à la fin. Code de sortie 1 en cas de survente ou d'incohérence, 2 si le
+serveur n'est pas un replica set.
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+import httpx
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.config import database
+from app.config.database import DATABASE_NAME, MONGODB_URL
+from app.config.indexes import ensure_indexes
+from app.main import app
+from app.services import checkout_service
+from app.utils.security import create_access_token
+
+CHECKOUT_BODY = {"shipping_address": {"full_name": "Test", "city": "Paris", "phone": "0600000000"}}
+
+
+async def checkout(client: httpx.AsyncClient, user_id: str, key: str) -> httpx.Response:
+    """Un paiement d'une unité par POST /checkout"""
+    token = create_access_token({"sub": user_id}, expires_delta=timedelta(hours=1))
+    headers = {"Authorization": f"Bearer {token}", "Idempotency-Key": key}
+    return await client.post("/checkout", json=CHECKOUT_BODY, headers=headers)
+
+
+async def buyer(client: httpx.AsyncClient, user_id: str, replay: bool) -> list:
+    """Paiement d'un acheteur, envoyé deux fois en parallèle s'il rejoue sa clé"""
+    key = str(ObjectId())
+    attempts = 2 if replay else 1
+    return list(await asyncio.gather(*(checkout(client, user_id, key) for _ in range(attempts))))
+
+
+async def is_replica_set(client) -> bool:
+    """True si le serveur accepte les transactions (replica set ou mongos)"""
+    hello = await client.admin.command("hello")
+    return "setName" in hello or hello.get("msg") == "isdbgrid"
+
+
+async def run_benchmark(checkouts: int, stock: int, replays: float = 0.2, allow_standalone: bool = False) -> int:
+    """Exécute le banc ; renvoie le code de sortie (0 : aucune incohérence)"""
+    client = AsyncIOMotorClient(MONGODB_URL, maxPoolSize=max(100, checkouts))
+    if not await is_replica_set(client):
+        if not allow_standalone:
+            print("❌ Serveur autonome : le chemin transactionnel ne peut pas être testé (--allow-standalone pour le décrément compensé)")
+            client.close()
+            return 2
+        print("⚠️  Serveur autonome : seul le décrément compensé est exercé")
+    bench_name = f"{DATABASE_NAME}_checkout_bench"
+    await client.drop_database(bench_name)
+    db = client[bench_name]
+    # Les routes de l'application utilisent la base du banc
+    database.client, database.db = client, db
+
+    try:
+        await ensure_indexes(db)
+        product = {
+            "_id": ObjectId(),
+            "name": "Article très demandé",
+            "price": 10.0,
+            "seller_id": str(ObjectId()),
+            "status": "published",
+            "stock_quantity": stock,
+            "units_sold": 0,
+        }
+        await db.products.insert_one(product)
+        user_ids = [str(ObjectId()) for _ in range(checkouts)]
+        await db.carts.insert_many([
+            {"user_id": user_id, "items": [{"product_id": str(product["_id"]), "quantity": 1}]}
+            for user_id in user_ids
+        ])
+        rng = random.Random(42)
+        replaying = {user_id for user_id in user_ids if rng.random() < replays}
+
+        print(f"🚀 {checkouts} paiements simultanés via POST /checkout pour un stock de {stock} ({len(replaying)} rejoués)...")
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120, limits=limits) as http:
+            started = time.perf_counter()
+            responses = await asyncio.gather(*(buyer(http, user_id, user_id in replaying) for user_id in user_ids))
+            duration = time.perf_counter() - started
+
+        statuses = defaultdict(int)
+        order_ids_by_user = {}
+        replay_mismatches = 0
+        for user_id, attempts in zip(user_ids, responses):
+            order_ids = {r.json()["order_id"] for r in attempts if r.status_code == 200}
+            for r in attempts:
+                statuses[r.status_code] += 1
+            replay_mismatches += len(order_ids) > 1
+            if order_ids:
+                order_ids_by_user[user_id] = order_ids.pop()
+
+        accepted = len(order_ids_by_user)
+        final = await db.products.find_one({"_id": product["_id"]})
+        orders = await db.orders.find({}, {"user_id": 1}).to_list(None)
+        buyers_with_orders = {order["user_id"] for order in orders}
+        full_carts = await db.carts.find({"items.0": {"$exists": True}}, {"user_id": 1}).to_list(None)
+
+        print(f"   Durée: {duration:.2f} s ({checkouts / duration:.0f} paiements/s)")
+        print(f"   Statuts HTTP: {dict(sorted(statuses.items()))}")
+        print(f"   Acceptés: {accepted} | Refusés: {checkouts - accepted}")
+        print(f"   Commandes: {len(orders)} | Stock final: {final['stock_quantity']} | Vendus: {final['units_sold']}")
+        print(f"   Paniers non vidés: {len(full_carts)}")
+        path = "transactions" if checkout_service._transactions_supported else "décrément compensé"
+        print(f"   Chemin exercé: {path}")
+
+        expected_sales = min(stock, checkouts)
+        checks = {
+            "commandes = ventes attendues": len(orders) == expected_sales == accepted,
+            "une commande au plus par acheteur": len(buyers_with_orders) == len(orders),
+            "rejeux sans seconde commande": replay_mismatches == 0,
+            "aucune erreur serveur": not any(code >= 500 for code in statuses),
+            "stock final cohérent": final["stock_quantity"] == stock - expected_sales,
+            "unités vendues cohérentes": final["units_sold"] == expected_sales,
+            "paniers refusés intacts": {c["user_id"] for c in full_carts} == set(user_ids) - buyers_with_orders,
+        }
+        for label, passed in checks.items():
+            print(f"   {'✅' if passed else '❌'} {label}")
+        return 0 if all(checks.values()) else 1
+    finally:
+        await client.drop_database(bench_name)
+        database.client, database.db = None, None
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Banc de concurrence du paiement")
+    parser.add_argument("--checkouts", type=int, default=500, help="Paiements simultanés")
+    parser.add_argument("--stock", type=int, default=100, help="Stock initial du produit")
+    parser.add_argument("--replays", type=float, default=0.2, help="Part des acheteurs qui rejouent leur Idempotency-Key")
+    parser.add_argument("--allow-standalone", action="store_true", help="Accepter un serveur sans transactions")
+    args = parser.parse_args()
+
+    sys.exit(asyncio.run(run_benchmark(args.checkouts, args.stock, args.replays, args.allow_standalone)))
@@ -0,0 +1,358 @@
+"""
+Test de charge du parcours d'achat : catalogue → panier → paiement → messagerie
+Exécuter : python load_test.py [--buyers 50] [--sellers 5] [--duration 60]
+
+Prérequis : un mongod local et l'API lancée sur la même base, de préférence
+une base dédiée :
+    DATABASE_NAME=makiti_loadtest uvicorn app.main:app --port 8000
+    DATABASE_NAME=makiti_loadtest python load_test.py
+
+Le script :
+1. sème des vendeurs (approuvés, avec boutique), des acheteurs et des
+   produits (les données d'un run précédent sont d'abord supprimées) ;
+2. génère directement les jetons JWT des comptes semés (pas de bcrypt) ;
+3. lance les scénarios en parallèle pendant `--duration` secondes :
+   - acheteur : GET /products (tri et catégorie aléatoires), fiche produit,
+     POST /cart/add, GET /cart, POST /checkout, puis un message au vendeur ;
+   - vendeur : GET /seller/orders et GET /conversations ;
+4. affiche p50/p95/p99 et requêtes/s par endpoint et enregistre les
+   résultats en JSON (`--output`). `--compare ancien.json` affiche
+   l'évolution des latences par rapport à un run précédent.
+
+Les tirages aléatoires sont initialisés par `--seed` : deux runs avec les
+mêmes paramètres rejouent les mêmes scénarios.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import subprocess
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import httpx
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.config.database import DATABASE_NAME, MONGODB_URL
+from app.models.product import ProductCategory
+from app.services.ranking_service import SORT_MODES
+from app.utils.security import create_access_token
+
+# Domaine des comptes semés (permet de les retrouver et de les supprimer)
+SEED_EMAIL_DOMAIN = "loadtest.makiti.test"
+# Catégories réelles du modèle : les filtres GET /products?category= trouvent des produits
+CATEGORIES = [category.value for category in ProductCategory]
+WORDS = ["robe", "chemise", "lampe", "casque", "sac", "montre", "tapis", "ballon", "roman", "creme"]
+
+
+# ==================== MESURES ====================
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Percentile par rang le plus proche (valeurs triées)"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class Recorder:
+    """Latences et codes de statut par endpoint"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    def record(self, endpoint: str, latency_ms: float, status_code: str):
+        self.latencies[endpoint].append(latency_ms)
+        self.statuses[endpoint][status_code] += 1
+
+    def summary(self, duration: float) -> dict:
+        endpoints = {}
+        for endpoint in sorted(self.latencies):
+            values = sorted(self.latencies[endpoint])
+            statuses = dict(self.statuses[endpoint])
+            errors = sum(count for status, count in statuses.items() if not status.startswith("2"))
+            endpoints[endpoint] = {
+                "requests": len(values),
+                "rps": round(len(values) / duration, 2),
+                "p50_ms": round(percentile(values, 0.50), 2),
+                "p95_ms": round(percentile(values, 0.95), 2),
+                "p99_ms": round(percentile(values, 0.99), 2),
+                "mean_ms": round(sum(values) / len(values), 2),
+                "max_ms": round(values[-1], 2),
+                "errors": errors,
+                "statuses": statuses,
+            }
+        total = sum(len(v) for v in self.latencies.values())
+        return {
+            "endpoints": endpoints,
+            "totals": {"requests": total, "rps": round(total / duration, 2), "duration_s": round(duration, 2)},
+        }
+
+
+async def call(client: httpx.AsyncClient, recorder: Recorder, endpoint: str, method: str, url: str, **kwargs):
+    """Exécute une requête et enregistre sa latence sous le nom `endpoint`"""
+    started = time.perf_counter()
+    try:
+        response = await client.request(method, url, **kwargs)
+        status_code = str(response.status_code)
+    except httpx.HTTPError as e:
+        response, status_code = None, type(e).__name__
+    recorder.record(endpoint, (time.perf_counter() - started) * 1000, status_code)
+    return response
+
+
+# ==================== DONNÉES DE TEST ====================
+
+async def seed(db, buyers: int, sellers: int, products: int, rng: random.Random) -> dict:
+    """Supprime les données du run précédent puis sème les comptes et le catalogue"""
+    previous = await db.users.find({"email": {"$regex": f"@{SEED_EMAIL_DOMAIN}$"}}, {"_id": 1}).to_list(None)
+    previous_ids = [str(user["_id"]) for user in previous]
+    if previous_ids:
+        await db.products.delete_many({"seller_id": {"$in": previous_ids}})
+        await db.shops.delete_many({"owner_id": {"$in": previous_ids}})
+        await db.carts.delete_many({"user_id": {"$in": previous_ids}})
+        await db.stock_holds.delete_many({"user_id": {"$in": previous_ids}})
+        await db.orders.delete_many({"user_id": {"$in": previous_ids}})
+        await db.seller_order_lines.delete_many({"user_id": {"$in": previous_ids}})
+        await db.conversations.delete_many({"participants": {"$in": previous_ids}})
+        await db.notifications.delete_many({"user_id": {"$in": previous_ids}})
+        await db.users.delete_many({"_id": {"$in": [ObjectId(i) for i in previous_ids]}})
+
+    now = datetime.utcnow()
+    seller_docs = [{
+        "_id": ObjectId(),
+        "email": f"seller-{i}@{SEED_EMAIL_DOMAIN}",
+        "full_name": f"Vendeur {i}",
+        "role": "seller",
+        "seller_approval_status": "approved",
+        "hashed_password": "!",  # Connexion par mot de passe impossible
+        "is_active": True,
+        "created_at": now,
+    } for i in range(sellers)]
+    buyer_docs = [{
+        "_id": ObjectId(),
+        "email": f"buyer-{i}@{SEED_EMAIL_DOMAIN}",
+        "full_name": f"Acheteur {i}",
+        "role": "customer",
+        "hashed_password": "!",
+        "is_active": True,
+        "created_at": now,
+    } for i in range(buyers)]
+    await db.users.insert_many(seller_docs + buyer_docs)
+
+    shops = [{
+        "_id": ObjectId(),
+        "owner_id": str(seller["_id"]),
+        "name": f"Boutique {i}",
+        "created_at": now,
+        "updated_at": now,
+    } for i, seller in enumerate(seller_docs)]
+    await db.shops.insert_many(shops)
+
+    product_docs = []
+    for i in range(products):
+        seller_index = i % sellers
+        created = now - timedelta(minutes=products - i)
+        product_docs.append({
+            "_id": ObjectId(),
+            "name": f"{rng.choice(WORDS).capitalize()} {rng.choice(WORDS)} {i}",
+            "description": "Produit de test de charge",
+            "price": round(rng.uniform(2, 300), 2),
+            "category": rng.choice(CATEGORIES),
+            "stock_quantity": 1_000_000,  # Le stock ne doit pas limiter le scénario
+            "images": [],
+            "seller_id": str(seller_docs[seller_index]["_id"]),
+            "shop_id": str(shops[seller_index]["_id"]),
+            "status": "published",
+            "seller_rating": 0.0,
+            "units_sold": 0,
+            "popularity_score": 0.0,
+            "created_at": created,
+            "updated_at": created,
+        })
+    await db.products.insert_many(product_docs)
+
+    return {
+        "sellers": [str(s["_id"]) for s in seller_docs],
+        "buyers": [str(b["_id"]) for b in buyer_docs],
+        "products": [(str(p["_id"]), p["seller_id"]) for p in product_docs],
+    }
+
+
+def token_for(user_id: str) -> dict:
+    """En-tête d'authentification d'un compte semé"""
+    token = create_access_token({"sub": user_id}, expires_delta=timedelta(hours=6))
+    return {"Authorization": f"Bearer {token}"}
+
+
+# ==================== SCÉNARIOS ====================
+
+async def buyer_scenario(client, recorder, user_id: str, data: dict, deadline: float, rng: random.Random):
+    """Parcours acheteur répété jusqu'à l'échéance"""
+    headers = token_for(user_id)
+    conversation_id = None
+    while time.perf_counter() < deadline:
+        params = {"limit": 24, "sort": rng.choice(list(SORT_MODES)), "fields": "card"}
+        if rng.random() < 0.5:
+            params["category"] = rng.choice(CATEGORIES)
+        await call(client, recorder, "GET /products", "GET", "/products", params=params)
+
+        picks = rng.sample(data["products"], rng.randint(1, 3))
+        for product_id, _ in picks:
+            await call(client, recorder, "GET /products/{id}", "GET", f"/products/{product_id}")
+            await call(
+                client, recorder, "POST /cart/add", "POST", "/cart/add",
+                json={"product_id": product_id, "quantity": rng.randint(1, 2)}, headers=headers,
+            )
+        await call(client, recorder, "GET /cart", "GET", "/cart", headers=headers)
+        await call(
+            client, recorder, "POST /checkout", "POST", "/checkout",
+            json={"shipping_address": {"full_name": "Test", "city": "Paris", "phone": "0600000000"}},
+            headers=headers,
+        )
+
+        # Messagerie avec le vendeur du dernier produit consulté
+        seller_id = picks[-1][1]
+        if conversation_id is None or rng.random() < 0.2:
+            response = await call(
+                client, recorder, "POST /conversations/start/{seller_id}", "POST",
+                f"/conversations/start/{seller_id}", headers=headers,
+            )
+            if response is not None and response.status_code == 200:
+                conversation_id = response.json()["id"]
+        if conversation_id:
+            await call(
+                client, recorder, "POST /conversations/{id}/messages", "POST",
+                f"/conversations/{conversation_id}/messages",
+                json={"content": "Bonjour, ce produit est-il disponible ?"}, headers=headers,
+            )
+        await call(client, recorder, "GET /conversations", "GET", "/conversations", headers=headers)
+
+
+async def seller_scenario(client, recorder, user_id: str, deadline: float, think_time: float):
+    """Tableau de bord vendeur consulté régulièrement"""
+    headers = token_for(user_id)
+    while time.perf_counter() < deadline:
+        await call(client, recorder, "GET /seller/orders", "GET", "/seller/orders", headers=headers)
+        await call(client, recorder, "GET /conversations", "GET", "/conversations", headers=headers)
+        await asyncio.sleep(think_time)
+
+
+# ==================== RAPPORT ====================
+
+def git_commit() -> Optional[str]:
+    """Commit courant (pour comparer les runs entre deux versions)"""
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(report: dict, baseline: Optional[dict] = None):
+    """Tableau des latences par endpoint (et écart au run de référence)"""
+    header = f"{'Endpoint':<38}{'Req':>7}{'RPS':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'Err':>6}"
+    if baseline:
+        header += f"{'Δp95':>9}"
+    print(header)
+    print("-" * len(header))
+    for endpoint, stats in report["endpoints"].items():
+        line = (
+            f"{endpoint:<38}{stats['requests']:>7}{stats['rps']:>8.1f}"
+            f"{stats['p50_ms']:>9.1f}{stats['p95_ms']:>9.1f}{stats['p99_ms']:>9.1f}{stats['errors']:>6}"
+        )
+        previous = (baseline or {}).get("endpoints", {}).get(endpoint)
+        if previous and previous["p95_ms"]:
+            change = (stats["p95_ms"] - previous["p95_ms"]) / previous["p95_ms"] * 100
+            line += f"{change:>+8.0f}%"
+        print(line)
+    totals = report["totals"]
+    print(f"\nTotal: {totals['requests']} requêtes en {totals['duration_s']} s ({totals['rps']} req/s)")
+
+
+async def run_load_test(args) -> dict:
+    rng = random.Random(args.seed)
+    client_db = AsyncIOMotorClient(MONGODB_URL)
+    db = client_db[DATABASE_NAME]
+    try:
+        print(f"🌱 Semis dans {DATABASE_NAME}: {args.sellers} vendeurs, {args.buyers} acheteurs, {args.products} produits")
+        data = await seed(db, args.buyers, args.sellers, args.products, rng)
+    finally:
+        client_db.close()
+
+    # Laisser les index du catalogue de l'API rattraper le semis
+    if args.warmup > 0:
+        print(f"⏳ Attente de {args.warmup} s (synchronisation des index de l'API)...")
+        await asyncio.sleep(args.warmup)
+
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=args.buyers + args.sellers)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=30, limits=limits) as client:
+        print(f"🚀 Scénarios lancés pour {args.duration} s sur {args.base_url}")
+        started = time.perf_counter()
+        deadline = started + args.duration
+        await asyncio.gather(
+            *(buyer_scenario(client, recorder, buyer_id, data, deadline, random.Random(rng.random()))
+              for buyer_id in data["buyers"]),
+            *(seller_scenario(client, recorder, seller_id, deadline, args.seller_think_time)
+              for seller_id in data["sellers"]),
+        )
+        duration = time.perf_counter() - started
+
+    return {
+        "meta": {
+            "git_commit": git_commit(),
+            "started_at": datetime.utcnow().isoformat(),
+            "base_url": args.base_url,
+            "database": DATABASE_NAME,
+            "params": {
+                "buyers": args.buyers,
+                "sellers": args.sellers,
+                "products": args.products,
+                "duration": args.duration,
+                "seed": args.seed,
+            },
+        },
+        **recorder.summary(duration),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Test de charge du parcours d'achat")
+    parser.add_argument("--base-url", default="http://localhost:8000", help="URL de l'API")
+    parser.add_argument("--buyers", type=int, default=50, help="Acheteurs simultanés")
+    parser.add_argument("--sellers", type=int, default=5, help="Vendeurs simultanés")
+    parser.add_argument("--products", type=int, default=500, help="Produits semés")
+    parser.add_argument("--duration", type=float, default=60, help="Durée des scénarios (s)")
+    parser.add_argument("--seller-think-time", type=float, default=1.0, help="Pause entre deux consultations vendeur (s)")
+    parser.add_argument("--warmup", type=float, default=0, help="Attente après le semis (s)")
+    parser.add_argument("--seed", type=int, default=42, help="Graine des tirages aléatoires")
+    parser.add_argument("--output", help="Fichier JSON des résultats (défaut: loadtest_results/<date>-<commit>.json)")
+    parser.add_argument("--compare", help="Résultats JSON d'un run précédent à comparer")
+    args = parser.parse_args()
+
+    report = asyncio.run(run_load_test(args))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print()
+    print_report(report, baseline)
+
+    output = args.output or os.path.join(
+        "loadtest_results",
+        f"{datetime.utcnow():%Y%m%d-%H%M%S}-{report['meta']['git_commit'] or 'local'}.json",
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"💾 Résultats enregistrés dans {output}")
@@ -0,0 +1,88 @@
+"""
+Reconstruction des agrégats de ventes (rollups) depuis les commandes
+Exécuter : python rebuild_sales_rollups.py [--batch-size 500]
+
+Vide `seller_sales_rollups`, `product_sales_rollups` et `rollup_events`, puis
+replie toutes les commandes, archive comprise, par lots (pagination sur _id) :
+création, plus annulation pour les commandes annulées. Les marqueurs
+`created:<order_id>` sont réécrits : une tâche de création encore en file ne
+comptera pas deux fois.
+
+Sert au premier déploiement (commandes antérieures) et au rattrapage après
+un arrêt brutal sans transactions. À lancer sans changement de statut de
+commande en cours (les annulations en file seraient comptées deux fois).
+"""
+
+import argparse
+import asyncio
+import time
+from datetime import datetime
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import InsertOne
+
+from app.config.database import DATABASE_NAME, MONGODB_URL
+from app.services.order_archive import ARCHIVE_COLLECTION
+from app.services.rollup_service import rollup_operations
+
+
+async def rebuild(batch_size: int):
+    client = AsyncIOMotorClient(MONGODB_URL)
+    db = client[DATABASE_NAME]
+    started = time.perf_counter()
+    scanned = 0
+
+    try:
+        await db.seller_sales_rollups.delete_many({})
+        await db.product_sales_rollups.delete_many({})
+        await db.rollup_events.delete_many({})
+
+        for collection in (db.orders, db[ARCHIVE_COLLECTION]):
+            last_id = None
+            while True:
+                query = {"created_at": {"$exists": True}}
+                if last_id is not None:
+                    query["_id"] = {"$gt": last_id}
+                orders = await collection.find(query, {"items": 1, "created_at": 1, "status": 1}).sort("_id", 1).limit(batch_size).to_list(batch_size)
+                if not orders:
+                    break
+                last_id = orders[-1]["_id"]
+                if collection is not db.orders:
+                    # Déplacement interrompu : la copie chaude a déjà été repliée
+                    hot = set(await db.orders.distinct("_id", {"_id": {"$in": [o["_id"] for o in orders]}}))
+                    orders = [o for o in orders if o["_id"] not in hot]
+                    if not orders:
+                        continue
+                scanned += len(orders)
+
+                seller_ops, product_ops = [], []
+                for order in orders:
+                    events = ["created"] + (["cancelled"] if order.get("status") == "cancelled" else [])
+                    for event in events:
+                        order_seller_ops, order_product_ops = rollup_operations(order, event)
+                        seller_ops.extend(order_seller_ops)
+                        product_ops.extend(order_product_ops)
+
+                # Les upserts d'un même compteur doivent s'appliquer un par un : ordered=True
+                if seller_ops:
+                    await db.seller_sales_rollups.bulk_write(seller_ops, ordered=True)
+                if product_ops:
+                    await db.product_sales_rollups.bulk_write(product_ops, ordered=True)
+                await db.rollup_events.bulk_write([
+                    InsertOne({"_id": f"created:{order['_id']}", "order_id": str(order["_id"]), "event": "created", "applied_at": datetime.utcnow()})
+                    for order in orders
+                ], ordered=False)
+                print(f"   {scanned} commandes repliées...")
+
+        duration = time.perf_counter() - started
+        print(f"✅ Agrégats reconstruits depuis {scanned} commandes en {duration:.1f} s")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconstruit les agrégats de ventes des vendeurs")
+    parser.add_argument("--batch-size", type=int, default=500, help="Commandes repliées par lot")
+    args = parser.parse_args()
+
+    asyncio.run(rebuild(args.batch_size))
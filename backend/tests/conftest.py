@@ -0,0 +1,45 @@
+"""
+Configuration des tests du backend.
+
+Les tests s'exécutent depuis `backend/` (`python -m pytest`) sur une base
+MongoDB simulée (mongomock-motor) : aucun serveur n'est nécessaire.
+"""
+
+import os
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app.main as main  # noqa: E402
+from app.services.product_cache import product_cache  # noqa: E402
+from app.utils.security import get_current_user  # noqa: E402
+
+
+@pytest.fixture
+def db():
+    """Base simulée, neuve pour chaque test"""
+    return AsyncMongoMockClient()["makiti_test"]
+
+
+@pytest.fixture
+def current_user():
+    """Utilisateur authentifié des requêtes (modifiable par le test)"""
+    return {"user_id": None, "email": "client@example.com", "role": "client"}
+
+
+@pytest.fixture
+def client(monkeypatch, db, current_user):
+    """Client HTTP de l'application branché sur `db`, sans démarrage des tâches de fond"""
+    async def get_test_database():
+        return db
+
+    monkeypatch.setattr(main, "get_database", get_test_database)
+    main.app.dependency_overrides[get_current_user] = lambda: dict(current_user)
+    product_cache.clear()
+    yield TestClient(main.app)
+    main.app.dependency_overrides.pop(get_current_user, None)
+    product_cache.clear()
@@ -0,0 +1,222 @@
+"""
+Nombre de requêtes MongoDB des routes enrichies par les chargeurs groupés.
+
+Chaque collection liée doit être lue par une seule requête `$in`, quelles
+que soient la taille de la liste et les répétitions de clés.
+"""
+
+import asyncio
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+import app.main as main
+from app.services.loaders import BatchLoader
+
+
+class CountingCollection:
+    """Collection qui enregistre chaque lecture avant de la déléguer"""
+
+    READS = ("find", "find_one", "distinct", "aggregate", "count_documents")
+
+    def __init__(self, collection, reads):
+        self._collection = collection
+        self._reads = reads
+
+    def __getattr__(self, name):
+        attribute = getattr(self._collection, name)
+        if name not in self.READS:
+            return attribute
+
+        def read(*args, **kwargs):
+            self._reads[self._collection.name].append((name, args, kwargs))
+            return attribute(*args, **kwargs)
+        return read
+
+
+class CountingDatabase:
+    """Base simulée dont les lectures sont comptées par collection"""
+
+    def __init__(self, db):
+        self._db = db
+        self.reads = defaultdict(list)
+
+    def __getattr__(self, name):
+        return self[name]
+
+    def __getitem__(self, name):
+        return CountingCollection(self._db[name], self.reads)
+
+    def reset(self):
+        self.reads.clear()
+
+
+def in_keys(read, field="_id"):
+    """Clés de la clause `$in` d'une lecture `find`"""
+    method, args, _ = read
+    assert method == "find"
+    return args[0][field]["$in"]
+
+
+@pytest.fixture
+def counting_db(monkeypatch, client, db):
+    counting = CountingDatabase(db)
+
+    async def get_test_database():
+        return counting
+
+    monkeypatch.setattr(main, "get_database", get_test_database)
+    return counting
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def insert_products(db, count, seller_id="seller"):
+    products = [
+        {
+            "_id": ObjectId(),
+            "name": f"Produit {i}",
+            "price": 10.0 + i,
+            "images": [f"produit-{i}.jpg"],
+            "seller_id": seller_id,
+            "stock_quantity": 50,
+            "status": "published",
+        }
+        for i in range(count)
+    ]
+    run(db.products.insert_many(products))
+    return products
+
+
+def test_batch_loader_deduplicates_keys():
+    calls = []
+
+    async def batch(keys):
+        calls.append(list(keys))
+        return {key: {"key": key} for key in keys}
+
+    async def scenario():
+        loader = BatchLoader(batch)
+        documents = await loader.load_many(["a", "b", "a", "c", "b"])
+        again = await loader.load("a")
+        return loader, documents, again
+
+    loader, documents, again = run(scenario())
+    assert calls == [["a", "b", "c"]]
+    assert loader.batches == 1
+    assert [d["key"] for d in documents] == ["a", "b", "a", "c", "b"]
+    assert again == {"key": "a"}
+
+
+def test_cart_reads_products_once(client, counting_db, current_user):
+    current_user["user_id"] = str(ObjectId())
+    products = insert_products(counting_db, 32)
+    run(counting_db.carts.insert_one({
+        "user_id": current_user["user_id"],
+        "items": [{"product_id": str(p["_id"]), "quantity": 1} for p in products],
+    }))
+    counting_db.reset()
+
+    response = client.get("/cart")
+
+    assert response.status_code == 200
+    assert len(response.json()["items"]) == 32
+    assert len(counting_db.reads["products"]) == 1
+    assert len(in_keys(counting_db.reads["products"][0])) == 32
+
+
+def test_my_orders_reads_each_collection_once(client, counting_db, current_user):
+    current_user["user_id"] = str(ObjectId())
+    products = insert_products(counting_db, 3)
+    now = datetime.utcnow()
+    run(counting_db.orders.insert_many([
+        {
+            "_id": ObjectId(),
+            "user_id": current_user["user_id"],
+            "status": "pending",
+            "created_at": now - timedelta(minutes=i),
+            "items": [
+                {"product_id": str(p["_id"]), "name": p["name"], "price": p["price"],
+                 "quantity": 1, "seller_id": p["seller_id"]}
+                for p in products
+            ],
+            "total_amount": 36.0,
+        }
+        for i in range(5)
+    ]))
+    counting_db.reset()
+
+    response = client.get("/orders/my-orders")
+
+    assert response.status_code == 200
+    assert len(response.json()) == 5
+    assert len(counting_db.reads["orders"]) == 1
+    assert len(counting_db.reads["orders_archive"]) == 1
+    # Lignes servies par leur instantané : aucune lecture des produits
+    assert "products" not in counting_db.reads
+
+
+def test_conversations_read_shared_products_once(client, counting_db, current_user):
+    current_user["user_id"] = str(ObjectId())
+    products = insert_products(counting_db, 2)
+    now = datetime.utcnow()
+    run(counting_db.conversations.insert_many([
+        {
+            "_id": ObjectId(),
+            "participants": [current_user["user_id"], f"seller-{i}"],
+            "buyer_id": current_user["user_id"],
+            "seller_id": f"seller-{i}",
+            "product_id": str(products[i % 2]["_id"]),
+            "updated_at": now - timedelta(minutes=i),
+        }
+        for i in range(6)
+    ]))
+    counting_db.reset()
+
+    response = client.get("/conversations")
+
+    assert response.status_code == 200
+    assert len(response.json()) == 6
+    assert all(conv["product"] for conv in response.json())
+    assert len(counting_db.reads["conversations"]) == 1
+    assert len(counting_db.reads["products"]) == 1
+    assert sorted(in_keys(counting_db.reads["products"][0])) == sorted(p["_id"] for p in products)
+
+
+def test_can_review_reads_sellers_and_shops_once(client, counting_db, current_user):
+    current_user["user_id"] = str(ObjectId())
+    sellers = [{"_id": ObjectId(), "full_name": f"Vendeur {i}"} for i in range(3)]
+    run(counting_db.users.insert_many(sellers))
+    run(counting_db.shops.insert_many([
+        {"_id": ObjectId(), "owner_id": str(s["_id"]), "name": f"Boutique {i}"}
+        for i, s in enumerate(sellers)
+    ]))
+    order_id = ObjectId()
+    run(counting_db.orders.insert_one({
+        "_id": order_id,
+        "user_id": current_user["user_id"],
+        "status": "delivered",
+        "created_at": datetime.utcnow(),
+        # Plusieurs lignes par vendeur
+        "items": [
+            {"product_id": str(ObjectId()), "seller_id": str(s["_id"]), "quantity": 1}
+            for s in sellers for _ in range(4)
+        ],
+    }))
+    counting_db.reset()
+
+    response = client.get(f"/reviews/can-review/{order_id}")
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["can_review"] is True
+    assert sorted(r["shop_name"] for r in body["pending_reviews"]) == ["Boutique 0", "Boutique 1", "Boutique 2"]
+    assert len(counting_db.reads["reviews"]) == 1
+    assert len(counting_db.reads["users"]) == 1
+    assert len(counting_db.reads["shops"]) == 1
+    assert sorted(in_keys(counting_db.reads["users"][0])) == sorted(s["_id"] for s in sellers)
+    assert sorted(in_keys(counting_db.reads["shops"][0], "owner_id")) == sorted(str(s["_id"]) for s in sellers)